@@ -1,9 +1,8 @@
 import os
 import arcpy
 import traceback
-from Geom import get_legs, pi, getTheta, get_segment_length
-from math import sin, cos, hypot
-import bisect
+import numpy as np
+from math import hypot
 from gc import collect
 
 def buffer_inlets_and_roadside(line_feature, point_feature, output_feature, buff_distance):
@@ -85,268 +84,73 @@ def get_vertices(fc, exp):
         print('{0}'.format(traceback.format_exc()))
 
 
+def chain_parts(coordinate_array):
+    """Orders the parts of a polyline into one continuous path. A part is appended when its first vertex matches the
+    last vertex of the path (to 2 decimals) and reversed when its last vertex does. Disconnected parts are skipped.
+        :param coordinate_array: list of parts, each a list of [x, y] vertices (see get_vertices)
+        :return: list of (n, 2) numpy arrays
+    """
+    parts = []
+    prev = None
+    for part_array in coordinate_array:
+        part = np.asarray(part_array, dtype=np.float64).reshape(-1, 2)
+        if len(part) == 0:
+            continue
+        if prev is not None:
+            if np.array_equal(np.round(part[0], 2), prev):
+                pass
+            elif np.array_equal(np.round(part[-1], 2), prev):
+                part = part[::-1]
+            else:
+                continue
+        parts.append(part)
+        prev = np.round(part[-1], 2)
+    return parts
+
 def generate_xy_stations(coordinate_array, toatl_length, sta_dist=50, start_station_float=0.0):
+    """Places stationing points every sta_dist along a polyline. The first vertex is always returned, followed by a
+    point at every multiple of sta_dist past start_station_float. Stations are labeled as the remaining length
+    (toatl_length - chainage). Segment lengths are rounded to 2 decimals before they are accumulated (as
+    Geom.get_segment_length does) and a station falling exactly on a vertex is skipped, so the stations and their
+    locations match the original segment by segment stationing.
+        :param coordinate_array: list of parts, each a list of [x, y] vertices (see get_vertices)
+        :param toatl_length: total length of the polyline
+        :param sta_dist: distance between stations
+        :param start_station_float: chainage of the first vertex
+        :return: {"OID": [...], "Stations": [...], "X": [...], "Y": [...]}
+    """
     try:
-        oids, stations, x_coords, y_coords, = [], [], [], []
-        running_length_total = None
-        if int(sta_dist)==0:
+        if int(sta_dist) == 0:
             sta_dist = 50
-        station_bins = list(range(0, 999999995, sta_dist))
-        start_station = None
-        previous_station = None
-        x1, y1 = None, None
-        prevpart_x, prevpart_y = None, None
-        j = 0
-        if start_station_float != 0.0:
-            running_length_total = float(start_station_float)
-        else:
-            running_length_total = 0.0
-        part_arrrays_to_revisit = []
-        for k in range(len(coordinate_array)):
-            part_array = coordinate_array[k]
-            if k == 0:
-                for i in range(len(part_array)):
-                    if i < len(part_array) - 1:
-                        pnt_1 = part_array[i]
-                        pnt_2 = part_array[i + 1]
-                        # a is length in x direction, b is length in y direction
-                        a, b = get_legs(pnt_1[0], pnt_1[1], pnt_2[0], pnt_2[1])
-                        x1, y1, = pnt_1[0], pnt_1[1]
-                        x2, y2 = pnt_2[0], pnt_2[1]
-                        if b == 0.0:
-                            theta = 0
-                        elif a == 0.0:
-                            theta = pi / 2.0
-                        else:
-                            theta = getTheta(b, a)
-                        length = abs(get_segment_length(pnt_1[0], pnt_1[1], pnt_2[0], pnt_2[1]))
-                        if i == 0:
-                            oids.append(j)
-                            start_station = '{:.02f}'.format(round(toatl_length - running_length_total,2))
-                            previous_station = running_length_total
-                            stations.append(start_station)
-                            x_coords.append(x1)
-                            y_coords.append(y1)
-                            # print('index: {0} station: {1}\n\t|-x: {2}\ty: {3}'.format(i, start_station, x1, y1))
-                        next_station_float = station_bins[
-                            bisect.bisect_right(station_bins, running_length_total)]
-                        # Begins creating station-ing points
-                        if running_length_total + length <= next_station_float:
-                            pass
-                        else:
-                            while running_length_total + length > next_station_float:
-                                station = '{:.02f}'.format (round (toatl_length - next_station_float , 2))
-                                dif = next_station_float - previous_station
-                                if theta > 0 and theta < pi / 2.0:
-                                    # print('\t#Quadrant 1, theta:{0}'.format(degrees(theta)))
-                                    x1 += round(float(dif * cos(theta)), 8)
-                                    y1 += round(float(dif * sin(theta)), 8)
-                                elif (theta > pi / 2.0) and (theta < pi):
-                                    # print('\t#Quadrant 2')
-                                    x1 += round(float(dif * cos(theta)), 8)
-                                    y1 += round(float(dif * sin(theta)), 8)
-                                elif theta > pi and (theta < 3 * pi / 2.0):
-                                    # print('\t#Quadrant 3')
-                                    x1 += round(float(dif * cos(theta)), 8)
-                                    y1 += round(float(dif * sin(theta)), 8)
-                                elif theta > 3 * pi / 2.0 and (theta < 2.0 * pi):
-                                    # print('\t#Quadrant 4')
-                                    x1 += round(float(dif * cos(theta)), 8)
-                                    y1 += round(float(dif * sin(theta)), 8)
-                                elif theta < 0 and (theta > - pi / 2.0):
-                                    # print('\t#Quadrant 4, theta:{0}'.format(degrees(theta)))
-                                    x1 += round(float(dif * cos(theta)), 8)
-                                    y1 += round(float(dif * sin(theta)), 8)
-                                elif (theta < - pi / 2.0) and (theta > - pi):
-                                    # print('\tQuandrant 3')
-                                    x1 += round(float(dif * cos(theta)), 8)
-                                    y1 += round(float(dif * sin(theta)), 8)
-                                elif (theta < - pi) and (theta > - 3 * pi / 2.0):
-                                    # print('\tQuandrant 2')
-                                    x1 += round(float(dif * cos(theta)), 8)
-                                    y1 += round(float(dif * sin(theta)), 8)
-                                elif (theta == 0) or (theta == 2 * pi):
-                                    # X Axis
-                                    x1 += dif
-                                elif (theta == pi / 2.0) or (theta == pi / -2.0):
-                                    # Y Axis
-                                    y1 += dif
-                                elif (theta > pi * 2.0) or (theta < - pi * 2.0):
-                                    print('\n\n!!!!ARGGGGG!!!!!\n\n')
-                                else:
-                                    x1 += round(float(dif * cos(theta)), 8)
-                                    y1 += round(float(dif * sin(theta)), 8)
-                                j += 1
-                                oids.append(j)
-                                stations.append(station)
-                                x_coords.append(x1)
-                                y_coords.append(y1)
-                                previous_station = next_station_float
-                                next_station_float += sta_dist
-                        running_length_total += length
-                        previous_station = running_length_total
-                    else:
-                        pnt_1 = part_array[i]
-                        prevpart_x, prevpart_y, = pnt_1[0], pnt_1[1]
-            else:
-                xi, yi = part_array[0][0], part_array[0][1]
-                xf, yf = part_array[len(part_array) - 1][0], part_array[len(part_array) - 1][1]
-                if (round(prevpart_x, 2) == round(xi, 2)) and (round(prevpart_y, 2) == round(yi, 2)):
-                    for i in range(len(part_array)):
-                        if i < len(part_array) - 1:
-                            pnt_1 = part_array[i]
-                            pnt_2 = part_array[i + 1]
-                            # a is length in x direction, b is length in y direction
-                            a, b = get_legs(pnt_1[0], pnt_1[1], pnt_2[0], pnt_2[1])
-                            x1, y1, = pnt_1[0], pnt_1[1]
-                            x2, y2 = pnt_2[0], pnt_2[1]
-                            if b == 0.0:
-                                theta = 0
-                            elif a == 0.0:
-                                theta = pi / 2.0
-                            else:
-                                theta = getTheta(b, a)
-                            length = abs(get_segment_length(pnt_1[0], pnt_1[1], pnt_2[0], pnt_2[1]))
-                            next_station_float = station_bins[
-                                bisect.bisect_right(station_bins, running_length_total)]
-                            # Begins creating station-ing points
-                            if running_length_total + length <= next_station_float:
-                                pass
-                            else:
-                                while running_length_total + length > next_station_float:
-                                    station = '{:.02f}'.format (round (toatl_length - next_station_float , 2))
-                                    dif = next_station_float - previous_station
-                                    if theta > 0 and theta < pi / 2.0:
-                                        # print('\t#Quadrant 1, theta:{0}'.format(degrees(theta)))
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif (theta > pi / 2.0) and (theta < pi):
-                                        # print('\t#Quadrant 2')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif theta > pi and (theta < 3 * pi / 2.0):
-                                        # print('\t#Quadrant 3')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif theta > 3 * pi / 2.0 and (theta < 2.0 * pi):
-                                        # print('\t#Quadrant 4')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif theta < 0 and (theta > - pi / 2.0):
-                                        # print('\t#Quadrant 4, theta:{0}'.format(degrees(theta)))
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif (theta < - pi / 2.0) and (theta > - pi):
-                                        # print('\tQuandrant 3')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif (theta < - pi) and (theta > - 3 * pi / 2.0):
-                                        # print('\tQuandrant 2')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif (theta == 0) or (theta == 2 * pi):
-                                        # X Axis
-                                        x1 += dif
-                                    elif (theta == pi / 2.0) or (theta == pi / -2.0):
-                                        # Y Axis
-                                        y1 += dif
-                                    elif (theta > pi * 2.0) or (theta < - pi * 2.0):
-                                        print('\n\n!!!!ARGGGGG!!!!!\n\n')
-                                    else:
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    j += 1
-                                    oids.append(j)
-                                    stations.append(station)
-                                    x_coords.append(x1)
-                                    y_coords.append(y1)
-                                    previous_station = next_station_float
-                                    next_station_float += sta_dist
-                            running_length_total += length
-                            previous_station = running_length_total
-                        else:
-                            pnt_1 = part_array[i]
-                            prevpart_x, prevpart_y, = pnt_1[0], pnt_1[1]
-                elif (round(prevpart_x, 2) == round(xf, 2)) and (round(prevpart_y, 2) == round(yf, 2)):
-                    part_array = part_array.reverse()
-                    for i in range(len(part_array)):
-                        if i < len(part_array) - 1:
-                            pnt_1 = part_array[i]
-                            pnt_2 = part_array[i + 1]
-                            # a is length in x direction, b is length in y direction
-                            a, b = get_legs(pnt_1[0], pnt_1[1], pnt_2[0], pnt_2[1])
-                            x1, y1, = pnt_1[0], pnt_1[1]
-                            x2, y2 = pnt_2[0], pnt_2[1]
-                            if b == 0.0:
-                                theta = 0
-                            elif a == 0.0:
-                                theta = pi / 2.0
-                            else:
-                                theta = getTheta(b, a)
-                            length = abs(get_segment_length(pnt_1[0], pnt_1[1], pnt_2[0], pnt_2[1]))
-                            next_station_float = station_bins[
-                                bisect.bisect_right(station_bins, running_length_total)]
-                            # Begins creating station-ing points
-                            if running_length_total + length <= next_station_float:
-                                pass
-                            else:
-                                while running_length_total + length > next_station_float:
-                                    station = '{:.02f}'.format (round (toatl_length - next_station_float , 2))
-                                    dif = next_station_float - previous_station
-                                    if theta > 0 and theta < pi / 2.0:
-                                        # print('\t#Quadrant 1, theta:{0}'.format(degrees(theta)))
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif (theta > pi / 2.0) and (theta < pi):
-                                        # print('\t#Quadrant 2')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif theta > pi and (theta < 3 * pi / 2.0):
-                                        # print('\t#Quadrant 3')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif theta > 3 * pi / 2.0 and (theta < 2.0 * pi):
-                                        # print('\t#Quadrant 4')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif theta < 0 and (theta > - pi / 2.0):
-                                        # print('\t#Quadrant 4, theta:{0}'.format(degrees(theta)))
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif (theta < - pi / 2.0) and (theta > - pi):
-                                        # print('\tQuandrant 3')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif (theta < - pi) and (theta > - 3 * pi / 2.0):
-                                        # print('\tQuandrant 2')
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    elif (theta == 0) or (theta == 2 * pi):
-                                        # X Axis
-                                        x1 += dif
-                                    elif (theta == pi / 2.0) or (theta == pi / -2.0):
-                                        # Y Axis
-                                        y1 += dif
-                                    elif (theta > pi * 2.0) or (theta < - pi * 2.0):
-                                        print('\n\n!!!!ARGGGGG!!!!!\n\n')
-                                    else:
-                                        x1 += round(float(dif * cos(theta)), 8)
-                                        y1 += round(float(dif * sin(theta)), 8)
-                                    j += 1
-                                    oids.append(j)
-                                    stations.append(station)
-                                    x_coords.append(x1)
-                                    y_coords.append(y1)
-                                    previous_station = next_station_float
-                                    next_station_float += sta_dist
-                            running_length_total += length
-                            previous_station = running_length_total
-                        else:
-                            pnt_1 = part_array[i]
-                            prevpart_x, prevpart_y, = pnt_1[0], pnt_1[1]
-                else:
-                    part_arrrays_to_revisit.append(part_array)
-        out_dict = {"OID": oids, "Stations": stations, "X": x_coords, "Y": y_coords}
+        sta_dist = float(sta_dist)
+        start = float(start_station_float)
+        parts = chain_parts(coordinate_array)
+        if len(parts) == 0:
+            return {"OID": [], "Stations": [], "X": [], "Y": []}
+        seg_start = np.concatenate([part[:-1] for part in parts])
+        seg_delta = np.concatenate([np.diff(part, axis=0) for part in parts])
+        seg_true_length = np.hypot(seg_delta[:, 0], seg_delta[:, 1])
+        seg_length = np.array([round(length, 2) for length in seg_true_length.tolist()], dtype=np.float64)
+        keep = seg_length > 0.0
+        seg_start, seg_length = seg_start[keep], seg_length[keep]
+        # unit direction of each segment, stations are offset from the segment start along it
+        seg_delta = seg_delta[keep] / seg_true_length[keep][:, None]
+        chainage = np.cumsum(np.concatenate(([start], seg_length)))
+        # multiples of sta_dist strictly between the start and the end of the line
+        first = int(np.floor(start / sta_dist)) + 1
+        last = int(np.ceil(chainage[-1] / sta_dist))
+        sta = sta_dist * np.arange(first, max(first, last), dtype=np.float64)
+        sta = sta[sta < chainage[-1]]
+        seg = np.searchsorted(chainage, sta, side='right') - 1
+        on_vertex = chainage[seg] == sta
+        sta, seg = sta[~on_vertex], seg[~on_vertex]
+        offset = sta - chainage[seg]
+        x_coords = np.concatenate(([parts[0][0, 0]], seg_start[seg, 0] + offset * seg_delta[seg, 0]))
+        y_coords = np.concatenate(([parts[0][0, 1]], seg_start[seg, 1] + offset * seg_delta[seg, 1]))
+        labels = np.round(float(toatl_length) - np.concatenate(([start], sta)), 2)
+        stations = ['{:.02f}'.format(label) for label in labels.tolist()]
+        out_dict = {"OID": list(range(len(stations))), "Stations": stations, "X": x_coords.tolist(),
+                    "Y": y_coords.tolist()}
         return out_dict
     except:
         print('{0}'.format(traceback.format_exc()))
@@ -0,0 +1,259 @@
+"""
+
+Vectorized bank station detection for 3D cross sections.
+
+Reproduces the bank station heuristics of RAS_Writer.first_past_3D_XS and RAS_Writer.optimized_3D_XS_spacing on all
+cross sections of a reach at once. Cross sections are passed as padded arrays (n_xs, n_vertices) with the number of
+valid vertices per XS, every step of the original per-vertex while loops is evaluated as a windowed array operation.
+
+
+By: Alex Govea
+
+"""
+import numpy as np
+
+# check depths tried by the trimming stage before falling back to the highest point (ft).
+TRIM_DEPTHS = (2.0, 1.75, 1.5, 1.25, 1.0)
+# check depth of the bank station stage, smaller values are never reached and flag the bank instead (ft).
+BANK_DEPTHS = (2.0,)
+# number of vertices between a bank candidate and the vertex it is checked against.
+CHECK_OFFSET = 5
+
+
+def pad_profiles(profiles, fill=np.nan):
+    """Stacks a list of 1D or 2D vertex arrays with differing lengths into one padded array.
+    :param profiles: list of arrays, (n_vertices,) or (n_vertices, k)
+    :param fill: padding value
+    :return: padded array (n_xs, max_vertices[, k]) and the number of vertices per XS
+    """
+    arrs = [np.asarray(p, dtype=np.float64) for p in profiles]
+    counts = np.array([len(a) for a in arrs], dtype=np.int64)
+    if not arrs:
+        return np.full((0, 0), fill), counts
+    out = np.full((len(arrs), counts.max()) + arrs[0].shape[1:], fill)
+    for i, a in enumerate(arrs):
+        out[i, :len(a)] = a
+    return out, counts
+
+
+def compact_profiles(xy, z, min_vertices=2):
+    """Drops the NaN (off raster) vertices of sampled XS and the XS left with fewer than min_vertices vertices.
+    :param xy: (n_xs, n_vertices, 2) vertex coordinates
+    :param z: (n_xs, n_vertices) sampled elevations
+    :return: padded xy, padded z, number of vertices per XS and the indexes of the XS kept
+    """
+    valid = ~np.isnan(z)
+    kept = np.nonzero(valid.sum(axis=1) >= min_vertices)[0]
+    xy_kept, counts = pad_profiles([xy[i][valid[i]] for i in kept])
+    z_kept, _ = pad_profiles([z[i][valid[i]] for i in kept])
+    return xy_kept, z_kept, counts, kept
+
+
+def polyline_lengths(xy, counts):
+    """2D length of every padded polyline and the cumulative length at each of its vertices."""
+    seg = np.hypot(np.diff(xy[:, :, 0], axis=1), np.diff(xy[:, :, 1], axis=1))
+    seg[np.arange(seg.shape[1])[None, :] >= (counts - 1)[:, None]] = 0.0
+    cum = np.concatenate((np.zeros((len(xy), 1)), np.cumsum(seg, axis=1)), axis=1)
+    return cum[np.arange(len(xy)), counts - 1], cum
+
+
+def count_below(values, step, limit, strict=True):
+    """Number of entries of np.arange(0, limit + step, step) below values (bisect_left, strict) or at or below
+    values (bisect_right). Matches the float comparisons of bisect on the arange exactly."""
+    k = np.clip(np.ceil(values / step), 0, None).astype(np.int64)
+    for _ in range(2):
+        lower = (k - 1) * step
+        if strict:
+            k = np.where((k > 0) & (lower >= values), k - 1, k)
+            k = np.where(k * step < values, k + 1, k)
+        else:
+            k = np.where((k > 0) & (lower > values), k - 1, k)
+            k = np.where(k * step <= values, k + 1, k)
+    return np.minimum(k, limit)
+
+
+def split_sides(length, vertices_spacing, search_rad):
+    """Center, left and right search indexes of every XS as computed from np.arange(0, length + spacing, spacing).
+    :return: cen_index, left_index, right_index arrays
+    """
+    no_seg = np.ceil((length + vertices_spacing) / vertices_spacing).astype(np.int64)
+    cen_index = (no_seg // 2) - 1
+    left_index = count_below(length / 2.0 - search_rad, vertices_spacing, no_seg, strict=True)
+    right_index = count_below(length / 2.0 + search_rad, vertices_spacing, no_seg, strict=False)
+    return cen_index, left_index, right_index
+
+
+def side_window(z, counts, start, stop):
+    """Gathers the vertices [start, stop] (inclusive, clipped to the XS) of every XS into a padded array.
+    :return: window (n_xs, max_len) padded with -inf, number of vertices of each window
+    """
+    stop = np.minimum(stop, counts - 1)
+    size = np.maximum(stop - start + 1, 0)
+    width = max(int(size.max()) if len(size) else 0, 1)
+    idx = start[:, None] + np.arange(width)[None, :]
+    valid = np.arange(width)[None, :] < size[:, None]
+    window = np.where(valid, z[np.arange(len(z))[:, None], np.clip(idx, 0, z.shape[1] - 1)], -np.inf)
+    return window, size
+
+
+def scan_banks(window, size, first, step, depths, first_check=None):
+    """Steps a bank candidate and its check vertex (CHECK_OFFSET vertices further) along each window until the drop
+    between them reaches the check depth. Each check depth is tried in order over the whole walk before the next one.
+    :param window: (n_xs, width) profile windows (see side_window)
+    :param size: number of vertices of each window
+    :param first: starting candidate index of each window
+    :param step: candidate step, positive walks right (left bank), negative walks left (right bank)
+    :param depths: check depths tried in order
+    :param first_check: optional elevation used in place of the candidate for the first check
+    :return: bank index, elevation at the bank index and a boolean flag (True when no depth was satisfied)
+    """
+    n = len(window)
+    rows = np.arange(n)[:, None]
+    last = size - 1
+    direction = 1 if step > 0 else -1
+    if direction > 0:
+        check0 = np.minimum(first + CHECK_OFFSET, last)
+        no_steps = int(np.max((last - first) // step + 2)) if n else 1
+    else:
+        check0 = np.maximum(first - CHECK_OFFSET, 0)
+        no_steps = int(np.max(first // -step + 2)) if n else 1
+    k = np.arange(max(no_steps, 1))[None, :]
+    if direction > 0:
+        cand = np.minimum(first[:, None] + k * step, last[:, None])
+        check = np.minimum(check0[:, None] + k * step, last[:, None])
+    else:
+        cand = np.maximum(first[:, None] + k * step, 0)
+        check = np.maximum(check0[:, None] + k * step, 0)
+    # the walk ends once the candidate reaches its check vertex at the end of the window, the first check is always made
+    valid = np.cumsum(cand == check, axis=1) == 0
+    valid[:, 0] = True
+    cand_z = window[rows, cand]
+    if first_check is not None:
+        cand_z[:, 0] = first_check
+    drop = cand_z - window[rows, check]
+    bank = first.copy()
+    bank_z = window[np.arange(n), first]
+    flag = np.ones(n, dtype=bool)
+    for depth in depths:
+        hit = valid & (drop >= depth)
+        found = hit.any(axis=1) & flag
+        pos = np.argmax(hit, axis=1)
+        bank = np.where(found, cand[np.arange(n), pos], bank)
+        bank_z = np.where(found, cand_z[np.arange(n), pos], bank_z)
+        flag &= ~found
+    return bank, bank_z, flag
+
+
+def first_pass_banks(xy, z, counts, search_top_width, vertices_spacing, lengths=None):
+    """Vectorized bank detection of first_past_3D_XS.
+    :param xy: (n_xs, n_vertices, 2) vertex coordinates
+    :param z: (n_xs, n_vertices) vertex elevations
+    :param counts: number of vertices of each XS
+    :param search_top_width: width searched for overbanks around the XS center
+    :param vertices_spacing: distance between XS vertices
+    :param lengths: optional XS lengths (i.e. SHAPE@.length), computed from the vertices when None
+    :return: dictionary of arrays LOB, ROB (relative positions), AvgDepth_ft and Invert (lowest left side elevation)
+    """
+    length = polyline_lengths(xy, counts)[0] if lengths is None else np.asarray(lengths, dtype=np.float64)
+    cen_index, left_index, right_index = split_sides(length, vertices_spacing, search_top_width / 2.0)
+    left, lsize = side_window(z, counts, left_index, cen_index)
+    right, rsize = side_window(z, counts, cen_index + 1, right_index)
+    rows = np.arange(len(z))
+    left_max = np.argmax(left, axis=1)
+    right_max = np.argmax(right, axis=1)
+    left_min_invert = np.min(np.where(np.isinf(left), np.inf, left), axis=1)
+    left_depth = left[rows, left_max] - left_min_invert
+    # the original measures the right depth from the left side minimum as well
+    right_depth = right[rows, right_max] - left_min_invert
+    first = xy[:, 0, :]
+    left_xy = xy[rows, left_index + left_max]
+    right_xy = xy[rows, cen_index + 1 + right_max]
+    return {'LOB': np.hypot(*(left_xy - first).T) / length,
+            'ROB': np.hypot(*(right_xy - first).T) / length,
+            'AvgDepth_ft': 0.5 * (left_depth + right_depth),
+            'Invert': left_min_invert}
+
+
+def trim_to_row(xy, z, counts, search_top_width, vertices_spacing, row_width, lengths=None):
+    """Trimming stage of optimized_3D_XS_spacing, each XS is cut to its right of way around the highest overbanks.
+    :param xy: (n_xs, n_vertices, 2) vertex coordinates
+    :param z: (n_xs, n_vertices) vertex elevations
+    :param counts: number of vertices of each XS
+    :param search_top_width: width searched for overbanks around the XS center
+    :param vertices_spacing: distance between XS vertices
+    :param row_width: right of way kept beyond the overbanks
+    :param lengths: optional XS lengths (i.e. SHAPE@.length), computed from the vertices when None
+    :return: start, stop arrays, the trimmed XS are the vertices [start:stop] of each XS
+    """
+    length = polyline_lengths(xy, counts)[0] if lengths is None else np.asarray(lengths, dtype=np.float64)
+    cen_index, left_index, right_index = split_sides(length, vertices_spacing, search_top_width / 2.0)
+    left, lsize = side_window(z, counts, left_index, cen_index)
+    right, rsize = side_window(z, counts, cen_index + 1, right_index)
+    left_bank, _, _ = scan_banks(left, lsize, np.argmax(left, axis=1), 2, TRIM_DEPTHS)
+    right_bank, _, _ = scan_banks(right, rsize, np.argmax(right, axis=1), -1, TRIM_DEPTHS)
+    row_offset = int(round(row_width + 10 / vertices_spacing, 0))
+    start = np.maximum(np.maximum(left_bank - row_offset, 0) + left_index, 0)
+    right_row = np.minimum(np.maximum(right_bank + row_offset, 0), rsize - 1)
+    end_index = right_row + cen_index - 1
+    stop = np.where(end_index >= counts - 1, counts, end_index + 1)
+    return start, stop
+
+
+def locate_banks(xy, z, start, stop, search_top_width, vertices_spacing, lengths=None):
+    """Bank station stage of optimized_3D_XS_spacing, run on the XS trimmed by trim_to_row.
+    :param xy: (n_xs, n_vertices, 2) vertex coordinates of the untrimmed XS
+    :param z: (n_xs, n_vertices) vertex elevations of the untrimmed XS
+    :param start: first vertex of each trimmed XS
+    :param stop: vertex after the last vertex of each trimmed XS
+    :param search_top_width: width searched for overbanks around the XS center
+    :param vertices_spacing: distance between XS vertices
+    :param lengths: optional trimmed XS lengths (i.e. SHAPE@.length), computed from the vertices when None
+    :return: dictionary of arrays LOB, ROB (relative positions), AvgDepth_ft, FlagL and FlagR (True when a bank fell
+             back to its highest point)
+    """
+    rows = np.arange(len(z))
+    counts = stop - start
+    idx = np.clip(start[:, None] + np.arange(z.shape[1])[None, :], 0, z.shape[1] - 1)
+    xy = xy[rows[:, None], idx]
+    z = z[rows[:, None], idx]
+    length = polyline_lengths(xy, counts)[0] if lengths is None else np.asarray(lengths, dtype=np.float64)
+    cen_index, left_index, right_index = split_sides(length, vertices_spacing, search_top_width / 2.0)
+    left, lsize = side_window(z, counts, left_index, cen_index)
+    right, rsize = side_window(z, counts, cen_index + 1, right_index)
+    left_max = np.argmax(left, axis=1)
+    right_max = np.argmax(right, axis=1)
+    left_first = np.minimum(left_max + 2, lsize - 1)
+    right_first = np.maximum(right_max - 2, 0)
+    left_bank, left_bank_z, flag_l = scan_banks(left, lsize, left_first, 1, BANK_DEPTHS, left[rows, left_max])
+    right_bank, right_bank_z, flag_r = scan_banks(right, rsize, right_first, -1, BANK_DEPTHS, right[rows, right_max])
+    left_min_invert = np.min(np.where(np.isinf(left), np.inf, left), axis=1)
+    first = xy[:, 0, :]
+    left_xy = xy[rows, left_index + left_bank]
+    right_xy = xy[rows, cen_index + 1 + right_bank]
+    # the original measures the right depth from the left side minimum as well
+    return {'LOB': np.hypot(*(left_xy - first).T) / length,
+            'ROB': np.hypot(*(right_xy - first).T) / length,
+            'AvgDepth_ft': 0.5 * ((left_bank_z - left_min_invert) + (right_bank_z - left_min_invert)),
+            'FlagL': flag_l, 'FlagR': flag_r}
+
+
+def optimized_banks(xy, z, counts, search_top_width, vertices_spacing, row_width, lengths=None):
+    """Vectorized bank detection of optimized_3D_XS_spacing (trim_to_row followed by locate_banks).
+    :return: dictionary of arrays Start, Stop (vertex slice of the trimmed XS), LOB, ROB, AvgDepth_ft, FlagL, FlagR
+    """
+    start, stop = trim_to_row(xy, z, counts, search_top_width, vertices_spacing, row_width, lengths)
+    banks = locate_banks(xy, z, start, stop, search_top_width, vertices_spacing)
+    banks['Start'] = start
+    banks['Stop'] = stop
+    return banks
+
+
+def bank_flag(flag_l, flag_r):
+    """Converts the left/right fallback flags into the Flag field text of the 3D XS feature class."""
+    if flag_l and flag_r:
+        return 'Flag LR Banks'
+    elif flag_l:
+        return 'Flag L Bank'
+    elif flag_r:
+        return 'Flag R Bank'
+    return None
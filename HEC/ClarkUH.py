@@ -0,0 +1,122 @@
+"""
+
+Clark unit hydrograph and hydrograph convolution engine.
+
+Computes Clark unit hydrographs (HEC-HMS time-area curve routed through a linear reservoir) and convolves them with
+excess rainfall for many sub-basins and storm events at once, so runoff scenarios can be screened without launching
+HEC-HMS. Time of concentration and storage coefficient come from lanHydro.compute_tc_r.
+
+
+By: Alex Govea
+
+"""
+import numpy as np
+from lanHydro import compute_tc_r
+
+CFS_PER_INCH_SQMI = 645.333  # cfs of 1 in. of runoff over 1 sq. mi. in 1 hr.
+
+
+def time_area_curve(t):
+    """HEC-HMS cumulative time-area curve, fraction of area contributing at t = time / Tc (0 to 1)."""
+    t = np.clip(np.asarray(t, dtype=float), 0.0, 1.0)
+    return np.where(t <= 0.5, 1.414 * t ** 1.5, 1.0 - 1.414 * (1.0 - t) ** 1.5)
+
+
+def time_area_histogram(tc, dt, n_steps=None):
+    """
+    Incremental contributing area fractions of each sub-basin per time step.
+    :param tc: (n,) time of concentration in hrs
+    :param dt: time step in hrs
+    :param n_steps: number of ordinates, defaults to the longest Tc
+    :return: (n, n_steps) array, each row sums to 1
+    """
+    tc = np.atleast_1d(np.asarray(tc, dtype=float))
+    if n_steps is None:
+        n_steps = int(np.ceil(tc.max() / dt)) + 1
+    t = np.arange(n_steps + 1) * dt
+    cumulative = time_area_curve(t[None, :] / tc[:, None])
+    return np.diff(cumulative, axis=1)
+
+
+def linear_reservoir(inflow, r, dt):
+    """
+    Routes inflow hydrographs through linear reservoirs, O_i = c * I_i + (1 - c) * O_i-1 with c = dt / (R + 0.5 dt).
+    :param inflow: (n, m) inflow ordinates
+    :param r: (n,) storage coefficients in hrs
+    :param dt: time step in hrs
+    :return: (n, m) outflow ordinates
+    """
+    r = np.atleast_1d(np.asarray(r, dtype=float))
+    c = dt / (r + 0.5 * dt)
+    outflow = np.empty_like(inflow)
+    previous = np.zeros(inflow.shape[0])
+    for i in range(inflow.shape[1]):
+        previous = c * inflow[:, i] + (1.0 - c) * previous
+        outflow[:, i] = previous
+    return outflow
+
+
+def clark_unit_hydrographs(tc, r, area, dt, n_steps=None, recession=5.0):
+    """
+    Clark unit hydrographs (cfs per in. of excess over dt) of many sub-basins.
+    :param tc: (n,) time of concentration in hrs
+    :param r: (n,) storage coefficient in hrs
+    :param area: (n,) drainage area in sq. mi.
+    :param dt: time step in hrs
+    :param n_steps: number of ordinates, defaults to the longest Tc plus recession times its R
+    :param recession: number of storage coefficients the recession limb is carried for
+    :return: (n, n_steps) unit hydrograph ordinates, the first ordinate is at t = dt
+    """
+    tc = np.atleast_1d(np.asarray(tc, dtype=float))
+    r = np.atleast_1d(np.asarray(r, dtype=float))
+    area = np.atleast_1d(np.asarray(area, dtype=float))
+    if n_steps is None:
+        n_steps = int(np.ceil(np.max(tc + recession * r) / dt)) + 1
+    inflow = np.zeros((tc.size, n_steps + 1))
+    histogram = time_area_histogram(tc, dt)[:, :n_steps]
+    inflow[:, 1:histogram.shape[1] + 1] = histogram * (area * CFS_PER_INCH_SQMI / dt)[:, None]
+    instantaneous = linear_reservoir(inflow, r, dt)
+    # unit hydrograph of a dt long excess pulse, average of the instantaneous ordinates dt apart (HEC-1)
+    return 0.5 * (instantaneous[:, 1:] + instantaneous[:, :-1])
+
+
+def convolve_hydrographs(unit_hydrographs, excess):
+    """
+    Convolves unit hydrographs with excess rainfall through the FFT, for every sub-basin and storm at once.
+    :param unit_hydrographs: (n, m) unit hydrograph ordinates
+    :param excess: (s, p) incremental excess rainfall (in.) of s storms shared by all sub-basins,
+                   or (n, s, p) excess per sub-basin
+    :return: (n, s, m + p - 1) outflow hydrographs in cfs
+    """
+    uh = np.asarray(unit_hydrographs, dtype=float)
+    excess = np.asarray(excess, dtype=float)
+    if excess.ndim == 1:
+        excess = excess[None, :]
+    size = uh.shape[-1] + excess.shape[-1] - 1
+    nfft = 1 << int(np.ceil(np.log2(size)))
+    uh_f = np.fft.rfft(uh, nfft)[:, None, :]
+    excess_f = np.fft.rfft(excess, nfft)
+    if excess_f.ndim == 2:
+        excess_f = excess_f[None, :, :]
+    flows = np.fft.irfft(uh_f * excess_f, nfft)[..., :size]
+    # round-off of the transform leaves tiny negative flows
+    return np.maximum(flows, 0.0)
+
+
+def subbasin_hydrographs(bdf, area, excess, dt, n_steps=None):
+    """
+    Outflow hydrographs of sub-basins from their BDF and drainage area.
+    :param bdf: (n,) basin development factors
+    :param area: (n,) drainage area in sq. mi.
+    :param excess: (s, p) or (n, s, p) incremental excess rainfall in in. per dt
+    :param dt: time step in hrs
+    :param n_steps: number of unit hydrograph ordinates
+    :return: times (hrs), (n, s, t) hydrographs in cfs, peak flows (n, s) and the Tc and R used
+    """
+    bdf = np.atleast_1d(np.asarray(bdf, dtype=float))
+    area = np.atleast_1d(np.asarray(area, dtype=float))
+    tc, r = compute_tc_r(bdf, area)
+    uh = clark_unit_hydrographs(tc, r, area, dt, n_steps=n_steps)
+    flows = convolve_hydrographs(uh, excess)
+    times = np.arange(1, flows.shape[-1] + 1) * dt
+    return times, flows, flows.max(axis=-1), tc, r
@@ -2,23 +2,124 @@ import os
 import datetime
 from datetime import timedelta
 import bisect
-import pandas as pd
 import traceback
+import stat
+import tempfile
 import math
 import numpy as np
 import arcpy
 from collections import OrderedDict
-
-
-def write_lines(file_path, lines,append=True):
-    if append:
-        with open(file_path, 'a') as fi:
-            fi.writelines(lines)
-    else:
+from ReachGraph import ReachGraph
+from lanHydro import compute_tc_r_array
+from RefData import ref_data
+
+
+def default_file_mode():
+    """Permissions a newly created file gets from open() under the current umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def write_atomic(file_path, lines):
+    """Writes lines to a temporary file next to file_path and renames it onto file_path, so a HEC-HMS project file is
+    never left partially written. The file keeps the permissions of the file it replaces, a new file gets the umask
+    default rather than the private mode of the temporary file."""
+    folder = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.{0}.'.format(os.path.basename(file_path)), suffix='.tmp', dir=folder)
+    try:
+        with os.fdopen(fd, 'w') as fi:
+            fi.write(''.join(lines))
         if os.path.exists(file_path):
-            os.remove(file_path)
-        with open(file_path, 'w+') as fi:
-            fi.writelines(lines)
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+        else:
+            os.chmod(tmp_path, default_file_mode())
+        if hasattr(os, 'replace'):
+            os.replace(tmp_path, file_path)
+        else:
+            # Python 2 os.rename does not overwrite on Windows
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            os.rename(tmp_path, file_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return file_path
+
+
+def update_basin_tc_r(basin_fc, bdf_field='BDF', area_field='Area_SqMi', tc_field='Tc_Hr', r_field='R_Hr'):
+    """Computes Tc and R of the HMS basins in one vectorized call. Stand-alone step, run on the basin feature class
+    (HMS_Model.basin_fc) once its BDF field has been attributed. Basins with a null or out of range (0 - 12) BDF keep
+    their Tc and R unset."""
+    with arcpy.da.SearchCursor (basin_fc , (bdf_field, area_field)) as searchBDF:
+        bdf_area = np.array([(np.nan if row[0] is None else row[0],
+                              np.nan if row[1] is None else row[1]) for row in searchBDF], dtype=float)
+    if len(bdf_area) == 0:
+        return basin_fc
+    tc, r = compute_tc_r_array(bdf_area[:, 0], bdf_area[:, 1])
+    with arcpy.da.UpdateCursor (basin_fc , (tc_field, r_field)) as updateTcR:
+        for i, row in enumerate(updateTcR):
+            if not tc.mask[i]:
+                updateTcR.updateRow((float(tc[i]), float(r[i])))
+    return basin_fc
+
+
+def render_block(kind, name, fields):
+    """
+    Renders a HEC-HMS component block (i.e. Subbasin, Junction, Reach, Meteorology, Run).
+    :param kind: block type, the first line is "kind: name"
+    :param name: component name
+    :param fields: ordered (key, value) pairs, None adds a blank line
+    :return: list of lines ending with "End:"
+    """
+    lines = ["{0}: {1}\n".format(kind, name)]
+    for field in fields:
+        if field is None:
+            lines.append("\n")
+        else:
+            lines.append("\t {0}: {1}\n".format(field[0], field[1]))
+    lines.append("End:\n\n")
+    return lines
+
+
+def precip_method_fields(storm, depths, time_step):
+    """
+    Fields of the frequency based hypothetical storm block of a met file.
+    :param storm: storm event (i.e. 100)
+    :param depths: depths (in.) of the 7 tabulated durations, shortest first
+    :param time_step: HMS time interval in minutes
+    :return: ordered (key, value) pairs for render_block
+    """
+    ex_freq = {10:10, 25:4, 50:2, 100:1, 500:0.2}
+    # HMS reads 12 depths (5 min to 10 day), 0.0 for 5 min, the 7 tabulated durations, then 0.0 for 2 to 10 days
+    depths = [0.0] + list(depths[:7])
+    depths += [0.0] * (12 - len(depths))
+    fields = [("Exceedence Frequency", ex_freq[storm]),
+              ("Single Hypothetical Storm Size", "Yes"),
+              ("Convert From Annual Series", 'Yes' if storm not in range(2,1000) else 'No'),
+              ("Convert to Annual Series", 'Yes' if storm in range (2 , 1000) else 'No'),
+              ("Storm Size", 0.01),
+              ("Total Duration", 1440),
+              ("Time Interval", time_step)]
+    fields += [("Depth", depth) for depth in depths] #in inches
+    return fields
+
+
+class HMSFileEmitter(object):
+    """Buffers the rendered blocks of a HEC-HMS project file, written at once by flush()."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lines = []
+
+    def block(self, kind, name, fields):
+        self.lines.extend(render_block(kind, name, fields))
+
+    def flush(self):
+        write_atomic(self.file_path, self.lines)
+        self.lines = []
+        return self.file_path
 
 class HMS_Model(object):
 
@@ -91,6 +192,7 @@ class HMS_Model(object):
         self.duration = duration
         self.met_titles = {}
         self.control_title = control_name
+        self.basin_fc = None
         # Begins Creating Geometries
         print('Creating Geometr Data:')
         self.run_hms_gis_model_prep(self.subcatchment_fc, self.subreach_fc)
@@ -137,8 +239,7 @@ class HMS_Model(object):
                 pnts.append (arcpy.Point (xx , yy))
             return arcpy.Polygon (arcpy.Array (pnts))
 
-        def create_junctions(shp_folder, spatial_reference, subreach_fc, dissolved_reach_fc, intersection_fc,
-                                      subreach_field_name="SubReach_ID", unit_number_field = "UnitNumber"):
+        def create_junctions(shp_folder, spatial_reference, subreach_fc, graph, intersection_fc):
 
             bounding_sub_reach_points = {}
             bounding_points_buffers =[]
@@ -148,21 +249,17 @@ class HMS_Model(object):
             short_tribs = []
 
             # Accquires all unit numbers of dissolved feature class
-            with arcpy.da.SearchCursor (dissolved_reach_fc , (unit_number_field )) as dissC:
-                for drow in dissC:
-                    unitNumber = str (drow[ 0 ])
-                    if isLevel1:
-                        short_tribs.append (unitNumber[ :4 ])
-                    else:
-                        short_tribs.append(unitNumber[:7])
+            for unitNumber in graph.tributaries:
+                if self.isLevel1:
+                    short_tribs.append (unitNumber[ :4 ])
+                else:
+                    short_tribs.append(unitNumber[:7])
 
-            with arcpy.da.SearchCursor (intersection_fc , ('SHAPE@' )) as dissC:
-                for drow in dissC:
-                    total_points += 1
+            total_points = len(graph.intersections)
 
             # Ordred list of unit number from the dissolved feature class
             uniqueTribs = list(sorted(list(set(short_tribs)), reverse=False))
-            if isLevel1:
+            if self.isLevel1:
                 mainstem = uniqueTribs[0]+"-00-00"
             else:
                 mainstem = uniqueTribs[ 0 ] + "-00"
@@ -174,104 +271,97 @@ class HMS_Model(object):
             mainstem_length = None
             for uniTrib in uniqueTribs:
                 unitNumber = uniTrib + "-00"
-                q_exp = "\"{0}\" LIKE '{1}'".format (unit_number_field , unitNumber)
                 print("\t\t|-UnitNumber: {0}".format(unitNumber))
                 #Searches through all dissolved tributaries in alpha_numeric order starting with the mainstem.
-                with arcpy.da.SearchCursor(dissolved_reach_fc, (unit_number_field, "SHAPE@"), q_exp) as dissC:
-                    for drow in dissC:
-                        pline = drow[1]
-                        total_length = pline.length
-                        if str(drow[0]) == mainstem:
-                            bounding_point = pline.firstPoint
-                            chk_point = pline.firstPoint
-                            mainstem_line = pline
-                            mainstem_length = total_length
-                            if isLevel1:
-                                name = "{0}_{1:.0f}J".format (unitNumber[ :4 ] , round(total_length))
-                            else:
-                                name = "{0}_{1:.0f}J".format (unitNumber[ :7 ] , round (total_length))
-                            filtered_points += 1
-                            circ = create_circle (bounding_point.X , bounding_point.Y , 200.0)
-                            bounding_points_buffers.append (circ)
-                            bounding_sub_reach_points[ pnt_index ] = {}
-                            bounding_sub_reach_points[ pnt_index ][ 'Point' ] = bounding_point
-                            bounding_sub_reach_points[ pnt_index ][ 'UnitNumber' ] = unitNumber
-                            bounding_sub_reach_points[ pnt_index ][ 'SubReach' ] = None
-                            bounding_sub_reach_points[ pnt_index ][ 'JunctionName' ] = name
-                            bounding_sub_reach_points[ pnt_index ][ 'ReachDistance' ] = round(total_length)
-                            pnt_index += 1
+                for pline in graph.tributaries.get(unitNumber, []):
+                    total_length = pline.length
+                    if unitNumber == mainstem:
+                        bounding_point = pline.firstPoint
+                        chk_point = pline.firstPoint
+                        mainstem_line = pline
+                        mainstem_length = total_length
+                        if self.isLevel1:
+                            name = "{0}_{1:.0f}J".format (unitNumber[ :4 ] , round(total_length))
+                        else:
+                            name = "{0}_{1:.0f}J".format (unitNumber[ :7 ] , round (total_length))
+                        filtered_points += 1
+                        circ = create_circle (bounding_point.X , bounding_point.Y , 200.0)
+                        bounding_points_buffers.append (circ)
+                        bounding_sub_reach_points[ pnt_index ] = {}
+                        bounding_sub_reach_points[ pnt_index ][ 'Point' ] = bounding_point
+                        bounding_sub_reach_points[ pnt_index ][ 'UnitNumber' ] = unitNumber
+                        bounding_sub_reach_points[ pnt_index ][ 'SubReach' ] = None
+                        bounding_sub_reach_points[ pnt_index ][ 'JunctionName' ] = name
+                        bounding_sub_reach_points[ pnt_index ][ 'ReachDistance' ] = round(total_length)
+                        pnt_index += 1
+                    # Searches Intersection Point FC  and  identifies those pointes found between those points
+                    for subReach in graph.subreaches_of(unitNumber):
+                        sr_line = graph.subreaches[subReach]['Shape']
+                        sr_buffer = sr_line.buffer(2)
+                        sr_start_point = sr_line.firstPoint
+                        sr_last_point = sr_line.lastPoint
+                        dist_to_start = round (total_length - pline.measureOnLine (sr_start_point, False) )
+                        dist_to_end = round (total_length - pline.measureOnLine (sr_last_point, False) )
+                        sr_dict[subReach] = {'Upper':dist_to_start, "Lower":dist_to_end}
+                        sr_dict['TotalLength'] = round(total_length)
+                        adj_end = dist_to_end +200
+                        # print("\t\t\t\t|-Start Dist.: {0} ft.-|".format (dist_to_start))
+                        # print("\t\t\t\t|-End Dist.: {0} ft.-|".format (dist_to_end))
                         # Searches Intersection Point FC  and  identifies those pointes found between those points
-                        with arcpy.da.SearchCursor(subreach_fc, (subreach_field_name, "SHAPE@"), q_exp) as srC:
-                            for srow in srC:
-                                subReach = str(srow[0])
-                                sr_line = srow[1]
-                                sr_buffer = sr_line.buffer(2)
-                                sr_start_point = sr_line.firstPoint
-                                sr_last_point = sr_line.lastPoint
-                                dist_to_start = round (total_length - pline.measureOnLine (sr_start_point, False) )
-                                dist_to_end = round (total_length - pline.measureOnLine (sr_last_point, False) )
-                                sr_dict[subReach] = {'Upper':dist_to_start, "Lower":dist_to_end}
-                                sr_dict['TotalLength'] = round(total_length)
-                                adj_end = dist_to_end +200
-                                # print("\t\t\t\t|-Start Dist.: {0} ft.-|".format (dist_to_start))
-                                # print("\t\t\t\t|-End Dist.: {0} ft.-|".format (dist_to_end))
-                                # Searches Intersection Point FC  and  identifies those pointes found between those points
-                                with arcpy.da.SearchCursor (intersection_fc , ("SHAPE@"), q_exp) as intPC:
-                                    for irow in intPC:
-                                        pnt = irow[ 0 ].firstPoint
-                                        dit_to_pnt = round (total_length - pline.measureOnLine (pnt, False) )
-                                        srl_pnt = sr_line.measureOnLine (pnt , False)
-                                        intersects_subreach = pnt.within(sr_buffer,)
-                                        # Checks if the point if  observed is within the bounds of the subreach fc.
-                                        if (dit_to_pnt <= sr_last_point) and  (dit_to_pnt >= adj_end ) and intersects_subreach:
-                                            if len(bounding_points_buffers) == 0:
-                                                bounding_point = sr_start_point
-                                                if isLevel1:
-                                                    name = "{0}_{1:.0f}J".format (unitNumber[ :4 ] , dist_to_start)
-                                                else:
-                                                    name = "{0}_{1:.0f}J".format (unitNumber[:7] , dist_to_start)
-                                                filtered_points += 1
-                                                circ = create_circle (sr_start_point.X , sr_start_point.Y , 200.0)
-                                                bounding_points_buffers.append(circ)
-                                                bounding_sub_reach_points[ pnt_index ] = {}
-                                                bounding_sub_reach_points[pnt_index]['Point'] = bounding_point
-                                                bounding_sub_reach_points[ pnt_index ][ 'UnitNumber' ] = unitNumber
-                                                bounding_sub_reach_points[ pnt_index ][ 'SubReach' ] = subReach
-                                                bounding_sub_reach_points[ pnt_index ][ 'JunctionName' ] = name
-                                                bounding_sub_reach_points[ pnt_index ][
-                                                    'ReachDistance' ] = dist_to_start
-                                                pnt_index += 1
-                                                # print("\t\t\t\t\t|-Chk.Dist: {0}-|".format (dit_to_pnt))
-                                            else:
-                                                point_exists = None
-                                                # Checks all existin point to see if point already exists in system
-                                                exist_list = []
-                                                for buf in bounding_points_buffers:
-                                                    exist_list.append(sr_start_point.within(buf))
-                                                if True in exist_list:
-                                                    point_exists = True
-                                                else:
-                                                    point_exists = False
-                                                # Updates Bounding Points list
-                                                if not point_exists:
-                                                    bounding_point = sr_start_point
-                                                    if isLevel1:
-                                                        name = "{0}_{1:.0f}J".format (unitNumber[ :4 ] , dist_to_start)
-                                                    else:
-                                                        name = "{0}_{1:.0f}J".format (unitNumber[:7], dist_to_start)
-                                                    filtered_points += 1
-                                                    circ = create_circle (sr_start_point.X , sr_start_point.Y , 200.0)
-                                                    bounding_points_buffers.append (circ)
-                                                    bounding_sub_reach_points[ pnt_index ] = {}
-                                                    bounding_sub_reach_points[ pnt_index ][ 'Point' ] = bounding_point
-                                                    bounding_sub_reach_points[ pnt_index ][ 'UnitNumber' ] = unitNumber
-                                                    bounding_sub_reach_points[ pnt_index ][ 'SubReach' ] = subReach
-                                                    bounding_sub_reach_points[ pnt_index ][ 'JunctionName' ] = name
-                                                    bounding_sub_reach_points[ pnt_index ][ 'ReachDistance' ] = dist_to_start
-                                                    pnt_index += 1
-                                                    # print("\t\t\t\t\t|-Chk.Dist: {0}-|".format (dit_to_pnt))
-                                                else:
-                                                    overlaping_points += 1
+                        for pnt in graph.intersection_points(unitNumber):
+                            dit_to_pnt = round (total_length - pline.measureOnLine (pnt, False) )
+                            srl_pnt = sr_line.measureOnLine (pnt , False)
+                            intersects_subreach = pnt.within(sr_buffer,)
+                            # Checks if the point if  observed is within the bounds of the subreach fc.
+                            if (dit_to_pnt <= sr_last_point) and  (dit_to_pnt >= adj_end ) and intersects_subreach:
+                                if len(bounding_points_buffers) == 0:
+                                    bounding_point = sr_start_point
+                                    if self.isLevel1:
+                                        name = "{0}_{1:.0f}J".format (unitNumber[ :4 ] , dist_to_start)
+                                    else:
+                                        name = "{0}_{1:.0f}J".format (unitNumber[:7] , dist_to_start)
+                                    filtered_points += 1
+                                    circ = create_circle (sr_start_point.X , sr_start_point.Y , 200.0)
+                                    bounding_points_buffers.append(circ)
+                                    bounding_sub_reach_points[ pnt_index ] = {}
+                                    bounding_sub_reach_points[pnt_index]['Point'] = bounding_point
+                                    bounding_sub_reach_points[ pnt_index ][ 'UnitNumber' ] = unitNumber
+                                    bounding_sub_reach_points[ pnt_index ][ 'SubReach' ] = subReach
+                                    bounding_sub_reach_points[ pnt_index ][ 'JunctionName' ] = name
+                                    bounding_sub_reach_points[ pnt_index ][
+                                        'ReachDistance' ] = dist_to_start
+                                    pnt_index += 1
+                                    # print("\t\t\t\t\t|-Chk.Dist: {0}-|".format (dit_to_pnt))
+                                else:
+                                    point_exists = None
+                                    # Checks all existin point to see if point already exists in system
+                                    exist_list = []
+                                    for buf in bounding_points_buffers:
+                                        exist_list.append(sr_start_point.within(buf))
+                                    if True in exist_list:
+                                        point_exists = True
+                                    else:
+                                        point_exists = False
+                                    # Updates Bounding Points list
+                                    if not point_exists:
+                                        bounding_point = sr_start_point
+                                        if self.isLevel1:
+                                            name = "{0}_{1:.0f}J".format (unitNumber[ :4 ] , dist_to_start)
+                                        else:
+                                            name = "{0}_{1:.0f}J".format (unitNumber[:7], dist_to_start)
+                                        filtered_points += 1
+                                        circ = create_circle (sr_start_point.X , sr_start_point.Y , 200.0)
+                                        bounding_points_buffers.append (circ)
+                                        bounding_sub_reach_points[ pnt_index ] = {}
+                                        bounding_sub_reach_points[ pnt_index ][ 'Point' ] = bounding_point
+                                        bounding_sub_reach_points[ pnt_index ][ 'UnitNumber' ] = unitNumber
+                                        bounding_sub_reach_points[ pnt_index ][ 'SubReach' ] = subReach
+                                        bounding_sub_reach_points[ pnt_index ][ 'JunctionName' ] = name
+                                        bounding_sub_reach_points[ pnt_index ][ 'ReachDistance' ] = dist_to_start
+                                        pnt_index += 1
+                                        # print("\t\t\t\t\t|-Chk.Dist: {0}-|".format (dit_to_pnt))
+                                    else:
+                                        overlaping_points += 1
 
             # Creates Junction FC
             junction_fc_name = '{0}_HMSJunctions'.format (os.path.splitext(os.path.basename (subreach_fc))[0])
@@ -296,47 +386,43 @@ class HMS_Model(object):
 
                     if subReach is None:
                         print('\t\t\t\tSubReach:{0}'.format(subReach))
-                        sr_fields =(subreach_field_name, "SHAPE@")
-                        query_exp = "\"{0}\" LIKE '{1}'".format (unit_number_field , mainstem)
-                        with arcpy.da.SearchCursor(subreach_fc, sr_fields, query_exp) as srCursor:
-                            for srow in srCursor:
-                                sr = str(srow[0])
-                                first_point = srow[ 1 ].firstPoint
-                                last_point = srow[1].lastPoint
-                                dist_to_end = round(mainstem_length-mainstem_line.measureOnLine(last_point,False))
-                                if (round(first_point.X,2)== round(chk_point.X,2)) or (round(first_point.Y,2) == round(chk_point.Y,2)):
-                                    subReach = sr
-                                    sr_dict[ subReach ] = {'Upper': sr_dict['TotalLength'] , "Lower": dist_to_end}
-                                    print('\t\t\t\t|-{0}-|'.format (sr))
-                                    print('True')
+                        for sr in graph.subreaches_of(mainstem):
+                            first_point = graph.subreaches[sr]['Shape'].firstPoint
+                            last_point = graph.subreaches[sr]['Shape'].lastPoint
+                            dist_to_end = round(mainstem_length-mainstem_line.measureOnLine(last_point,False))
+                            if (round(first_point.X,2)== round(chk_point.X,2)) or (round(first_point.Y,2) == round(chk_point.Y,2)):
+                                subReach = sr
+                                sr_dict[ subReach ] = {'Upper': sr_dict['TotalLength'] , "Lower": dist_to_end}
+                                print('\t\t\t\t|-{0}-|'.format (sr))
+                                print('True')
                     station = bounding_sub_reach_points[ pnt_index ][ 'ReachDistance' ]
                     point = bounding_sub_reach_points[ pnt_index ][ 'Point' ]
                     inHMSModel = "TRUE" if unitNumber == mainstem else "FALSE"
                     row = (pnt_index , junctionName , unitNumber , subReach , station, inHMSModel, point ,)
                     juncIC.insertRow (row)
+                    graph.add_junction(pnt_index, junctionName, unitNumber, subReach, station, inHMSModel,
+                                       arcpy.PointGeometry(point, spatial_reference))
             print('::Cluster Report::\n\t|-Total Tributary Intersections: {0}'.format(total_points))
             print('\t|-Total Filtered Intersections Identified: {0}'.format(filtered_points))
             print('\t|-Total Overlapping Points Identified: {0}'.format(overlaping_points))
             arcpy.Delete_management(intersection_fc)
             return junction_fc, sr_dict
 
-        def create_basins(shp_folder, subcatchment_fc, junction_fc, subreach_fc, sr_dict,
-                          sub_catchment_field, subreach_name_field,
-                                     unitNumber_field, drains_to_field,
+        def create_basins(shp_folder, subcatchment_fc, graph, sr_dict,
+                          sub_catchment_field, unitNumber_field,
                           isLevel1 = True):
             root_trib = None
             print("\t\t|-Creating Basins")
-            with arcpy.da.SearchCursor(subreach_fc, (subreach_name_field)) as scCursor:
-                unis = []
-                tis = []
-                for row in scCursor:
-                    unitNumber = str(row[0])[:10]
-                    if isLevel1:
-                        tribIdentifier = str(row[0])[:4]
-                    else:
-                        tribIdentifier = str (row[ 0 ])[ :7 ]
-                    unis.append(unitNumber)
-                    tis.append(tribIdentifier)
+            unis = []
+            tis = []
+            for sub_reach in graph.subreaches:
+                unitNumber = sub_reach[:10]
+                if isLevel1:
+                    tribIdentifier = sub_reach[:4]
+                else:
+                    tribIdentifier = sub_reach[ :7 ]
+                unis.append(unitNumber)
+                tis.append(tribIdentifier)
             unitNumbers = list(sorted(list(set(unis)),reverse=False))
             tribIdentifiers= list (sorted (list (set (tis)) , reverse=False))
 
@@ -355,13 +441,8 @@ class HMS_Model(object):
                 basin_cnt += 1
                 return basin, basin_cnt
 
-            query_exp = "\"{0}\" LIKE '{1}'".format (unitNumber_field , main_unitNumber)
-            stations = []
-            junc_fields = ( unitNumber_field, 'SubReachID', 'Station', "Name")
             # Identifies Bounding Stations
-            with arcpy.da.SearchCursor(junction_fc,junc_fields, query_exp) as juncCursor:
-                for jrow in juncCursor:
-                    stations.append(jrow[2])
+            stations = [junc['Station'] for junc in graph.junctions_where(unit_number=main_unitNumber)]
             stations = list(sorted(stations, reverse=True))
             sta_pairs = {}
             for i, sta in enumerate(stations):
@@ -369,15 +450,10 @@ class HMS_Model(object):
                     sta_pairs[sta] = (sta,stations[i+1])
 
             juncs = {}
-            # Fields and stuff
-            sr_fields = ("FID", unitNumber_field, subreach_name_field, drains_to_field, "SHAPE@")
             cnt = 0
+            main_sub_reaches = graph.subreaches_of(main_unitNumber)
 
             for k, sta in enumerate(stations):
-                query_exp = "\"{0}\" LIKE '{1}' AND \"{2}\" = {3}".format (unitNumber_field ,
-                                                                           main_unitNumber,
-                                                                           "Station",
-                                                                           sta)
                 if k < len(stations) - 1:
                     upper_bound = sta_pairs[sta][0]
                     lower_bound = sta_pairs[sta][1]
@@ -387,55 +463,39 @@ class HMS_Model(object):
                 basin, cnt = get_basin_name(cnt)
                 scnt = 0
                 juncs[basin] = {'SubReaches':[], 'Junction':None}
-                with arcpy.da.SearchCursor(junction_fc, junc_fields, query_exp) as juncCursor:
-                    for jrow in juncCursor:
-                        unitNumber = str(jrow[0])
-                        juncName  = str(jrow[3])
-                        drns_to_exp = "\"{0}\" LIKE '{1}'".format (unitNumber_field , main_unitNumber)
-                        with arcpy.da.SearchCursor(sub_reach_fc,sr_fields, drns_to_exp) as srCursor:
-                            # First identifies break of tributaires on unitnumber
-                            for sr_row in srCursor:
-                                sub_reach = sr_row[2]
-                                st_point = sr_dict[sub_reach]['Upper']  - 20.0
-                                if st_point <= upper_bound and st_point >= lower_bound:
-                                    juncs[ basin ]['SubReaches'].append(sub_reach)
-                                    juncs[ basin ]['Junction'] = juncName
+                for junc in graph.junctions_where(unit_number=main_unitNumber, station=sta):
+                    juncName  = str(junc['Name'])
+                    # First identifies break of tributaires on unitnumber
+                    for sub_reach in main_sub_reaches:
+                        st_point = sr_dict[sub_reach]['Upper']  - 20.0
+                        if st_point <= upper_bound and st_point >= lower_bound:
+                            juncs[ basin ]['SubReaches'].append(sub_reach)
+                            juncs[ basin ]['Junction'] = juncName
 
 
 
 
             tribIdentifiers.pop(0)
             for k, trib in enumerate(tribIdentifiers):
-                sr_fields = ("FID" , unitNumber_field , subreach_name_field , drains_to_field , "SHAPE@")
-                trib_exp = "\"{0}\" LIKE '{1}%' AND \"{2}\" LIKE '{3}%'".format (drains_to_field ,
-                                                                                 main_unitNumber[:7],
-                                                                                 unitNumber_field,
-                                                                                 trib)
                 sub_reaches = []
                 drains_to_reach = None
-                with arcpy.da.SearchCursor (sub_reach_fc , sr_fields , trib_exp) as srCursor:
-                    for srRow in srCursor:
-                        sub_reach = str (srRow[  2  ])
-                        drains_to_sr = str(srRow[3])
-                        drains_to_trib = drains_to_sr[ :7 ]
+                for sub_reach in graph.subreaches_of(unit_prefix=trib, drains_to_prefix=main_unitNumber[:7]):
+                    drains_to_sr = str(graph.drains_to(sub_reach))
+                    drains_to_trib = drains_to_sr[ :7 ]
 
-                        sub_reaches.append(sub_reach)
-                        if drains_to_trib == main_unitNumber[:7]:
-                            drains_to_reach = drains_to_sr
+                    sub_reaches.append(sub_reach)
+                    if drains_to_trib == main_unitNumber[:7]:
+                        drains_to_reach = drains_to_sr
 
                 if drains_to_reach is not None:
-                    junc_fields = ("FID" , unitNumber_field , 'SubReachID' , "Name")
-                    query_exp = "\"{0}\" LIKE '{1}'".format (unitNumber_field , main_unitNumber)
-
-                    with arcpy.da.SearchCursor (junction_fc , junc_fields , query_exp) as juncCursor:
-                        for jrow in juncCursor:
-                            juncName = str (jrow[ 3 ])
-                            jSubReach = str(jrow[2])
-                            if jSubReach is not None and jSubReach == drains_to_reach:
-                                basin, cnt = get_basin_name(cnt)
-                                juncs[ basin ] = {'SubReaches': [ ] , 'Junction': None}
-                                juncs[ basin ][ 'SubReaches' ] = sub_reaches
-                                juncs[ basin ][ 'Junction' ] = juncName
+                    for junc in graph.junctions_where(unit_number=main_unitNumber):
+                        juncName = str (junc['Name'])
+                        jSubReach = str(junc['SubReachID'])
+                        if jSubReach is not None and jSubReach == drains_to_reach:
+                            basin, cnt = get_basin_name(cnt)
+                            juncs[ basin ] = {'SubReaches': [ ] , 'Junction': None}
+                            juncs[ basin ][ 'SubReaches' ] = sub_reaches
+                            juncs[ basin ][ 'Junction' ] = juncName
 
             basin_dict = {}
             #Adds HEC-HMS Basin Field
@@ -491,13 +551,11 @@ class HMS_Model(object):
                         row[0] = basin
                         pgon = row[1]
                         buffgon = pgon.buffer(50)
-                        with arcpy.da.SearchCursor (subreach_fc , (subreach_name_field, 'SHAPE@')) as scCursor:
-                            for rowp in scCursor:
-                                trib = str(rowp[0])[:10]
-                                pline = rowp[1]
-                                if buffgon.contains(pline):
-                                    basin_dict[ basin ] = trib
-                                    break
+                        for subreach, edge in graph.subreaches.items():
+                            trib = subreach[:10]
+                            if buffgon.contains(edge['Shape']):
+                                basin_dict[ basin ] = trib
+                                break
                         updateBasin.updateRow(row)
 
             arcpy.AddField_management (out_path , unitNumber_field , "TEXT" , field_length=30)
@@ -514,14 +572,11 @@ class HMS_Model(object):
                     basin = row[ 0 ]
                     pgon = row[ 2 ]
                     buffgon = pgon.buffer (20)
-                    with arcpy.da.SearchCursor (subreach_fc , (subreach_name_field , 'SHAPE@')) as scCursor:
-                        for rowp in scCursor:
-                            subreach = str(rowp[0])
-                            trib = subreach[:4] + "-00-00"
-                            pline= rowp[ 1 ]
-                            if buffgon.contains (pline):
-                                row[1] = trib
-                                break
+                    for subreach, edge in graph.subreaches.items():
+                        trib = subreach[:4] + "-00-00"
+                        if buffgon.contains (edge['Shape']):
+                            row[1] = trib
+                            break
                     updateBasin.updateRow (row)
 
             #Makes first attempt at identifying bounding junctions /nodes
@@ -533,21 +588,18 @@ class HMS_Model(object):
                     pgon = row[5]
                     buffgon = pgon.buffer(400)
                     if basin != ' ':
-                        junc_fields = ("FID" , unitNumber_field , 'Station' , "Name", "SHAPE@")
-                        qry_exp = "\"inHMSModel\" LIKE 'TRUE'"
                         bj_dict = {}
                         dn_junc = 'None'
                         up_junc  = 'None'
-                        with arcpy.da.SearchCursor (junction_fc , junc_fields , qry_exp) as juncCursor:
-                            for jrow in juncCursor:
-                                pnt = jrow[4]
-                                if pnt.within(buffgon) or pnt.touches(buffgon) :
-                                    station = int (jrow[ 2 ])
-                                    junc_name = str (jrow[ 3 ])
-                                    trib = junc_name[:7]
-                                    all_stas_dict[ station ] = junc_name
-                                    if trib == mainstem[:7]:
-                                        bj_dict[ station ] = junc_name
+                        for junc in graph.junctions_where(in_model='TRUE'):
+                            pnt = junc['Shape']
+                            if pnt.within(buffgon) or pnt.touches(buffgon) :
+                                station = int (junc['Station'])
+                                junc_name = str (junc['Name'])
+                                trib = junc_name[:7]
+                                all_stas_dict[ station ] = junc_name
+                                if trib == mainstem[:7]:
+                                    bj_dict[ station ] = junc_name
                         stations = [sta for sta in bj_dict.keys()]
                         stations = list(sorted(stations,reverse=False))
                         for i, sta in enumerate(stations):
@@ -693,6 +745,8 @@ class HMS_Model(object):
                     print('\t\t\t|-Identified HMS Sub-Basin:{0}'.format (row[0]))
                     updateAreas.updateRow(row)
 
+            #Tc_Hr and R_Hr are left unset, BDF is attributed afterwards (then run update_basin_tc_r)
+
             #Identify all downstream junctions with three or more
 
             return out_path
@@ -1003,17 +1057,19 @@ class HMS_Model(object):
             arcpy.Intersect_analysis (disolved_reaches , out_feature_class=intersection_fc ,
                                       cluster_tolerance=5 , join_attributes='ALL' , output_type='POINT')
 
-            junc_fc , sr_dict = create_junctions(shp_folder,sr, subreach_fc, disolved_reaches,
-                                                            intersection_fc,
-                                                            subreach_field_name=sub_reach_id_field,
-                                                            unit_number_field = unitnumber_field)
+            # Loads the sub-reach network once, junctions and basins are then identified from memory.
+            graph = ReachGraph(subreach_fc, subreach_name_field=sub_reach_id_field, drains_to_field=drains_to_field,
+                               unit_number_field=unitnumber_field)
+            graph.load_tributaries(disolved_reaches, unitnumber_field)
+            graph.load_intersections(intersection_fc, unitnumber_field)
+
+            junc_fc , sr_dict = create_junctions(shp_folder,sr, subreach_fc, graph, intersection_fc)
 
-            basin_fc = create_basins (shp_folder , subcatchment_fc , junc_fc , sub_reach_fc , sr_dict,
+            basin_fc = create_basins (shp_folder , subcatchment_fc , graph , sr_dict,
                                            sub_catchment_field=subcatchment_name_field ,
-                                           subreach_name_field=sub_reach_id_field ,
                                            unitNumber_field=unitnumber_field ,
-                                           drains_to_field=drains_to_field,
                                       isLevel1=self.isLevel1)
+            self.basin_fc = basin_fc
 
             process_hms_basin(basin_fc,unitnumber_field)
 
@@ -1055,73 +1111,88 @@ class HMS_Model(object):
         fn = os.path.join (self.folder_path , "{0}.control".format (self.control_title))
         now = datetime.datetime.now ()
         end_date = start_date+ timedelta (hours=duration)
-        start_line = "Run: {0}\n".format (self.control_title)
-        l1 = "\t Description: {0}\n".format (description)
-        l2 = "\t Last Modified Date: {0}\n".format (now.strftime("%d %B %Y"))  # DATE 31, Month Full Name, Year
-        l3 = "\t Last Modified Time: {0}\n".format (now.strftime("%H:%M:%S"))  # XX:XX Military Time
-        l4 = "\t Start Date: {0}\n".format (start_date.strftime("%d %B %Y"))  # DATE 31, Month Full Name, Year
-        l5 = "\t Start Time: 00:00\n"  # XX:XX Military Time
-        l6 = "\t End Date: {0}\n".format (end_date.strftime("%d %B %Y"))  # DATE 31, Month Full Name, Year
-        l7 = "\t End Time: {0}\n".format (end_date.strftime("%H:%M:%S"))  # XX:XX Military Time
-        l8 = "\t Time Interval: {0}\n".format (time_interval)  # Int in minutes.
-        end_line = "End:\n\n"
-        lines = [ start_line , l1 , l2 , l3 , l4 , l5 , l6 , l7 , l8 , end_line ]
-        write_lines (fn , lines , False)
-
-    def write_basin_files(self):
+        emitter = HMSFileEmitter(fn)
+        emitter.block("Control", self.control_title,
+                      [("Description", description),
+                       ("Last Modified Date", now.strftime("%d %B %Y")), # DATE 31, Month Full Name, Year
+                       ("Last Modified Time", now.strftime("%H:%M:%S")), # XX:XX Military Time
+                       ("Start Date", start_date.strftime("%d %B %Y")),
+                       ("Start Time", "00:00"),
+                       ("End Date", end_date.strftime("%d %B %Y")),
+                       ("End Time", end_date.strftime("%H:%M:%S")),
+                       ("Time Interval", time_interval)]) # Int in minutes.
+        emitter.flush()
+
+    def write_basin_files(self, sub_basins=(), junctions=(), reaches=(), version=3.4):
+        """
+        Writes the basin file, header, junction, reach and sub-basin blocks are rendered in one buffer.
+        :param sub_basins: dicts with Name, X, Y, Area (sq mi), Downstream, Tc and R (hrs) keys
+        :param junctions: dicts with Name, X, Y, Description and Downstream keys
+        :param reaches: dicts with Name, X, Y, FromX, FromY and Downstream keys
+        :param version: HEC-HMS version
+        :return: basin file path
+        """
 
         #Local Variables
         fn = os.path.join (self.folder_path , "{0}.basin".format (self.hms_filename))
-
-        def write_subbasin(basin, x, y, area, downstream, tc, r, adjoining_junction):
-            start = "Subbasin: {0}\n".format (basin)
-            l2 = "\t Canvas X: {0:.2f}\n".format(x)
-            l3= "\t Canvas Y: {0:.2f}\n".format(y)
-            l4 = "\t Label X: -14.0\n".format()
-            l5 = "\t Label Y: -14.0\n".format()
-            l6 = "\t Area: {0:.5f}\n".format (area) # in square miles
-            l7 = "\t Downstream: {0}\n\n".format (adjoining_junction)
-            l8 = "\t Canopy: None\n\n"
-            l9 = "\t Surface: None\n\n"
-            l10 = "\t Transform: Clark\n\n"
-            l11 = "\t Time of Concentration: {0:.2f}\n".format(tc) # in hours
-            l12 = "\t Storage Coefficient: {0:.2f}\n\n".format (r) # in hours
-            l13 = "\t Baseflow: None\n\n"
-            end = "End:\n\n"
-            basin_lines = [start, l2, l3, l4, l5, l6, l7, l8, l9, l10, l11,l12, l13, end]
-            pass
+        emitter = HMSFileEmitter(fn)
+
+        def write_subbasin(basin, x, y, area, downstream, tc, r):
+            emitter.block("Subbasin", basin,
+                          [("Canvas X", "{0:.2f}".format(x)),
+                           ("Canvas Y", "{0:.2f}".format(y)),
+                           ("Label X", "-14.0"),
+                           ("Label Y", "-14.0"),
+                           ("Area", "{0:.5f}".format(area)), # in square miles
+                           ("Downstream", downstream),
+                           None,
+                           ("Canopy", "None"),
+                           None,
+                           ("Surface", "None"),
+                           None,
+                           ("Transform", "Clark"),
+                           None,
+                           ("Time of Concentration", "{0:.2f}".format(tc)), # in hours
+                           ("Storage Coefficient", "{0:.2f}".format(r)), # in hours
+                           None,
+                           ("Baseflow", "None")])
 
         def write_junction(junc, x, y, description, adjoining_ds_feature):
-            start = "Junction: {0}\n".format(junc)
-            l2 = "\t Description: {0}\n".format(description)
-            l3 = "\t Canvas X: {0:.2f}\n".format(x)
-            l4 = "\t Canvas Y: {0:.2f}\n".format(y)
-            l5 = "\t Label X: 14.0\n"
-            l6 = "\t Label Y: 14.0\n"
-            l7 = "\t Downstream: {0}\n".format(adjoining_ds_feature)
-            end = "End:\n\n"
-            junction_lines = [start, l2, l3, l4, l5, l6,l7, end]
-            write_lines(fn, junction_lines, True)
-
-        def write_basin(version=3.4):
-            """
-            """
+            emitter.block("Junction", junc,
+                          [("Description", description),
+                           ("Canvas X", "{0:.2f}".format(x)),
+                           ("Canvas Y", "{0:.2f}".format(y)),
+                           ("Label X", "14.0"),
+                           ("Label Y", "14.0"),
+                           ("Downstream", adjoining_ds_feature)])
+
+        def write_reach(reach, x, y, from_x, from_y, downstream):
+            emitter.block("Reach", reach,
+                          [("Canvas X", "{0:.2f}".format(x)),
+                           ("Canvas Y", "{0:.2f}".format(y)),
+                           ("From Canvas X", "{0:.2f}".format(from_x)),
+                           ("From Canvas Y", "{0:.2f}".format(from_y)),
+                           ("Downstream", downstream),
+                           None,
+                           ("Route", "Lag"),
+                           ("Lag", 0),
+                           ("Channel Loss", "None")])
+
+        def write_basin():
             now = datetime.datetime.now()
-            start = "Basin: {0}".format(self.watershed)
-            l1 = "\t Last Modified Date: {0:%d} {0:%B} {0:%Y}\n".format(now)
-            l2 = "\t Last Modified Time: {0:%H}:{0:%M}:{0:%S}\n".format(now)
-            l3 = "\t Version: {0:.1f}\n".format(version)
-            l4 = "\t Unit System: English\n"
-            l5 = "\t Missing Flow To Zero: No\n"
-            l6 = "\t Enable Flow Ratio: No\n"
-            l7 = "\t Allow Blending: No\n"
-            l8 = "\t Compute Local Flow At Junctions: No\n\n"
-            l9="\t Enable Sediment Routing: No\n\n"
-            l10="\t Enable Quality Routing: No" \
-                "n"
-            end="End:\n\n"
-            basin_lines = [ start, l1, l2, l3, l4, l5 , l6, l7, l8, l9, l10, end]
-            write_lines(fn, basin_lines, True)
+            emitter.block("Basin", self.watershed,
+                          [("Last Modified Date", "{0:%d} {0:%B} {0:%Y}".format(now)),
+                           ("Last Modified Time", "{0:%H}:{0:%M}:{0:%S}".format(now)),
+                           ("Version", "{0:.1f}".format(version)),
+                           ("Unit System", "English"),
+                           ("Missing Flow To Zero", "No"),
+                           ("Enable Flow Ratio", "No"),
+                           ("Allow Blending", "No"),
+                           ("Compute Local Flow At Junctions", "No"),
+                           None,
+                           ("Enable Sediment Routing", "No"),
+                           None,
+                           ("Enable Quality Routing", "No")])
 
         def write_basin_schematic(ex_North, ex_South, ex_West, ex_East, ):
             """
@@ -1145,89 +1216,62 @@ class HMS_Model(object):
             "\t End:\n\n"
             """
 
-        if os.path.exists(fn):
-            os.remove(fn)
-
         write_basin()
+        for junc in junctions:
+            write_junction(junc['Name'], junc['X'], junc['Y'], junc.get('Description', ''), junc['Downstream'])
+        for reach in reaches:
+            write_reach(reach['Name'], reach['X'], reach['Y'], reach['FromX'], reach['FromY'], reach['Downstream'])
+        for basin in sub_basins:
+            write_subbasin(basin['Name'], basin['X'], basin['Y'], basin['Area'], basin['Downstream'],
+                           basin['Tc'], basin['R'])
+        return emitter.flush()
+
+    def write_meteorolgical_files(self, sub_basins, version=3.4):
+        """Creates Meteorolgoical files, one buffered file per storm event.
+        :param sub_basins: names of the sub-basins of the basin model
+        :param version: HEC-HMS version
+        """
+        now = datetime.datetime.now()
+        time_step = self.time_step
 
-    def write_meteorolgical_files(self, sub_basins):
-        """Creates Meteorolgoical files """
-
-        def write_met_description(fn, storm, basin_title, version=3.4):
-            now = datetime.datetime.now()
+        def write_met_description(emitter, storm, basin_title):
             met_title = "{0} ({1})".format(self.annual_exceedance[storm],  self.storm_event_dict[storm])
-            start_line = "Meteorology:: {0} \n".format(met_title)
-            l1 = '\t Description: {0} Frequency Storm Event. HCFCD meteorological {1}\n'.format(met_title,
-                                                                                               self.region)
-            l2 = '\t Last Modified Date: {0}'.format(now.strftime("%d %B %Y"))
-            l3 = '\t Last Modified Time: {0}\n'.format(now.strftime("%H:%M:%S"))
-            l4 = '\t Version: {0}\n'.format (version)
-            l5 = '\t Precipitation Method: Frequency Based Hypothetical\n'
-            l6 = '\t Radiation Method: None\n'
-            l7 = '\t Snowmelt Method: None\n'
-            l8 = '\t Evapotranspiration Method: No Evapotranspiration'
-            l9 = '\t Evapotranspiration Method: No Evapotranspiration'
-            l10 = '\t Use Basin Model: {0}'.format(basin_title)
-            end = "End:\n\n"
-            lines = [start_line, l1, l2, l3, l4, l5, l6, l7, l8, l9, l10, end]
-            write_lines (fn , lines , False)
+            emitter.block("Meteorology", met_title,
+                          [("Description", "{0} Frequency Storm Event. HCFCD meteorological {1}".format(met_title,
+                                                                                                       self.region)),
+                           ("Last Modified Date", now.strftime("%d %B %Y")),
+                           ("Last Modified Time", now.strftime("%H:%M:%S")),
+                           ("Version", version),
+                           ("Precipitation Method", "Frequency Based Hypothetical"),
+                           ("Radiation Method", "None"),
+                           ("Snowmelt Method", "None"),
+                           ("Evapotranspiration Method", "No Evapotranspiration"),
+                           ("Use Basin Model", basin_title)])
             return met_title
 
-        def write_met(fn, storm, depths, time_step=self.time_step):
+        def write_met(emitter, storm, depths):
             """ Applies Base Meteorolgical Infomratinn. """
-            ex_freq = {10:10, 25:4, 50:2, 100:1, 500:0.2}
-            start_line = "\t Precip Method Parameters: Frequency Based Hypothetical\n"
-            l1 = '\t Exceedence Frequency: {0}\n'.format(ex_freq[storm])
-            l2 = '\t Single Hypothetical Storm Size: Yes'
-            l3 = '\t Convert From Annual Series: {0}\n'.format('Yes' if storm not in range(2,1000) else 'No')
-            l4 = '\t Convert to Annual Series: {0}\n'.format ('Yes' if storm in range (2 , 1000) else 'No')
-            l5 = '\t Storm Size: 0.01\n'
-            l6 = '\t Total Duration: 1440\n'
-            l7 = '\t Time Interval: {0}\n'.format(time_step)
-            lines = [start_line, l1, l2, l3, l4, l5, l6, l7]
-            for i in range (0,11):
-                if i <= 6 :
-                    if i == 0:
-                        depth = "\t Depth: 0.0\n"#in inches
-                        lines.append(depth)
-                        depth = "\t Depth: {0}\n".format(depths[i]) #in inches
-                        lines.append(depth)
-                    else:
-                        depth = "\t Depth: {0}\n".format(depths[i]) #in inches
-                        lines.append(depth)
-                else:
-                    lines.append("\t Depth: 0.0\n".format(depths[i]))
-            end = "End:\n\n"
-            lines.append(end)
-            write_lines(fn, lines, True)
+            emitter.block("Precip Method Parameters", "Frequency Based Hypothetical",
+                          precip_method_fields(storm, depths, time_step))
 
-        def add_subbasins(list_of_basin_names, fn):
+        def add_subbasins(emitter, list_of_basin_names):
             """Adds all subbasins."""
             for basin in list_of_basin_names:
-                sb = "Subbasin: {0}".format(basin)
-                eb = "End:\n\n"
-                write_lines(fn, [sb,eb], True)
-
-        ref_csv = None
-        df = None
+                emitter.block("Subbasin", basin, [])
 
-        if self.isAtlas:
-            ref_csv = ".{0}_AtlasP.csv".format (self.region)
-            df = pd.read_csv (ref_csv)
-        else:
-            ref_csv = ".{0}_Precip.csv".format (self.region)
-            df = pd.read_csv (ref_csv)
+        precip_table = ref_data().precip_table(self.region, isAtlas14=self.isAtlas)
 
         for storm in self.storm_events:
             met_name = "{0}_{1}YR".format (self.annual_exceedance[ storm ] ,
                                            self.storm_event_dict[ storm ])  # Define Met name base on storm event
             omet_name = met_name.replace("%","_").replace("-","_").replace(" ","_")
-            fn = os.path.join (self.folder_path , "{0}.met".format (omet_name))
-            depths = df[self.storm_events[storm]].tolist()
-            met_title = write_met_description(fn, storm, self.basin_title)
+            emitter = HMSFileEmitter(os.path.join (self.folder_path , "{0}.met".format (omet_name)))
+            depths = precip_table.event_depths(storm).tolist()
+            met_title = write_met_description(emitter, storm, self.basin_title)
             self.met_titles[storm] = met_title
-            write_met(fn, storm, depths)
-            add_subbasins(sub_basins, fn)
+            write_met(emitter, storm, depths)
+            add_subbasins(emitter, sub_basins)
+            emitter.flush()
             print("\t\t|-{0} Created!".format (met_title))
 
     def write_runs(self, run_file_path):
@@ -1235,33 +1279,27 @@ class HMS_Model(object):
         now = datetime.datetime.now()
         control_title = self.control_title
         basin_title = self.basin_title
-        def write_run(run_file_name,  precip_title,
-                      description, isfirst = False):
-            start_line = "Run: {0}\n".format(precip_title)
-            l1 = "\t Default Description: Yes\n"
-            l2 = "\t Log File: {0}.log\n".format(precip_title.replace("%","_").replace(" ","_").replace("-","_").replace(".","_"))
-            l3 = "\t DSS File: {0}.dss\n".format(run_file_name)
-            l4 = "\t Basin: {0}\n".format(basin_title)
-            l5 = "\t Precip: {0}\n".format(precip_title)
-            l6 = "\t Control: {0}\n".format(control_title)
-            l7 = "\t Precip Last Execution Date: {0}\n".format(now.strftime("%d %B %Y"))
-            l8 = "\t Precip Last Execution Time:: {0}\n".format(now.strftime("%H:%M:%S"))
-            l9 = "\t Basin Last Execution Date: {0}\n".format(now.strftime("%d %B %Y"))
-            l10 = "\t Basin Last Execution Time: {0}\n".format(now.strftime("%H:%M:%S"))
-            end_line = "End:\n\n"
-            lines = [start_line, l1, l2, l3, l4, l5, l6, l7, l8, l9, l10, end_line]
-            if isfirst:
-                write_lines(fn,lines,append=False)
-            else:
-                write_lines(fn, lines,append=True)
+        emitter = HMSFileEmitter(fn)
+
+        def write_run(run_file_name,  precip_title):
+            log_name = precip_title.replace("%","_").replace(" ","_").replace("-","_").replace(".","_")
+            emitter.block("Run", precip_title,
+                          [("Default Description", "Yes"),
+                           ("Log File", "{0}.log".format(log_name)),
+                           ("DSS File", "{0}.dss".format(run_file_name)),
+                           ("Basin", basin_title),
+                           ("Precip", precip_title),
+                           ("Control", control_title),
+                           ("Precip Last Execution Date", now.strftime("%d %B %Y")),
+                           ("Precip Last Execution Time", now.strftime("%H:%M:%S")),
+                           ("Basin Last Execution Date", now.strftime("%d %B %Y")),
+                           ("Basin Last Execution Time", now.strftime("%H:%M:%S"))])
 
-        for i, storm in enumerate(self.storm_events):
+        for storm in self.storm_events:
             met_title = self.met_titles[storm]
-            if i == 0:
-                write_run(run_file_path, met_title, description='', isfirst=True)
-            else:
-                write_run (run_file_path , met_title, description='')
+            write_run(run_file_path, met_title)
             print('\t\t|-{0} Created!'.format(met_title))
+        emitter.flush()
 
 
 if __name__ == "__main__":
@@ -15,11 +15,14 @@ import arcpy
 import os
 from math import sin, cos, degrees
 import time
-import bisect
+import shutil
 import traceback
 import gc
+from multiprocessing import Pool
 from Geom import *
 from ArcGeom import generate_xy_stations, get_vertices, getSpatialReferencefactoryCode
+from Terrain import open_surface
+from BankDetection import pad_profiles, compact_profiles, first_pass_banks, trim_to_row, locate_banks, bank_flag
 from datetime import datetime, timedelta
 
 
@@ -71,240 +74,139 @@ def get_unique_trib_names(fc, trib_id_key_field):
     with arcpy.da.SearchCursor(fc, [trib_id_key_field]) as tribIDCursor:
         for row in tribIDCursor:
             og_trib_list.append(str(row[0]))
-    return list(set(og_trib_list))
+    return sorted(set(og_trib_list))
 
 def build_trib_exp(trib_identifier, trib_key_field):
     """Establishes a SQL query expresion associating a given tributary id"""
     return '"{0}"'.format(trib_key_field) + " LIKE '%{0}%'".format(trib_identifier)
 
 
+def produce_xs_array(xy_stas, des_xs_length=100.0, xs_interval=1.0):
+    """Generates every cross section of a tributary at once. Each XS is perpendicular to the segment ending at its
+    station, centered on the station and runs from its left end to its right end at xs_interval spacing.
+    :param xy_stas: stationing points of the tributary {"OID", "Stations", "X", "Y"} (see generate_xy_stations)
+    :param des_xs_length: length of the cross sections
+    :param xs_interval: distance between cross section vertices
+    :return: stations (list, one per XS) and a (n_xs, n_vertices, 2) array of the XS vertex coordinates.
+    """
+    x = np.asarray(xy_stas['X'], dtype=np.float64)
+    y = np.asarray(xy_stas['Y'], dtype=np.float64)
+    stations = list(xy_stas['Stations'][1:])
+    theta_p = np.arctan2(y[1:] - y[:-1], x[1:] - x[:-1]) + pi / 2.0
+    theta_p[theta_p < 0] += 2 * pi
+    # perpendiculars pointing straight up are flipped so vertical sections are always drawn top down
+    theta_p[np.round(np.degrees(theta_p)) == 90] -= pi
+    direction = np.column_stack((np.cos(theta_p), np.sin(theta_p)))
+    start = np.column_stack((x[1:], y[1:])) + (des_xs_length / 2.0) * direction
+    no_steps = int(np.floor((des_xs_length - xs_interval) / round(xs_interval, 2) + 1e-9)) + 1
+    offsets = xs_interval * np.arange(no_steps + 1, dtype=np.float64)
+    xs_array = start[:, None, :] - offsets[None, :, None] * direction[:, None, :]
+    return stations, xs_array
+
 def create_xs_for_trib_fc(fc, sta_seg_length,
                           xs_interval, xs_shp, trib, trib_exp, xs_length=500.0):
-    """"""
-
-    def produce_xs_for_trib(xy_stas , trib, des_xs_length=100.0, xs_interval = 1.0):
-        no_xs = len (xy_stas[ "OID" ])
-        half_des_length = des_xs_length / 2.0
-        xs_list = []
-        for i in range (no_xs):
-            xs_dict = {'Station':None,'X':[],'Y':[]}
-            if i != 0:
-                #Establisehes XS Station
-                station = xy_stas['Stations'][i]
-                xs_dict['Station'] = station
-                pt1X, pt1Y = xy_stas['X'][i-1], xy_stas['Y'][i-1]
-                pt2X , pt2Y = xy_stas[ 'X' ][ i ] , xy_stas[ 'Y' ][ i ]
-                theta_p = np.arctan2(float(pt2Y - pt1Y), float(pt2X-pt1X))
-                theta_p += pi/2.0
-                if theta_p < 0:
-                    theta_p += 2*pi
-                #Handles differnet angles
-                theta_p_deg = int(round(degrees(theta_p),0))
-                if (theta_p_deg == 0) or (theta_p_deg == 180):
-                    #X first, horizontal.
-                    if theta_p_deg == 90:
-                        theta_p -= pi
-                elif (theta_p_deg == 90) or (theta_p_deg == 270):
-                    #Y first, vertical.
-                    if theta_p_deg == 90:
-                        theta_p -= pi
-                # elif (theta_p_deg > 90) and (theta_p_deg < 180):
-                #     #Y first, Quardrant 2 move to Quadrant 4 add pi
-                #     theta_p += pi
-                # elif (theta_p_deg > 180) and (theta_p_deg < 270):
-                #     #Quadrant 3 move to Quadrant 1
-                #     theta_p -= pi
-                # elif (theta_p_deg > 0) and (theta_p_deg < 90):
-                #     # Moves Quadrant 1 to Quadrant 3
-                #     pass
-                # elif (theta_p_deg > 270) and (theta_p_deg < 360):
-                #     #Quadrant 3 move to Quadrant 1
-                #     pass
-
-
-                xdist = half_des_length * cos (theta_p)
-                ydist = half_des_length * sin (theta_p)
-                xstart = pt2X + xdist
-                ystart = pt2Y + ydist
-                xdist_total =  des_xs_length* cos (theta_p)
-                ydist_total = half_des_length * sin (theta_p)
-                xend = xstart + xdist_total
-                yend = ystart + ydist_total
-                # print('\t\t\t|-Station: {0}'.format(station))
-                # print('\t\t|-Center Point: ({0}, {1})\n\t\t|-XS Start: ({2}, {3})'.format(pt2X, pt2Y, xstart, ystart))
-                # print('\t\t|-XS End: ({0}, {1})'.format(xend, yend))
-                # print('\t\t|-Theta: {0}*\n\n'.format(theta_p_deg))
-                x_int_d = abs(xs_interval * cos (theta_p))
-                xp = None
-                yp = None
-                xi = None
-                yi = None
-                xs_run_length = 0.0
-                xs_dict[ 'X' ].append(xstart)
-                xs_dict[ 'Y' ].append(ystart)
-                #"Iterates between all intervals "
-                count = 0
-                while xs_run_length <= des_xs_length - xs_interval:
-                    xdist = -1 * xs_interval * cos (theta_p)
-                    ydist = -1 * xs_interval * sin (theta_p)
-
-                    if count == 0:
-                        xi = xstart + xdist
-                        yi = ystart + ydist
-                        a , b = get_legs (xstart, ystart, xi, yi)
-                    else:
-                        xi = xp + xdist
-                        yi = yp + ydist
-                        a , b = get_legs (xp , yp , xi , yi)
-                    xs_run_length += abs(getHypot(a, b))
-                    xs_dict[ 'X' ].append (xi)
-                    xs_dict[ 'Y' ].append (yi)
-                    xp = xi
-                    yp = yi
-                    count += 1
-                xs_list.append(xs_dict)
-        return xs_list
-
+    """Cuts the cross sections of a tributary every sta_seg_length and inserts them into xs_shp."""
     vertices, total_length = get_vertices(fc, trib_exp)
     xy_stas = generate_xy_stations(vertices,total_length, sta_seg_length)
-    xs_list = produce_xs_for_trib(xy_stas,trib,des_xs_length=xs_length,  xs_interval=xs_interval)
-    gc.collect()
+    stations, xs_array = produce_xs_array(xy_stas, des_xs_length=xs_length, xs_interval=xs_interval)
     with arcpy.da.InsertCursor (xs_shp , [ "Tributary" , "Station" , "SHAPE@" ]) as XSinsertcursor:
-        for j in range (len (xs_list)):
-            station = xs_list[j]['Station']
-            no_pts = len(xs_list[j]['X'])
-            pnts = [ ]
-            for k in range (no_pts):
-                pnt  = arcpy.Point(float (xs_list[j][ 'X' ][k ]) ,
-                                   float (xs_list[j][ 'Y' ][ k ]))
-                pnts.append(pnt)
-            ar = arcpy.Array(tuple(pnts))
+        for station, xs in zip(stations, xs_array):
+            ar = arcpy.Array([arcpy.Point(float(pnt[0]), float(pnt[1])) for pnt in xs])
             pline = arcpy.Polyline (ar)
             XSinsertcursor.insertRow ((trib , station , pline ,))
 
+def format_rows(arr, fmt):
+    """Formats every row of a 2D array with fmt in a single string operation (i.e. '\\t%.2f, %.2f, %.2f\\n')."""
+    arr = np.asarray(arr, dtype=np.float64)
+    if len(arr) == 0:
+        return ''
+    return (fmt * len(arr)) % tuple(arr.ravel().tolist())
+
+def write_sdf_file(newFile, reaches):
+    """Writes a HEC-RAS importable SDF file in a single buffered pass.
+    :param newFile: output .sdf path
+    :param reaches: list of reach dictionaries with the keys
+                    'river' - stream id, 'reach' - reach id, 'centerline' - (n, 2) array of the reach centerline,
+                    'stations' - list of XS stations ordered upstream to downstream,
+                    'banks' - (n_xs, 2) array of left/right bank positions,
+                    'xs' - (n_xs, n_vertices, 3) array or list of (n_vertices, 3) arrays of XS x, y, z coordinates.
+    :return: newFile
+    """
+    no_xs = sum(len(reach['stations']) for reach in reaches)
+    out = ['#This file is generated by HEC-GeoRAS Beta 1 for ArcGIS\n',
+           'BEGIN HEADER:\n',
+           'DTM TYPE: TIN\n',
+           'DTM: \\\n',
+           'STREAM LAYER: \\River\n',
+           'NUMBER OF REACHES: {0}\n'.format(len(reaches)),
+           'CROSS-SECTION LAYER: \\XSCutLines\n',
+           'NUMBER OF CROSS-SECTIONS: {0}\n'.format(no_xs),
+           'MAP PROJECTION: \nPROJECTION ZONE: \nDATUM: \nVERTICAL DATUM: \n',
+           'BEGIN SPATIAL EXTENT:\nXMIN: \nYMIN: \nXMAX: \nYMAX: \nEND SPATIAL EXTENT:\n',
+           'UNITS: \n',
+           'END HEADER:\n\n\n',
+           'BEGIN STREAM NETWORK:\n',
+           'ENDPOINT: , , , \n\n']
+    for reach in reaches:
+        out.append('REACH:\nSTREAM ID: {0}\nREACH ID: {1}\nFROM POINT: \nTO POINT: \nCENTERLINE:\n'.format(
+            reach['river'], reach['reach']))
+        out.append(format_rows(reach['centerline'], '\t%r, %r, ,\n'))
+        out.append('END:\n\n')
+    out.append('END STREAM NETWORK:\n\n\n')
+    out.append('BEGIN CROSS-SECTIONS:\n\n')
+    for reach in reaches:
+        stations = reach['stations']
+        sta = np.array([float(station) for station in stations])
+        lengths = np.round(np.append(sta[:-1] - sta[1:], 0.0), 2)
+        banks = np.round(np.sort(np.asarray(reach['banks'], dtype=np.float64), axis=1), 5)
+        for i, station in enumerate(stations):
+            line = format_rows(reach['xs'][i], '\t%.2f, %.2f, %.2f\n')
+            out.append('CROSS-SECTION:\nSTREAM ID: {0}\nREACH ID: {1}\nSTATION: {2}\nNODE NAME:\n'.format(
+                reach['river'], reach['reach'], station))
+            out.append('BANK POSITIONS: {0},{1}\n'.format(banks[i, 0], banks[i, 1]))
+            out.append('REACH LENGTHS: {0},{0},{0}\n'.format(lengths[i]))
+            out.append('NVALUES:\nLEVEE POSITIONS:\nINEFFECTIVE POSITIONS:\nBLOCKED POSITIONS:\n')
+            # the cut line and the surface line share the same draped vertices
+            out.append('CUT LINE:\n')
+            out.append(line)
+            out.append('SURFACE LINE:\n')
+            out.append(line)
+            out.append('END:\n\n')
+    out.append('END CROSS-SECTIONS:\n\n')
+    with open(newFile, 'w') as f:
+        f.write(''.join(out))
+    return newFile
+
 def create_trib_sdf_file(thePath, trib_fc_path, trip_exp, xs_path_, expXS, river):
     """
     based on Robert Henry's Script "writeRAS_GIS.py", the script generates HEC-RAS importable SDF files.
     """
-    buildResCursor = arcpy.da.SearchCursor (trib_fc_path , ("SHAPE@") , trip_exp)
-    # rowcount = len(list(i for i in buildResCursor))
-    # print "Rows: " + str(rowcount)
-    SurfaceLineList = [ ]
     newFile = os.path.join (thePath , river + ".sdf")
-    f = open (newFile , 'w')
     print ("\t\t9|-SDF Processing Reach {0}:".format (river))  # Prints the reach
-    for row2 in buildResCursor:
-        partnum = 0  # Prints the current multipont's ID
-        reach = river
-        XSCursor = arcpy.da.SearchCursor (xs_path_ , ("SHAPE@" ) , expXS)
-        rowcount = len (list (i for i in XSCursor))
-        del XSCursor
-        f.write ('#This file is generated by HEC-GeoRAS Beta 1 for ArcGIS' + '\n')
-        f.write ('BEGIN HEADER:' + '\n')
-        f.write ('DTM TYPE: TIN' + '\n')
-        f.write ('DTM: \\' + '\n')
-        f.write ('STREAM LAYER: \River' + '\n')
-        f.write ('NUMBER OF REACHES: 1' + '\n')
-        f.write ('CROSS-SECTION LAYER: \XSCutLines' + '\n')
-        f.write ('NUMBER OF CROSS-SECTIONS: ' + str (rowcount) + '\n')
-        f.write ('MAP PROJECTION: ' + '\n')
-        f.write ('PROJECTION ZONE: ' + '\n')
-        f.write ('DATUM: ' + '\n')
-        f.write ('VERTICAL DATUM: ' + '\n')
-        f.write ('BEGIN SPATIAL EXTENT:' + '\n')
-        f.write ('XMIN: ' + '\n')
-        f.write ('YMIN: ' + '\n')
-        f.write ('XMAX: ' + '\n')
-        f.write ('YMAX: ' + '\n')
-        f.write ('END SPATIAL EXTENT:' + '\n')
-        f.write ('UNITS: ' + '\n')
-        f.write ('END HEADER:' + '\n')
-        f.write ('\n')
-        f.write ('\n')
-        f.write ('BEGIN STREAM NETWORK:' + '\n')
-        f.write ('ENDPOINT: , , , ' + '\n')
-        f.write ('\n')
-        f.write ('REACH:' + '\n')
-        f.write ('STREAM ID: ' + river + '\n')
-        f.write ('REACH ID: ' + reach + '\n')
-        f.write ('FROM POINT: ' + '\n')
-        f.write ('TO POINT: ' + '\n')
-        f.write ('CENTERLINE:' + '\n')
-
-        for part in row2[ 0 ]:
-            for vertex in part:
-                coords = '\t' + ("{0}, {1}, ,".format (vertex.X , vertex.Y))
-                f.write (coords + '\n')
-            partnum += 1
-
-        f.write ('END:' + '\n')
-        f.write ('\n')
-        f.write ('END STREAM NETWORK:' + '\n')
-        f.write ('\n')
-        f.write ('\n')
-    f.write ('BEGIN CROSS-SECTIONS:' + '\n')
-    f.write ('\n')
-    XSCursor = arcpy.da.SearchCursor (xs_path_ , ("SHAPE@" , 'Station', 'LOB', 'ROB') , expXS)
-    xs_cursor_list = list(r for r in XSCursor)
-    xs_shape = len(xs_cursor_list)
-    for i, row in enumerate(xs_cursor_list):
-        print('\t\t\t|-Reach Station: {0}'.format(row[1]))
-        SurfaceLineList = [ ]
-        pn = 0  # Prints the current multipont's ID
-        # print pn
-        station = str(row[ 1 ])
-        if i == xs_shape - 1:
-            dnst_reach_length = round(0.00,2)
-        else:
-            dnst_reach_length =round(float(row[ 1 ])-float(xs_cursor_list[i+1][1]),2)
-        lob, rob = round(row[2], 5), round(row[3], 5)
-        if rob < lob:
-            lob = round(row[3], 5)
-            rob = round(row[2], 5)
-        f.write ('CROSS-SECTION:' + '\n')
-        f.write ('STREAM ID: ' + river + '\n')
-        f.write ('REACH ID: ' + river + '\n')
-        f.write ('STATION: ' + str (station) + '\n')
-        f.write ('NODE NAME:' + '\n')
-        f.write ('BANK POSITIONS: {0},{1}'.format(lob, rob) + '\n')
-        f.write ('REACH LENGTHS: {0},{1},{2}'.format(dnst_reach_length, dnst_reach_length,dnst_reach_length) + '\n')
-        f.write ('NVALUES:' + '\n')
-        f.write ('LEVEE POSITIONS:' + '\n')
-        f.write ('INEFFECTIVE POSITIONS:' + '\n')
-        f.write ('BLOCKED POSITIONS:' + '\n')
-        f.write ('CUT LINE:' + '\n')
-
-        for p in row[ 0 ]:
-            # print ("Part {0}:".format(pn)) # Prints the part number
-
-            for v in p:
-                coordsXS = '\t' + ("{0}, {1}, {2}".format (round(v.X,2),
-                                                           round(v.Y,2) ,
-                                                           round(v.Z,2)))
-                SurfaceLineList.append (coordsXS)
-
-                f.write (coordsXS + '\n')
-        pn += 1
-
-        f.write ('SURFACE LINE:' + '\n')
-        for sl in SurfaceLineList:
-            f.write (sl + '\n')
-        f.write ('END:' + '\n')
-        f.write ('\n')
-
-    f.write ('END CROSS-SECTIONS:' + '\n')
-    f.write ('\n')
-
-    f.close ()
+    centerline = []
+    with arcpy.da.SearchCursor (trib_fc_path , ("SHAPE@") , trip_exp) as buildResCursor:
+        for row in buildResCursor:
+            for part in row[ 0 ]:
+                centerline += [[vertex.X, vertex.Y] for vertex in part if vertex]
+    stations, banks, xs = [], [], []
+    with arcpy.da.SearchCursor (xs_path_ , ("SHAPE@" , 'Station', 'LOB', 'ROB') , expXS) as XSCursor:
+        for row in XSCursor:
+            stations.append(str(row[1]))
+            banks.append([row[2], row[3]])
+            xs.append([[v.X, v.Y, v.Z] for p in row[0] for v in p if v])
+    reach = {'river': river, 'reach': river, 'centerline': np.reshape(centerline, (-1, 2)), 'stations': stations,
+             'banks': np.reshape(banks, (-1, 2)), 'xs': xs}
+    return write_sdf_file(newFile, [reach])
 
 
 def run_produce_xs(trib_fc, output_folder, outname, trib, trib_exp,
                    sta_seg_length=100, xs_interval=5.0, xs_length=500.0,isOptimized=False ):
 
-    if out_3D_xs_path.lower().find('.gdb') != -1:
-        isShp = False
-    else:
+    # creat_xs_fc writes a .shp when is_shp is False, feature classes within a geodatabase otherwise
+    if output_folder.lower().find('.gdb') != -1:
         isShp = True
+    else:
+        isShp = False
     if not isOptimized :
         print('\t\t0|-Producing 2D XS')
     else:
@@ -318,345 +220,85 @@ def run_produce_xs(trib_fc, output_folder, outname, trib, trib_exp,
     return shp
 
 
-def first_past_3D_XS( out_3D_xs_path,  xs_exp, search_top_width=100.0,
-                      vertices_spacing=5.0, channel_length = 1000.00, sta_spacing = 100):
-
-    search_rad = search_top_width / 2.0
-    overbank_data = []
-    print('\t\t3|-Identifying Relative Overbanks per XS')
-    up_invert = None
-    dn_invert = None
-    avg_avg_depth = 0
-    feature_count = 0
-
-    with arcpy.da.SearchCursor(out_3D_xs_path, ['OBJECTID'], xs_exp) as countCursor:
-        for row in countCursor:
-            feature_count += 1
-
-    #Iterates over all XS for a given Tributary
+def read_3D_xs(out_3D_xs_path, xs_exp):
+    """Reads every 3D XS of a tributary in a single cursor pass.
+    :param out_3D_xs_path: 3D XS feature class
+    :param xs_exp: XS selection expression
+    :return: object ids, list of vertex (arcpy.Point) lists, XS lengths, padded (n_xs, n_vertices, 2) coordinate
+             array, padded (n_xs, n_vertices) elevation array and the number of vertices per XS
+    """
+    oids, points, lengths = [], [], []
     with arcpy.da.SearchCursor(out_3D_xs_path, ['SHAPE@', 'OBJECTID'], xs_exp) as xs3Dcursor:
-        k = 1
-        for i, row in enumerate(xs3Dcursor):
-            length = row[0].length
-            seg_leg = list(np.arange(0,length+vertices_spacing,vertices_spacing))
-            cen_index = int(len(seg_leg)/2)-1
-            left_index = bisect.bisect_left(seg_leg, length/2 - search_rad)
-            right_index = bisect.bisect_right(seg_leg, length/2 + search_rad)
-            first_point  = row[0].firstPoint
-            xs_vertices_dict_left= {'Xs':[], 'Ys':[], 'Zs':[]}
-            xs_vertices_dict_right = { 'Xs': [ ] , 'Ys': [ ] , 'Zs': [ ]}
-            all_vertices = { 'Xs': [ ] , 'Ys': [ ] , 'Zs': [ ]}
-            for part in row[0]:
-                count = 0
-                for vertex in part:
-                    x = vertex.X
-                    y = vertex.Y
-                    z = vertex.Z
-                    if count>= left_index and count <= cen_index:
-                        xs_vertices_dict_left[ 'Xs' ].append (x)
-                        xs_vertices_dict_left[ 'Ys' ].append (y)
-                        xs_vertices_dict_left[ 'Zs' ].append (z)
-                    elif count > cen_index and count  <= right_index:
-                        xs_vertices_dict_right[ 'Xs' ].append (x)
-                        xs_vertices_dict_right[ 'Ys' ].append (y)
-                        xs_vertices_dict_right[ 'Zs' ].append (z)
-                    else:
-                        pass
-                    if (i == 0) or (i == feature_count -1) :
-                        all_vertices['Xs'].append(x)
-                        all_vertices['Ys'].append(y)
-                        all_vertices['Zs'].append(z)
-
-                    count += 1
-            #identifies local max overbanks on left and right side
-            #Left Side
-            left_min_invert = min(xs_vertices_dict_left['Zs'])
-            left_max_invert = max(xs_vertices_dict_left['Zs'])
-            left_max_index = xs_vertices_dict_left['Zs'].index(left_max_invert)
-
-            left_x = xs_vertices_dict_left[ 'Xs' ][left_max_index]
-            left_y = xs_vertices_dict_left[ 'Ys' ][left_max_index]
-            a_left , b_left = get_legs (first_point.X , first_point.Y , left_x , left_y)
-            left_length = abs (hypot (a_left , b_left))
-            rel_left_length = round(left_length / float(length),5)
-
-
-            #Right Side
-            right_min_invert = min(xs_vertices_dict_left['Zs'])
-            right_max_invert = max(xs_vertices_dict_right['Zs'])
-            right_max_index = xs_vertices_dict_right[ 'Zs' ].index (right_max_invert)
-            right_x = xs_vertices_dict_right[ 'Xs' ][right_max_index]
-            right_y = xs_vertices_dict_right[ 'Ys' ][right_max_index]
-            a_right , b_right = get_legs (first_point.X , first_point.Y , right_x , right_y)
-            right_length = abs(hypot(a_right, b_right))
-
-
-            left_depth = left_max_invert - left_min_invert
-            right_depth = right_max_invert - right_min_invert
-            avg_depth = 0.5 * (left_depth + right_depth)
-            avg_avg_depth += avg_depth
-            rel_right_length = round(right_length / float(length),5)
-
-            if (i == 0) or (i == feature_count - 1):
-                if i == 0:
-                    up_invert = 0.5*(left_min_invert+right_min_invert)
-                else:
-                    dn_invert = 0.5*(left_min_invert+right_min_invert)
-
-
-
-            xs_props = {"OBJECTID":row[1], "LOB":rel_left_length, "ROB":rel_right_length,
-                        "AvgDepth_ft":avg_depth}
-
-            overbank_data.append(xs_props)
-
-            k += 1
-    avg_avg_depth = avg_avg_depth / k
+        for row in xs3Dcursor:
+            oids.append(row[1])
+            lengths.append(row[0].length)
+            points.append([vertex for part in row[0] for vertex in part])
+    xy, counts = pad_profiles([[(vertex.X, vertex.Y) for vertex in pts] for pts in points])
+    z, _ = pad_profiles([[vertex.Z for vertex in pts] for pts in points])
+    return oids, points, np.array(lengths, dtype=np.float64), xy, z, counts
+
+
+def optimal_xs_spacing(xy, z, counts, search_top_width=100.0, vertices_spacing=5.0, channel_length=1000.00,
+                       lengths=None):
+    """Identifies the relative overbanks of the 1st pass XS and derives the optimized XS spacing from their average
+    depth and the invert slope between the first and last XS (see define_XS_Spacing).
+    :param xy: padded (n_xs, n_vertices, 2) XS coordinates (see BankDetection.pad_profiles)
+    :param z: padded (n_xs, n_vertices) XS elevations
+    :param counts: number of vertices of each XS
+    :param lengths: optional XS lengths, computed from the vertices when None
+    :return: XS spacing in ft.
+    """
+    #Identifies local max overbanks on left and right side of all XS for a given Tributary
+    banks = first_pass_banks(xy, z, counts, search_top_width, vertices_spacing, lengths)
+    up_invert = float(banks['Invert'][0])
+    dn_invert = float(banks['Invert'][-1])
+    avg_depths = banks['AvgDepth_ft'].tolist()
+    avg_avg_depth = 0
+    for avg_depth in avg_depths:
+        avg_avg_depth += avg_depth
+    # averaged over the XS count plus one, as the per-XS loop did
+    avg_avg_depth = avg_avg_depth / (len(avg_depths) + 1)
     stream_invert_drop = abs(up_invert - dn_invert)
     slope = stream_invert_drop / channel_length
     new_channel_spacing = int(define_XS_Spacing(avg_avg_depth,slope) )# in ft.
     if divmod(float(channel_length), float(new_channel_spacing))[0] <= 4:
         new_channel_spacing = rounddn(channel_length  / 3.0)
     print('\t\t4|-Optimized XS Spacing: {0} ft.'.format(new_channel_spacing))
+    return int(new_channel_spacing)
+
+
+def first_past_3D_XS( out_3D_xs_path,  xs_exp, search_top_width=100.0,
+                      vertices_spacing=5.0, channel_length = 1000.00, sta_spacing = 100):
+
+    print('\t\t3|-Identifying Relative Overbanks per XS')
+    oids, points, lengths, xy, z, counts = read_3D_xs(out_3D_xs_path, xs_exp)
+    new_channel_spacing = optimal_xs_spacing(xy, z, counts, search_top_width, vertices_spacing, channel_length,
+                                             lengths)
     #Deletes Firt Pass XS
     if arcpy.Exists(out_3D_xs_path):
         arcpy.Delete_management(out_3D_xs_path)
 
-    return int(new_channel_spacing)
+    return new_channel_spacing
 
 def optimized_3D_XS_spacing(trib_fc_path, out_3D_xs_path, sdf_output_folder, trib_exp,
                      xs_exp, river, search_top_width=400.0, vertices_spacing=5.0, row_width = 30):
-    search_rad = search_top_width / 2.0
     sref = getSpatialReferencefactoryCode(trib_fc_path)
-    overbank_data = [ ]
     print('\t\t7|-Optimizing 3D XS')
-    avg_avg_depth = 0
-    with arcpy.da.SearchCursor (out_3D_xs_path , [ 'SHAPE@' , 'OBJECTID'] , xs_exp) as xs3Dcursor:
-        k = 0
-        new_polyline = None
-        save_row = None
-        for i , row in enumerate (xs3Dcursor):
-            length = row[ 0 ].length
-            oid = row[1]
-            seg_leg = list (np.arange (0 , length + vertices_spacing , vertices_spacing))
-            cen_index = int (len (seg_leg) / 2) - 1
-            left_index = bisect.bisect_left (seg_leg , length / 2 - search_rad)
-            right_index = bisect.bisect_right (seg_leg , length / 2 + search_rad)
-            xs_vertices_dict_left = {'Xs': [ ] , 'Ys': [ ] , 'Zs': [ ]}
-            xs_vertices_dict_right = {'Xs': [ ] , 'Ys': [ ] , 'Zs': [ ]}
-            all_points = {'Xs': [ ] , 'Ys': [ ] , 'Zs': [ ]}
-            polyline_points = []
-            saved_polyline = row[0]
-            for part in row[ 0 ]:
-                count = 0
-                for vertex in part:
-                    x = vertex.X
-                    y = vertex.Y
-                    z = vertex.Z
-                    polyline_points.append(vertex)
-                    if count >= left_index and count <= cen_index:
-                        xs_vertices_dict_left[ 'Xs' ].append (x)
-                        xs_vertices_dict_left[ 'Ys' ].append (y)
-                        xs_vertices_dict_left[ 'Zs' ].append (z)
-                    elif count > cen_index and count <= right_index:
-                        xs_vertices_dict_right[ 'Xs' ].append (x)
-                        xs_vertices_dict_right[ 'Ys' ].append (y)
-                        xs_vertices_dict_right[ 'Zs' ].append (z)
-                    else:
-                        pass
-                    count += 1
-                    all_points['Xs'].append(x)
-                    all_points['Ys'].append(y)
-                    all_points['Zs'].append(z)
-            # Updates Polyline through ROW
-            # Left Side!
-
-            left_max_invert = max (xs_vertices_dict_left[ 'Zs' ])
-            left_max_index = xs_vertices_dict_left[ 'Zs' ].index (left_max_invert)
-            left_check_index = left_max_index + 5
-            left_check_index = len (xs_vertices_dict_left[ 'Zs' ]) - 1 if left_check_index > len (
-                xs_vertices_dict_left[ 'Zs' ]) - 1 else left_check_index
-            left_check_invert = xs_vertices_dict_left[ 'Zs' ][left_check_index]
-            original_left_index = left_max_index
-            original_lcheck_index = left_check_index
-            l_depth_check = left_max_invert - left_check_invert
-            ldepth_val = 2.0
-            while l_depth_check < ldepth_val:
-                left_max_index += 2
-                left_check_index += 2
-                left_check_index = len(xs_vertices_dict_left[ 'Zs' ]) -1 if left_check_index >len(xs_vertices_dict_left[ 'Zs' ]) -1  else left_check_index
-                left_max_index = len (xs_vertices_dict_left[ 'Zs' ]) - 1 if left_max_index >= len (
-                    xs_vertices_dict_left[ 'Zs' ]) - 1 else left_max_index
-                if left_max_index == left_check_index:
-                    ldepth_val -= 0.25
-                    left_max_index = original_left_index
-                    left_check_index= original_lcheck_index
-                left_max_invert = xs_vertices_dict_left[ 'Zs' ][left_max_index]
-                left_check_invert = xs_vertices_dict_left[ 'Zs' ][left_check_index]
-                l_depth_check = left_max_invert - left_check_invert
-                if int (ldepth_val) < 1.0:
-                    left_max_index = original_left_index
-                    left_max_invert = xs_vertices_dict_left[ 'Zs' ][ left_max_index ]
-                    l_depth_check = 12
-            left_row_index = left_max_index - int(round(row_width+10/vertices_spacing,0))
-            left_row_index = 0 if left_row_index < 0 else left_row_index
-            start__index = left_row_index + left_index
-            start__index = 0 if start__index < 0 else start__index
-
-            # Right Side!
-            right_max_invert = max (xs_vertices_dict_right[ 'Zs' ])
-            right_max_index = xs_vertices_dict_right[ 'Zs' ].index (right_max_invert)
-            right_check_index = right_max_index - 5
-            right_check_index = 0 if right_check_index < 0 else right_check_index
-            right_check_invert = xs_vertices_dict_right[ 'Zs' ][right_check_index]
-            original_right_max_index = right_max_index
-            original_rcheck_index = right_check_index
-            r_depth_check = right_max_invert - right_check_invert
-            rdepth_val = 2.0
-            while r_depth_check  < rdepth_val:
-                right_max_index -= 1
-                right_check_index -= 1
-                right_check_index = 0 if right_check_index < 0 else right_check_index
-                right_max_index = 0 if right_max_index < 0 else right_max_index
-                if right_check_index == right_max_index:
-                    rdepth_val -= 0.25
-                    right_max_index = original_right_max_index
-                    right_check_index = original_rcheck_index
-                right_max_invert = xs_vertices_dict_right[ 'Zs' ][right_max_index]
-                right_check_invert = xs_vertices_dict_right[ 'Zs' ][right_check_index]
-                r_depth_check = right_max_invert - right_check_invert
-                if int (rdepth_val) < 1.0:
-                    right_max_index = original_right_max_index
-                    r_depth_check = 12
-
-
-            right_row_index = right_max_index + int(round(row_width+10/vertices_spacing,0))
-            right_row_index = 0 if right_row_index < 0 else right_row_index
-            right_row_index = right_row_index if right_row_index <= len( xs_vertices_dict_right[ 'Zs' ]) -1  else len( xs_vertices_dict_right[ 'Zs' ]) -1
-            end_index = right_row_index + cen_index - 1
-            #Creates New Polyline extending the widths of the ROW
-            if end_index >= len(polyline_points)-1:
-                new_polyline = arcpy.Polyline(arcpy.Array(tuple(polyline_points[start__index:])), sref, True)
-            elif end_index < len(polyline_points)-1:
-                new_polyline = arcpy.Polyline(arcpy.Array(tuple(polyline_points[start__index:end_index+1])), sref, True)
-            else:
-                new_polyline = saved_polyline
-            #Adjusts ROW Computation
-            pline_length = new_polyline.length
-            first_point = new_polyline.firstPoint
-            seg_leg = list (np.arange (0 , pline_length + vertices_spacing , vertices_spacing))
-            cen_index = int (len (seg_leg) / 2) - 1
-            left_index = bisect.bisect_left (seg_leg , pline_length / 2 - search_rad)
-            right_index = bisect.bisect_right (seg_leg , pline_length / 2 + search_rad)
-            xs_vertices_dict_left = {'Xs': [ ] , 'Ys': [ ] , 'Zs': [ ]}
-            xs_vertices_dict_right = {'Xs': [ ] , 'Ys': [ ] , 'Zs': [ ]}
-            # print('\t\t\t7.1.{0}|-XS Sized. Identifying Bank Stations'.format(i))
-            #Identifies Stationing.
-            for part in new_polyline:
-                count = 0
-                for vertex in part:
-                    x = vertex.X
-                    y = vertex.Y
-                    z = vertex.Z
-                    if count >= left_index and count <= cen_index:
-                        xs_vertices_dict_left['Xs'].append(x)
-                        xs_vertices_dict_left['Ys'].append(y)
-                        xs_vertices_dict_left['Zs'].append(z)
-                    elif count > cen_index and count <= right_index:
-                        xs_vertices_dict_right['Xs'].append(x)
-                        xs_vertices_dict_right['Ys'].append(y)
-                        xs_vertices_dict_right['Zs'].append(z)
-                    else:
-                        pass
-                    count += 1
-            # identifies local max overbanks on left and right side
-            # Identifies Left Bank station  and Average Depth
-            flag = None
-            left_max_invert = max(xs_vertices_dict_left['Zs'])
-            left_max_index = xs_vertices_dict_left['Zs'].index(left_max_invert) + 2
-            left_max_index = len(xs_vertices_dict_left['Zs'])-1 if left_max_index >= len(xs_vertices_dict_left['Zs']) -1 else left_max_index
-            left_check_index = left_max_index + 5
-            left_check_index = len (xs_vertices_dict_left[ 'Zs' ]) - 1 if left_check_index > len (
-                xs_vertices_dict_left[ 'Zs' ]) - 1 else left_check_index
-            left_check_invert = xs_vertices_dict_left[ 'Zs' ][left_check_index]
-            original_left_index = left_max_index
-            original_lcheck_index = left_check_index
-            l_depth_check = left_max_invert - left_check_invert
-            ldepth_val = 2.0
-            while l_depth_check < ldepth_val:
-                left_max_index += 1
-                left_check_index += 1
-                left_check_index = len(xs_vertices_dict_left[ 'Zs' ]) -1 if left_check_index >len(xs_vertices_dict_left[ 'Zs' ]) -1  else left_check_index
-                left_max_index = len (xs_vertices_dict_left[ 'Zs' ]) - 1 if left_max_index >= len (
-                    xs_vertices_dict_left[ 'Zs' ]) - 1 else left_max_index
-                if left_max_index == left_check_index:
-                    ldepth_val -= 0.25
-                    left_max_index = original_left_index
-                    left_check_index= original_lcheck_index
-                left_max_invert = xs_vertices_dict_left[ 'Zs' ][left_max_index]
-                left_check_invert = xs_vertices_dict_left[ 'Zs' ][left_check_index]
-                l_depth_check = left_max_invert - left_check_invert
-                if int (ldepth_val) <= 1.0:
-                    left_max_index = original_left_index
-                    left_max_invert = xs_vertices_dict_left[ 'Zs' ][ left_max_index ]
-                    l_depth_check = 12
-                    flag = 'Flag L Bank'
-            left_x = xs_vertices_dict_left['Xs'][left_max_index]
-            left_y = xs_vertices_dict_left['Ys'][left_max_index]
-            a_left, b_left = get_legs(first_point.X, first_point.Y, left_x, left_y)
-            left_length = abs(hypot(a_left, b_left))
-            rel_left_length = round(left_length / float(pline_length), 5)
-
-            # Identifies Right Bank station  and Average Depth
-            right_max_invert = max(xs_vertices_dict_right['Zs'])
-            right_max_index = xs_vertices_dict_right['Zs'].index(right_max_invert) -2
-            right_max_index = 0 if right_max_index <= 0 else right_max_index
-            right_check_index = right_max_index - 5
-            right_check_index = 0 if right_check_index < 0 else right_check_index
-            original_right_max_index = right_max_index
-            original_rcheck_index = right_check_index
-            right_check_invert = xs_vertices_dict_right[ 'Zs' ][right_check_index]
-            r_depth_check = right_max_invert - right_check_invert
-            rdepth_val = 2.0
-            while r_depth_check  < rdepth_val:
-                right_max_index -= 1
-                right_check_index -= 1
-                right_check_index = 0 if right_check_index < 0 else right_check_index
-                right_max_index = 0 if right_max_index < 0 else right_max_index
-                if right_check_index == right_max_index:
-                    # print("\t\t\t\t\tCheck Depth Decreased to: {0}".format (ldepth_val))
-                    rdepth_val -= 0.25
-                    #Resets to RIGHT High point in XS
-                    right_max_index = original_right_max_index
-                    right_check_index = original_rcheck_index
-                right_max_invert = xs_vertices_dict_right[ 'Zs' ][right_max_index]
-                right_check_invert = xs_vertices_dict_right[ 'Zs' ][right_check_index]
-                # print('\t\t\t\t{0}|{1}|{2}'.format(right_max_index, right_check_index, len(xs_vertices_dict_right['Zs'])-1))
-                r_depth_check = right_max_invert - right_check_invert
-                if int (rdepth_val) <= 1.0:
-                    right_max_index = original_right_max_index
-                    right_max_invert = xs_vertices_dict_right[ 'Zs' ][ right_max_index ]
-                    r_depth_check = 12
-                    if flag is not None:
-                        flag = 'Flag LR Banks'
-                    else:
-                        flag = 'Flag R Bank'
-            right_x = xs_vertices_dict_right['Xs'][right_max_index]
-            right_y = xs_vertices_dict_right['Ys'][right_max_index]
-            a_right, b_right = get_legs(first_point.X, first_point.Y, right_x, right_y)
-            right_length = abs(hypot(a_right, b_right))
-            left_min_invert = min(xs_vertices_dict_left['Zs'])
-            left_depth = left_max_invert - left_min_invert
-            right_min_invert = min(xs_vertices_dict_left['Zs'])
-            right_depth = right_max_invert - right_min_invert
-            avg_depth = 0.5 * (left_depth + right_depth)
-            avg_avg_depth += avg_depth
-            rel_right_length = round(right_length / float(pline_length), 5)
-            xs_props = {"OBJECTID": oid, "LOB": rel_left_length, "ROB": rel_right_length,
-                        "AvgDepth_ft": avg_depth, 'Polyline': new_polyline, 'Flag':flag}
-
-            overbank_data.append(xs_props)
-
+    oids, points, lengths, xy, z, counts = read_3D_xs(out_3D_xs_path, xs_exp)
+    # Updates Polylines through ROW
+    start, stop = trim_to_row(xy, z, counts, search_top_width, vertices_spacing, row_width, lengths)
+    #Creates New Polylines extending the widths of the ROW
+    new_polylines = [arcpy.Polyline(arcpy.Array(tuple(pts[i0:i1])), sref, True)
+                     for pts, i0, i1 in zip(points, start.tolist(), stop.tolist())]
+    # Identifies Bank stations and Average Depth
+    banks = locate_banks(xy, z, start, stop, search_top_width, vertices_spacing,
+                         [new_polyline.length for new_polyline in new_polylines])
+    overbank_data = [ ]
+    for i, oid in enumerate(oids):
+        xs_props = {"OBJECTID": oid, "LOB": round(float(banks['LOB'][i]), 5), "ROB": round(float(banks['ROB'][i]), 5),
+                    "AvgDepth_ft": float(banks['AvgDepth_ft'][i]), 'Polyline': new_polylines[i],
+                    'Flag': bank_flag(banks['FlagL'][i], banks['FlagR'][i])}
+        overbank_data.append(xs_props)
 
     #Updates Optimizes each ROW XS
     with arcpy.da.UpdateCursor(out_3D_xs_path, ['OBJECTID', 'LOB', 'ROB', 'AvgDepth_ft', 'FCL', 'Flag', 'SHAPE@'], xs_exp) as uC:
@@ -694,13 +336,62 @@ def getRequiredExtensions():
     else:
         print ('\t|-Meet Extension Requirement: {0}'.format ('Spatial'))
 
-def create_3D_XS(path_2dXS, raster_path, out_path):
-
+def create_3D_XS(path_2dXS, raster_path, out_path, surface=None, method='bilinear'):
+    """Drapes the 2D cross sections over the terrain raster.
+    :param path_2dXS: 2D XS feature class (see creat_xs_fc)
+    :param raster_path: terrain raster
+    :param out_path: output 3D XS feature class
+    :param surface: optional Terrain.RasterSurface, samples the vertices with NumPy instead of 3D Analyst
+    :param method: 'bilinear' or 'nearest', only used with a surface
+    :return: out_path
+    """
     if arcpy.Exists(out_path):
         arcpy.Delete_management(out_path)
 
-    arcpy.InterpolateShape_3d (raster_path , path_2dXS , out_path , method="CONFLATE_ZMIN" ,
-                               vertices_only="VERTICES_ONLY")
+    if surface is None:
+        arcpy.InterpolateShape_3d (raster_path , path_2dXS , out_path , method="CONFLATE_ZMIN" ,
+                                   vertices_only="VERTICES_ONLY")
+    else:
+        sr = arcpy.Describe(path_2dXS).spatialReference
+        with arcpy.da.SearchCursor(path_2dXS, ["Tributary", "Station", "SHAPE@"]) as XSCursor:
+            rows = [(row[0], row[1], np.asarray([[pnt.X, pnt.Y] for pnt in row[2].getPart(0)], dtype=np.float64))
+                    for row in XSCursor]
+        # every XS is sampled in one call (one profile cache entry per XS feature class)
+        z = np.split(surface.sample(np.concatenate([xy for trib, station, xy in rows]), method),
+                     np.cumsum([len(xy) for trib, station, xy in rows])[:-1]) if rows else []
+        insert_3D_XS(out_path, sr, [(trib, station, xy, zi) for (trib, station, xy), zi in zip(rows, z)])
+    add_bank_fields(out_path)
+    return out_path
+
+
+def insert_3D_XS(out_path, sr, rows):
+    """Creates a 3D XS feature class and inserts sampled cross sections.
+    :param out_path: output 3D XS feature class
+    :param sr: spatial reference
+    :param rows: iterable of (tributary, station, (n, 2) vertex coordinates, (n,) elevations)
+    :return: out_path
+    """
+    arcpy.CreateFeatureclass_management(os.path.dirname(out_path), os.path.basename(out_path),
+                                        geometry_type="POLYLINE", has_m="DISABLED", has_z="ENABLED",
+                                        spatial_reference=sr)
+    arcpy.AddField_management (out_path , field_name="Tributary" , field_alias="Tributary" , field_type="TEXT" ,
+                               field_length=25 , )
+    arcpy.AddField_management (out_path , field_name="Station" , field_alias="Station" , field_type="TEXT" ,
+                               field_length=25 , )
+    with arcpy.da.InsertCursor(out_path, ["Tributary", "Station", "SHAPE@"]) as XSinsertcursor:
+        for trib, station, xy, z in rows:
+            # vertices off the raster are dropped as InterpolateShape does
+            keep = ~np.isnan(z)
+            if keep.sum() < 2:
+                continue
+            ar = arcpy.Array([arcpy.Point(float(pnt[0]), float(pnt[1]), float(pz))
+                              for pnt, pz in zip(xy[keep], z[keep])])
+            XSinsertcursor.insertRow((trib, station, arcpy.Polyline(ar, sr, True)))
+    return out_path
+
+
+def add_bank_fields(out_path):
+    """Adds the bank station fields populated by optimized_3D_XS_spacing."""
     arcpy.AddField_management (out_path , field_name="LOB" , field_alias="Left_Overbank" , field_type="FLOAT")
 
     arcpy.AddField_management (out_path , field_name="ROB" , field_alias="Right_Overbank" ,
@@ -714,12 +405,63 @@ def create_3D_XS(path_2dXS, raster_path, out_path):
 
     arcpy.AddField_management (out_path , field_name="Flag" , field_alias="Flag" , field_type="TEXT" ,
                                field_length=25 , )
-    return out_path
+
+
+def sample_xs_profiles(trib_fc, trib_exp, surface, sta_seg_length, xs_interval=2.5, xs_length=600.0,
+                       method='bilinear'):
+    """Cuts the XS of a tributary every sta_seg_length and samples the terrain under all of them in one pass. The
+    profiles are kept in memory so XS at a coarser spacing are derived from them (see derive_xs_profiles) instead of
+    being cut and read from the raster again.
+    :param surface: Terrain.RasterSurface
+    :return: {"sta_length", "stations", "xy" (n_xs, n_vertices, 2), "z" (n_xs, n_vertices), "vertices",
+              "total_length", "xs_interval", "xs_length"}
+    """
+    vertices, total_length = get_vertices(trib_fc, trib_exp)
+    xy_stas = generate_xy_stations(vertices, total_length, sta_seg_length)
+    stations, xs_array = produce_xs_array(xy_stas, des_xs_length=xs_length, xs_interval=xs_interval)
+    return {"sta_length": float(sta_seg_length), "stations": stations, "xy": xs_array,
+            "z": surface.sample(xs_array, method), "vertices": vertices, "total_length": total_length,
+            "xs_interval": xs_interval, "xs_length": xs_length}
+
+
+def derive_xs_profiles(profiles, sta_seg_length, surface, method='bilinear'):
+    """Derives the XS every sta_seg_length from cached profiles (see sample_xs_profiles). The XS are cut at the new
+    spacing exactly as the two pass workflow cuts them (their orientation depends on the spacing). A derived XS
+    identical to a cached XS reuses its sampled elevations, the others are sampled from the surface in one call.
+    :param profiles: cached profiles
+    :param sta_seg_length: station spacing of the derived XS
+    :param surface: Terrain.RasterSurface the cached profiles were sampled from
+    :return: stations (list), (n_xs, n_vertices, 2) coordinates and (n_xs, n_vertices) elevations
+    """
+    xy_stas = generate_xy_stations(profiles["vertices"], profiles["total_length"], sta_seg_length)
+    stations, xy = produce_xs_array(xy_stas, des_xs_length=profiles["xs_length"],
+                                    xs_interval=profiles["xs_interval"])
+    z = np.empty(xy.shape[:2], dtype=np.float64)
+    cached = dict((station, i) for i, station in enumerate(profiles["stations"]))
+    resample = []
+    for i, station in enumerate(stations):
+        j = cached.get(station)
+        if j is not None and np.array_equal(profiles["xy"][j], xy[i]):
+            z[i] = profiles["z"][j]
+        else:
+            resample.append(i)
+    if resample:
+        z[resample] = surface.sample(xy[resample], method)
+    return stations, xy, z
+
 
 def cutXS(trib_fc, temp_folder, trib_id_key_field, raster_path, output_gdb,
                      sta_seg_length=100, xs_interval=2.5,
-                      xs_length=600.0):
-    getRequiredExtensions()
+                      xs_length=600.0, terrain_backend=None, profile_cache_dir=None):
+    """Cuts and samples the 1st pass 3D XS of every tributary. With a terrain_backend, profile_cache_dir keeps the
+    sampled profiles on disk so repeated runs over the same cutlines skip the terrain sampling (see
+    Terrain.ProfileCache)."""
+    surface = None
+    if terrain_backend is None:
+        getRequiredExtensions()
+    else:
+        surface = open_surface(raster_path, None if terrain_backend == 'auto' else terrain_backend,
+                               cache_dir=profile_cache_dir)
     # Front end input Checks
     try:
         if xs_length / xs_interval > 500:
@@ -766,16 +508,187 @@ def cutXS(trib_fc, temp_folder, trib_id_key_field, raster_path, output_gdb,
                               xs_length=xs_length)
         print('\t\t1|-Creating 1st Pass 3D-XS')
         xs3d_path = os.path.join(output_gdb, 'iXS3D_{0}'.format(adj_trib_nam))
-        create_3D_XS(shp, raster_path, xs3d_path)
+        create_3D_XS(shp, raster_path, xs3d_path, surface=surface)
         #0 indicates no, 1 indicates yes
         gc.collect ()
+    if surface is not None:
+        surface.close()
+
+
+def trib_search_top_width(trib, forWPT=False):
+    """Width searched for overbanks around the XS center based on the tributary unit number."""
+    if trib[1] =='1':
+        if forWPT:
+            return 750
+        if trib[5:7] == '00':
+            return 750
+        #Seconds last segment of thing
+        if trib[-2:]!='00':
+            return 300
+        return 400
+    return 750
+
+
+def produce_trib_3d_xs(trib, trib_fc, trib_id_key_field, raster_path, temp_folder, output_gdb, sdf_output_folder,
+                       sta_seg_length=50, xs_interval=2.5, xs_length=600.0, row_width=30, forWPT=False,
+                       surface=None, single_pass=False):
+    """Runs the XS workflow of a single tributary: 2D XS, 1st pass 3D XS, spacing optimization, optimized 3D XS and
+    the SDF file. With single_pass and a surface the XS are cut in memory and no feature class round trip is made
+    between the passes (see single_pass_3d_xs).
+    :return: path of the optimized 3D XS feature class
+    """
+    print('\t%% Analyzing {0} %%'.format(trib))
+    adj_trib_nam = str(trib).replace(' ','').replace('-','_')
+    search_top_width = trib_search_top_width(trib, forWPT)
+    trib_exp = build_trib_exp (trib , trib_id_key_field)
+    xs_exp = '"Tributary" LIKE ' + "'%" + trib + "%'"
+    oxs3d_path = os.path.join(output_gdb, 'XS_{0}'.format(adj_trib_nam))
+    if single_pass and surface is not None:
+        single_pass_3d_xs(trib, trib_fc, trib_exp, surface, oxs3d_path, search_top_width,
+                          sta_seg_length=sta_seg_length, xs_interval=xs_interval, xs_length=xs_length)
+        optimized_3D_XS_spacing(trib_fc, oxs3d_path, sdf_output_folder, trib_exp,
+                                xs_exp, trib, search_top_width=search_top_width,
+                                vertices_spacing=xs_interval, row_width = row_width)
+        print('\t\tX|-Tributary Complete. SDF file ready for import into HEC-RAS!')
+        return oxs3d_path
+
+    shp = run_produce_xs (trib_fc , temp_folder , "XS2D_" , trib, trib_exp,
+                          sta_seg_length=sta_seg_length , xs_interval=xs_interval , xs_length=xs_length)
+
+    print('\t\t1|-Creating 1st Pass 3D-XS')
+    xs3d_path = os.path.join(output_gdb, 'iXS3D_{0}'.format(adj_trib_nam))
+    create_3D_XS(shp, raster_path, xs3d_path, surface=surface)
+
+    #0 indicates no, 1 indicates yes
+    print('\t\t2|-Identifying Optimal XS Spacing')
+    adjust_sta_length = first_past_3D_XS(out_3D_xs_path=xs3d_path, xs_exp=xs_exp,
+                                         search_top_width=search_top_width, vertices_spacing=xs_interval,
+                                         sta_spacing=sta_seg_length)
+    gc.collect()
+
+    opt_shp =   run_produce_xs(trib_fc , temp_folder,'OXS2D',trib, trib_exp,
+                               sta_seg_length=adjust_sta_length , xs_interval=xs_interval,
+                               xs_length=xs_length, isOptimized=True)
+    print('\t\t6|-Defining Optimized 3D-XS')
+    create_3D_XS(opt_shp, raster_path, oxs3d_path, surface=surface)
+    optimized_3D_XS_spacing(trib_fc, oxs3d_path, sdf_output_folder, trib_exp,
+                            xs_exp, trib, search_top_width=search_top_width,
+                            vertices_spacing=xs_interval, row_width = row_width)
+    print('\t\tX|-Tributary Complete. SDF file ready for import into HEC-RAS!')
+    return oxs3d_path
+
+
+def single_pass_3d_xs(trib, trib_fc, trib_exp, surface, oxs3d_path, search_top_width, sta_seg_length=50,
+                      xs_interval=2.5, xs_length=600.0):
+    """Produces the optimized 3D XS of a tributary from a single terrain pass. The 1st pass XS are sampled every
+    sta_seg_length and kept in memory, the optimized XS are cut in memory and only the XS not matching a 1st pass XS
+    are sampled again (see derive_xs_profiles).
+    :return: oxs3d_path
+    """
+    print('\t\t1|-Sampling 1st Pass 3D-XS')
+    profiles = sample_xs_profiles(trib_fc, trib_exp, surface, sta_seg_length, xs_interval=xs_interval,
+                                  xs_length=xs_length)
+    print('\t\t2|-Identifying Optimal XS Spacing')
+    print('\t\t3|-Identifying Relative Overbanks per XS')
+    xy, z, counts, _ = compact_profiles(profiles["xy"], profiles["z"])
+    adjust_sta_length = optimal_xs_spacing(xy, z, counts, search_top_width=search_top_width,
+                                           vertices_spacing=xs_interval)
+    print('\t\t6|-Deriving Optimized 3D-XS from 1st Pass Profiles')
+    stations, xy, z = derive_xs_profiles(profiles, adjust_sta_length, surface)
+    if arcpy.Exists(oxs3d_path):
+        arcpy.Delete_management(oxs3d_path)
+    insert_3D_XS(oxs3d_path, arcpy.Describe(trib_fc).spatialReference,
+                 [(trib, station, pnts, pz) for station, pnts, pz in zip(stations, xy, z)])
+    add_bank_fields(oxs3d_path)
+    return oxs3d_path
+
+
+# state of a tributary pool worker, set by init_trib_worker.
+_trib_worker = {}
+
+
+def init_trib_worker(scratch_root, raster_path, terrain_backend=None, profile_cache_dir=None):
+    """Pool initializer. Creates the worker's own scratch folder and file geodatabase, so workers never write to the
+    same workspace, and opens the worker's terrain surface (or checks out 3D Analyst)."""
+    folder = os.path.join(scratch_root, 'worker_{0}'.format(os.getpid()))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    gdb = os.path.join(folder, 'scratch.gdb')
+    if not arcpy.Exists(gdb):
+        arcpy.CreateFileGDB_management(folder, 'scratch.gdb')
+    surface = None
+    if terrain_backend is None:
+        getRequiredExtensions()
+    else:
+        surface = open_surface(raster_path, None if terrain_backend == 'auto' else terrain_backend,
+                               cache_dir=profile_cache_dir)
+    _trib_worker.update(folder=folder, gdb=gdb, surface=surface)
+
+
+def run_trib_job(job):
+    """Pool task. Runs produce_trib_3d_xs for one tributary within the worker's scratch workspace.
+    :param job: (index, trib, keyword arguments of produce_trib_3d_xs) tuple
+    :return: index, trib, optimized 3D XS feature class and SDF file produced by the worker
+    """
+    index, trib, kwargs = job
+    oxs3d_path = produce_trib_3d_xs(trib, temp_folder=_trib_worker['folder'], output_gdb=_trib_worker['gdb'],
+                                    sdf_output_folder=_trib_worker['folder'], surface=_trib_worker['surface'],
+                                    **kwargs)
+    return index, trib, oxs3d_path, os.path.join(_trib_worker['folder'], trib + ".sdf")
+
+
+def run_tribs_pool(unique_tribs, scratch_root, sdf_output_folder, max_workers, terrain_backend=None,
+                   profile_cache_dir=None, **kwargs):
+    """Fans the tributaries out to a pool of worker processes. Tributaries are independent until their XS are merged,
+    each worker writes to its own scratch folder and file geodatabase (see init_trib_worker).
+    :param unique_tribs: tributary unit numbers
+    :param scratch_root: parent folder of the per-worker scratch folders
+    :param sdf_output_folder: folder the SDF files are moved to
+    :param max_workers: number of worker processes
+    :param terrain_backend: see run_produce_3d_xs
+    :param profile_cache_dir: see run_produce_3d_xs, the workers share the cache folder
+    :param kwargs: keyword arguments of produce_trib_3d_xs (trib_fc, raster_path, ...)
+    :return: optimized 3D XS feature classes in the order of unique_tribs
+    """
+    if not os.path.exists(scratch_root):
+        os.makedirs(scratch_root)
+    jobs = [(i, trib, kwargs) for i, trib in enumerate(unique_tribs)]
+    results = [None] * len(jobs)
+    pool = Pool(processes=max_workers, initializer=init_trib_worker,
+                initargs=(scratch_root, kwargs['raster_path'], terrain_backend, profile_cache_dir))
+    try:
+        for index, trib, oxs3d_path, sdf_file in pool.imap_unordered(run_trib_job, jobs):
+            results[index] = (oxs3d_path, sdf_file)
+            print('\t%% {0} Complete ({1}/{2}) %%'.format(trib, len([r for r in results if r is not None]),
+                                                           len(results)))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    # Merges in tributary order so the output does not depend on which worker finished first
+    fcs = []
+    for oxs3d_path, sdf_file in results:
+        out_sdf = os.path.join(sdf_output_folder, os.path.basename(sdf_file))
+        if os.path.exists(out_sdf):
+            os.remove(out_sdf)
+        shutil.move(sdf_file, out_sdf)
+        fcs.append(oxs3d_path)
+    return fcs
 
 
 def run_produce_3d_xs(trib_fc, temp_folder, trib_id_key_field, raster_path, output_gdb,
                       sdf_output_folder, wmp_subcatchments, sta_seg_length=50, xs_interval=2.5,
-                      xs_length=600.0, row_width=30, forWPT=False):
+                      xs_length=600.0, row_width=30, forWPT=False, terrain_backend=None, max_workers=1,
+                      single_pass=False, profile_cache_dir=None):
     """A sburoutine dedicated toward developing cross sections based on lidar and channel centerline data.
-    The file generates SDF files for import to HEC-RAS. """
+    The file generates SDF files for import to HEC-RAS. Setting terrain_backend to 'rasterio', 'gdal' or 'auto'
+    samples the raster with NumPy (see Terrain.py) instead of the 3D Analyst InterpolateShape tool. Setting
+    max_workers above 1 processes the tributaries in parallel worker processes (see run_tribs_pool). With a
+    terrain_backend, single_pass keeps the 1st pass profiles of each tributary in memory and only samples the optimized
+    XS which differ from them (see single_pass_3d_xs). profile_cache_dir keeps the sampled profiles on disk, so re-runs
+    over the same cutlines and raster skip the terrain sampling (see Terrain.ProfileCache). """
     start_time = datetime.now ()
     print("DEVELOPING WATERSHED CROSS SECTIONS:\nSTART TIME {0}".format(start_time.strftime("%I:%M:%S")))
 
@@ -794,8 +707,6 @@ def run_produce_3d_xs(trib_fc, temp_folder, trib_id_key_field, raster_path, outp
                     "Increase XS Length to a value equal to or greater than 500.0"
         raise
 
-    getRequiredExtensions()
-
     # Disolves Tribfc Subreaches into Single Line Features per Tributary
     if '.shp' in os.path.basename(trib_fc).lower():
         bn = os.path.basename(trib_fc)[:len(os.path.basename(trib_fc))-4]
@@ -813,62 +724,30 @@ def run_produce_3d_xs(trib_fc, temp_folder, trib_id_key_field, raster_path, outp
     if arcpy.Exists(dis_trib_path):
         arcpy.Delete_management(dis_trib_path)
 
-    trib_fc = arcpy.Dissolve_management(trib_fc, dis_trib_path,
-                                        dissolve_field=trib_id_key_field,
-                                        multi_part="SINGLE_PART", unsplit_lines='UNSPLIT_LINES')
-
-    unique_tribs = get_unique_trib_names (trib_fc , trib_id_key_field)
-    outname = "XS2D_"
-
-    search_top_width = None
-    fcs = []
-    for trib in unique_tribs:
-        print('\t%% Analyzing {0} %%'.format(trib))
-        adj_trib_nam = str(trib).replace(' ','').replace('-','_')
-        if trib[1] =='1':
-            if forWPT:
-                search_top_width=750
-            else:
-                if trib[5:7] == '00':
-                    search_top_width = 750
-                else:
-                    #Seconds last segment of thing
-                    if trib[-2:]!='00':
-                        search_top_width = 300
-                    else:
-                        search_top_width = 400
+    arcpy.Dissolve_management(trib_fc, dis_trib_path, dissolve_field=trib_id_key_field,
+                              multi_part="SINGLE_PART", unsplit_lines='UNSPLIT_LINES')
+
+    unique_tribs = get_unique_trib_names (dis_trib_path , trib_id_key_field)
+    trib_kwargs = dict(trib_fc=dis_trib_path, trib_id_key_field=trib_id_key_field, raster_path=raster_path,
+                       sta_seg_length=sta_seg_length, xs_interval=xs_interval, xs_length=xs_length,
+                       row_width=row_width, forWPT=forWPT, single_pass=single_pass)
+    scratch_root = os.path.join(temp_folder, 'xs_workers')
+    if max_workers is not None and max_workers > 1:
+        fcs = run_tribs_pool(unique_tribs, scratch_root, sdf_output_folder, max_workers,
+                             terrain_backend=terrain_backend, profile_cache_dir=profile_cache_dir, **trib_kwargs)
+    else:
+        surface = None
+        if terrain_backend is None:
+            getRequiredExtensions()
         else:
-            search_top_width = 750
-
-
-        trib_exp = build_trib_exp (trib , trib_id_key_field)
-        xs_exp = '"Tributary" LIKE ' + "'%" + trib + "%'"
-        shp = run_produce_xs (trib_fc , temp_folder , outname , trib, trib_exp,
-                              sta_seg_length=sta_seg_length , xs_interval=xs_interval , xs_length=xs_length)
-
-        print('\t\t1|-Creating 1st Pass 3D-XS')
-        xs3d_path = os.path.join(output_gdb, 'iXS3D_{0}'.format(adj_trib_nam))
-        create_3D_XS(shp, raster_path, xs3d_path)
-
-        #0 indicates no, 1 indicates yes
-        print('\t\t2|-Identifying Optimal XS Spacing')
-        adjust_sta_length = first_past_3D_XS(out_3D_xs_path=xs3d_path, xs_exp=xs_exp,
-                                             search_top_width=search_top_width, vertices_spacing=xs_interval,
-                                             sta_spacing=sta_seg_length)
-        gc.collect()
-
-
-        opt_shp =   run_produce_xs(trib_fc , temp_folder,'OXS2D',trib, trib_exp,
-                                   sta_seg_length=adjust_sta_length , xs_interval=xs_interval,
-                                   xs_length=xs_length, isOptimized=True)
-        print('\t\t6|-Defining Optimized 3D-XS')
-        oxs3d_path = os.path.join(output_gdb, 'XS_{0}'.format(adj_trib_nam))
-        create_3D_XS(opt_shp, raster_path, oxs3d_path)
-        optimized_3D_XS_spacing(trib_fc, oxs3d_path, sdf_output_folder, trib_exp,
-                                xs_exp, trib, search_top_width=search_top_width,
-                                vertices_spacing=xs_interval, row_width = row_width)
-        fcs.append(oxs3d_path)
-        print('\t\tX|-Tributary Complete. SDF file ready for import into HEC-RAS!')
+            surface = open_surface(raster_path, None if terrain_backend == 'auto' else terrain_backend,
+                                   cache_dir=profile_cache_dir)
+        fcs = []
+        for trib in unique_tribs:
+            fcs.append(produce_trib_3d_xs(trib, temp_folder=temp_folder, output_gdb=output_gdb,
+                                          sdf_output_folder=sdf_output_folder, surface=surface, **trib_kwargs))
+        if surface is not None:
+            surface.close()
     sref = getSpatialReferencefactoryCode(fcs[0])
     output_xs = os.path.join(output_gdb, "iReach_Cross_Sections")
     if arcpy.Exists(output_xs):
@@ -881,6 +760,8 @@ def run_produce_3d_xs(trib_fc, temp_folder, trib_id_key_field, raster_path, outp
     for fc in fcs:
         if arcpy.Exists(fc):
             arcpy.Delete_management(fc)
+    if os.path.exists(scratch_root):
+        shutil.rmtree(scratch_root, ignore_errors=True)
 
     final_xs  = os.path.join(output_gdb, "Reach_Cross_Sections")
     if arcpy.Exists (final_xs):
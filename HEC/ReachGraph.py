@@ -0,0 +1,84 @@
+"""
+
+In-memory model of a sub-reach network for the HEC-HMS model preparation.
+
+The sub-reach, dissolved tributary and tributary intersection feature classes are each read once. Sub-reaches are
+the edges of the graph (linked by their drains-to sub-reach) and the HMS junctions are its nodes, so the junction and
+basin queries (drains-to, sub-reaches of a unit number, junctions at a station) never re-scan a feature class.
+
+
+By: Alex Govea
+
+"""
+import arcpy
+from collections import OrderedDict
+
+
+class ReachGraph(object):
+    """Sub-reach network loaded once per run.
+    :param subreach_fc: WMP/WPT formatted sub-reach feature class
+    :param subreach_name_field: field identifying the sub-reaches
+    :param drains_to_field: field holding the downstream sub-reach of each sub-reach
+    :param unit_number_field: tributary unit number field
+    """
+
+    def __init__(self, subreach_fc, subreach_name_field="SubReach_ID", drains_to_field="DrainsTo_Subreach",
+                 unit_number_field="UnitNumber"):
+        self.subreaches = OrderedDict()
+        self.tributaries = OrderedDict()
+        self.intersections = []
+        self.junctions = []
+        fields = (subreach_name_field, unit_number_field, drains_to_field, "SHAPE@")
+        with arcpy.da.SearchCursor(subreach_fc, fields) as srCursor:
+            for row in srCursor:
+                subreach = str(row[0])
+                drains_to = None if row[2] is None else str(row[2])
+                self.subreaches[subreach] = {'UnitNumber': str(row[1]), 'DrainsTo': drains_to, 'Shape': row[3]}
+
+    def load_tributaries(self, dissolved_reach_fc, unit_number_field="UnitNumber"):
+        """Reads the sub-reaches dissolved on unit number, one or more polylines per tributary."""
+        with arcpy.da.SearchCursor(dissolved_reach_fc, (unit_number_field, "SHAPE@")) as dissC:
+            for row in dissC:
+                self.tributaries.setdefault(str(row[0]), []).append(row[1])
+
+    def load_intersections(self, intersection_fc, unit_number_field="UnitNumber"):
+        """Reads the tributary intersection points as (unit number, point) pairs."""
+        with arcpy.da.SearchCursor(intersection_fc, (unit_number_field, "SHAPE@")) as intPC:
+            self.intersections = [(str(row[0]), row[1].firstPoint) for row in intPC]
+
+    def add_junction(self, juncid, name, unit_number, subreach, station, in_model, shape):
+        """Adds a HMS junction (node) to the graph."""
+        junction = {'JUNCID': juncid, 'Name': name, 'UnitNumber': unit_number, 'SubReachID': subreach,
+                    'Station': station, 'inHMSModel': in_model, 'Shape': shape}
+        self.junctions.append(junction)
+        return junction
+
+    #  Queries
+    def drains_to(self, subreach):
+        """Downstream sub-reach of a sub-reach."""
+        return self.subreaches[subreach]['DrainsTo']
+
+    def subreaches_of(self, unit_number=None, unit_prefix=None, drains_to_prefix=None):
+        """Sub-reaches (in feature class order) of a unit number, of unit numbers starting with unit_prefix and/or
+        draining to sub-reaches starting with drains_to_prefix."""
+        result = []
+        for subreach, edge in self.subreaches.items():
+            if unit_number is not None and edge['UnitNumber'] != unit_number:
+                continue
+            if unit_prefix is not None and not edge['UnitNumber'].startswith(unit_prefix):
+                continue
+            if drains_to_prefix is not None and not str(edge['DrainsTo']).startswith(drains_to_prefix):
+                continue
+            result.append(subreach)
+        return result
+
+    def intersection_points(self, unit_number):
+        """Tributary intersection points attributed to a unit number."""
+        return [pnt for unit, pnt in self.intersections if unit == unit_number]
+
+    def junctions_where(self, unit_number=None, station=None, in_model=None):
+        """Junctions (in insertion order) matching the given unit number, station and inHMSModel value."""
+        return [junc for junc in self.junctions
+                if (unit_number is None or junc['UnitNumber'] == unit_number) and
+                (station is None or junc['Station'] == station) and
+                (in_model is None or junc['inHMSModel'] == in_model)]
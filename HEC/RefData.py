@@ -0,0 +1,146 @@
+"""
+
+Hydrologic reference tables of the HEC package.
+
+Loads the regional depth-duration-frequency tables (Region_N_AtlasP.csv, Region_N_Precip.csv), the storm duration
+table (Duration.csv) and the template unit hydrographs (Template_UH.csv) once per process into typed NumPy arrays,
+with lookups by region, storm event, duration, BDF and drainage area.
+
+
+By: Alex Govea
+
+"""
+import os
+import csv
+import threading
+import numpy as np
+
+REF_FOLDER = os.path.dirname(os.path.abspath(__file__))
+REGIONS = ("Region_1", "Region_2", "Region_3")
+STORM_EVENTS = (10, 25, 50, 100, 500)
+DURATION_UNITS = {'MIN': 1, 'HR': 60, 'DAY': 1440}
+
+_lock = threading.Lock()
+_ref_data = None
+
+
+def read_csv_rows(file_path):
+    with open(file_path, 'r') as fi:
+        return [row for row in csv.reader(fi) if len(row) > 0]
+
+
+def parse_duration(label):
+    """Duration label of the precipitation tables in minutes (e.g. '15-Min' -> 15, '1-Day' -> 1440)."""
+    value, unit = label.strip().split('-')
+    return int(float(value) * DURATION_UNITS[unit.upper()])
+
+
+def parse_event(label):
+    """Storm event of a precipitation table column (e.g. '100-Yr' -> 100)."""
+    return int(label.strip().split('-')[0])
+
+
+def region_name(region):
+    """Accepts 1, '1' or 'Region_1'."""
+    region = str(region)
+    return region if region.startswith('Region_') else 'Region_{0}'.format(region)
+
+
+class PrecipTable(object):
+    """Depth-duration-frequency table of a region, depths (in.) are indexed [duration, event]."""
+
+    def __init__(self, file_path):
+        rows = read_csv_rows(file_path)
+        self.file_path = file_path
+        self.events = np.array([parse_event(label) for label in rows[0][1:]], dtype=np.int32)
+        self.durations = np.array([parse_duration(row[0]) for row in rows[1:]], dtype=np.int32)
+        self.depths = np.array([row[1:] for row in rows[1:]], dtype=np.float64)
+        self._event_index = dict((int(event), i) for i, event in enumerate(self.events))
+
+    def event_depths(self, event):
+        """Depths of all tabulated durations (shortest first) of a storm event."""
+        return self.depths[:, self._event_index[int(event)]]
+
+    def depth(self, event, duration):
+        """Depth of a storm event and duration (minutes), log-log interpolated between tabulated durations."""
+        depths = self.event_depths(event)
+        return float(np.exp(np.interp(np.log(duration), np.log(self.durations), np.log(depths))))
+
+
+class RefData(object):
+    """
+    Registry of the hydrologic reference tables.
+    :param folder: folder holding the reference csv files, defaults to the HEC package
+    """
+
+    def __init__(self, folder=REF_FOLDER):
+        self.folder = folder
+        self.atlas14 = {}
+        self.precip = {}
+        for region in REGIONS:
+            atlas_csv = os.path.join(folder, "{0}_AtlasP.csv".format(region))
+            precip_csv = os.path.join(folder, "{0}_Precip.csv".format(region))
+            if os.path.exists(atlas_csv):
+                self.atlas14[region] = PrecipTable(atlas_csv)
+            if os.path.exists(precip_csv):
+                self.precip[region] = PrecipTable(precip_csv)
+        self._load_durations(os.path.join(folder, "Duration.csv"))
+        self._load_template_uh(os.path.join(folder, "Template_UH.csv"))
+
+    def _load_durations(self, file_path):
+        rows = read_csv_rows(file_path)
+        self.duration_areas = np.array(rows[0][1:], dtype=np.float64)
+        self.duration_bdfs = np.array([row[0] for row in rows[1:]], dtype=np.float64)
+        self.durations = np.array([row[1:] for row in rows[1:]], dtype=np.float64)
+
+    def _load_template_uh(self, file_path):
+        rows = read_csv_rows(file_path)
+        bdf_columns = [i for i, label in enumerate(rows[0]) if label.startswith('BDF_')]
+        time_column = rows[0].index('Time')
+        self.uh_bdfs = np.array([int(rows[0][i].split('_')[1]) for i in bdf_columns], dtype=np.int32)
+        self.uh_times = np.array([row[time_column] for row in rows[1:]], dtype=np.float64)
+        self.uh_ordinates = np.array([[row[i] for i in bdf_columns] for row in rows[1:]], dtype=np.float64).T
+
+    #  Lookups
+    def precip_table(self, region, isAtlas14=True):
+        tables = self.atlas14 if isAtlas14 else self.precip
+        return tables[region_name(region)]
+
+    def precip_depths(self, region, event, isAtlas14=True):
+        """Depths (in.) of all tabulated durations of a region and storm event (e.g. 100)."""
+        return self.precip_table(region, isAtlas14).event_depths(event)
+
+    def precip_depth(self, region, event, duration, isAtlas14=True):
+        """Depth (in.) of a region, storm event and duration in minutes."""
+        return self.precip_table(region, isAtlas14).depth(event, duration)
+
+    def storm_duration(self, bdf, area):
+        """
+        Tabulated duration of one or many subbasins.
+        :param bdf: basin development factor(s), rounded to the nearest tabulated BDF
+        :param area: drainage area(s) in sq.mi., the smallest tabulated area not less than the area is used
+        :return: duration(s) from Duration.csv
+        """
+        bdf = np.asarray(bdf, dtype=np.float64)
+        area = np.asarray(area, dtype=np.float64)
+        rows = np.clip(np.searchsorted(self.duration_bdfs, np.round(bdf)), 0, self.duration_bdfs.size - 1)
+        cols = np.clip(np.searchsorted(self.duration_areas, area, side='left'), 0, self.duration_areas.size - 1)
+        return self.durations[rows, cols]
+
+    def template_uh(self, bdf):
+        """Template unit hydrograph (times in hrs, ordinates) of the nearest tabulated BDF."""
+        i = int(np.abs(self.uh_bdfs - float(bdf)).argmin())
+        return self.uh_times, self.uh_ordinates[i]
+
+
+def ref_data(folder=None):
+    """Returns the process wide reference data registry, loaded on first use."""
+    global _ref_data
+    if folder is not None and (_ref_data is None or _ref_data.folder != folder):
+        with _lock:
+            _ref_data = RefData(folder)
+    elif _ref_data is None:
+        with _lock:
+            if _ref_data is None:
+                _ref_data = RefData()
+    return _ref_data
@@ -0,0 +1,272 @@
+"""
+
+Samples terrain rasters (e.g. LiDAR GeoTIFFs) at cross section vertices without arcpy or a 3D Analyst license.
+
+A surface is read in square windowed blocks which are cached, so only the parts of the raster touched by the cross
+sections are read from disk. Whole vertex arrays are sampled at once with bilinear or nearest neighbor interpolation.
+Backends: rasterio, GDAL (osgeo) or an in-memory NumPy array. Sampled profiles can be kept in an on-disk cache
+(ProfileCache) keyed on the raster file and the cutline coordinates, so repeated runs skip the sampling entirely.
+
+
+By: Alex Govea
+
+"""
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from scratchio import NpzCache
+
+try:
+    import rasterio
+    from rasterio.windows import Window
+except ImportError:
+    rasterio = None
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+
+class RasterSurface(object):
+    """Base class of the raster samplers. Backends implement read_window.
+    :param geotransform: GDAL style geotransform (x origin, pixel width, 0, y origin, 0, pixel height)
+    :param width: number of raster columns
+    :param height: number of raster rows
+    :param nodata: raster nodata value, returned as NaN
+    :param block_size: size of the square blocks read from the raster
+    :param max_blocks: number of blocks kept in memory
+    """
+
+    def __init__(self, geotransform, width, height, nodata=None, block_size=512, max_blocks=64):
+        if geotransform[2] != 0 or geotransform[4] != 0:
+            raise ValueError("Rotated rasters are not supported.")
+        self.x0, self.dx, self.y0, self.dy = geotransform[0], geotransform[1], geotransform[3], geotransform[5]
+        self.width, self.height = int(width), int(height)
+        self.nodata = nodata
+        self.block_size = int(block_size)
+        self.max_blocks = max_blocks
+        self._blocks = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._blocks.clear()
+
+    def read_window(self, row, col, nrows, ncols):
+        """Returns the (nrows, ncols) array of raster values starting at row, col."""
+        raise NotImplementedError
+
+    def block(self, block_row, block_col):
+        """Returns a cached block of the raster as float64 with nodata set to NaN. Blocks overlap their neighbors by
+        one row and column so bilinear sampling never needs a second block."""
+        key = (block_row, block_col)
+        if key in self._blocks:
+            arr = self._blocks.pop(key)
+        else:
+            row, col = block_row * self.block_size, block_col * self.block_size
+            nrows = min(self.block_size + 1, self.height - row)
+            ncols = min(self.block_size + 1, self.width - col)
+            arr = np.array(self.read_window(row, col, nrows, ncols), dtype=np.float64)
+            if self.nodata is not None:
+                arr[arr == self.nodata] = np.nan
+            if len(self._blocks) >= self.max_blocks:
+                self._blocks.popitem(last=False)
+        self._blocks[key] = arr
+        return arr
+
+    def sample(self, xy, method='bilinear'):
+        """Samples the raster at an array of coordinates.
+        :param xy: array of coordinates with a last dimension of 2 (i.e. (n, 2) points or (n_xs, n_vertices, 2))
+        :param method: 'bilinear' or 'nearest'
+        :return: array of elevations with the shape of xy[..., 0]. NaN outside the raster and on nodata cells.
+        """
+        xy = np.asarray(xy, dtype=np.float64)
+        shape = xy.shape[:-1]
+        pts = xy.reshape(-1, 2)
+        col = (pts[:, 0] - self.x0) / self.dx - 0.5
+        row = (pts[:, 1] - self.y0) / self.dy - 0.5
+        result = np.full(len(pts), np.nan)
+        inside = (col >= -0.5) & (col <= self.width - 0.5) & (row >= -0.5) & (row <= self.height - 0.5)
+        if not inside.any():
+            return result.reshape(shape)
+        col = np.clip(col[inside], 0, self.width - 1)
+        row = np.clip(row[inside], 0, self.height - 1)
+        if method == 'nearest':
+            r0 = np.floor(row + 0.5).astype(np.int64)
+            c0 = np.floor(col + 0.5).astype(np.int64)
+            fr = np.zeros(len(row))
+            fc = np.zeros(len(col))
+        elif method == 'bilinear':
+            r0 = np.floor(row).astype(np.int64)
+            c0 = np.floor(col).astype(np.int64)
+            fr = row - r0
+            fc = col - c0
+        else:
+            raise ValueError("Unknown sampling method {0}".format(method))
+        r0 = np.minimum(r0, self.height - 1)
+        c0 = np.minimum(c0, self.width - 1)
+        r1 = np.minimum(r0 + 1, self.height - 1)
+        c1 = np.minimum(c0 + 1, self.width - 1)
+        block_row, block_col = r0 // self.block_size, c0 // self.block_size
+        keys = block_row * ((self.width // self.block_size) + 1) + block_col
+        values = np.empty(len(row))
+        for key in np.unique(keys):
+            sel = np.nonzero(keys == key)[0]
+            br, bc = block_row[sel[0]], block_col[sel[0]]
+            arr = self.block(br, bc)
+            lr0, lr1 = r0[sel] - br * self.block_size, r1[sel] - br * self.block_size
+            lc0, lc1 = c0[sel] - bc * self.block_size, c1[sel] - bc * self.block_size
+            wr, wc = fr[sel], fc[sel]
+            z = np.zeros(len(sel))
+            # neighbors with a zero weight are skipped so nodata cells next to a vertex do not spread
+            for lr, lc, w in ((lr0, lc0, (1 - wr) * (1 - wc)), (lr0, lc1, (1 - wr) * wc),
+                              (lr1, lc0, wr * (1 - wc)), (lr1, lc1, wr * wc)):
+                z += np.where(w > 0, arr[lr, lc] * w, 0.0)
+            values[sel] = z
+        result[inside] = values
+        return result.reshape(shape)
+
+
+class ArraySurface(RasterSurface):
+    """Surface backed by an in-memory 2D array."""
+
+    def __init__(self, array, geotransform, nodata=None, block_size=512, max_blocks=64):
+        self.array = np.asarray(array)
+        RasterSurface.__init__(self, geotransform, self.array.shape[1], self.array.shape[0], nodata, block_size,
+                               max_blocks)
+
+    def read_window(self, row, col, nrows, ncols):
+        return self.array[row:row + nrows, col:col + ncols]
+
+
+class RasterioSurface(RasterSurface):
+    """Surface read through rasterio."""
+
+    def __init__(self, raster_path, band=1, block_size=512, max_blocks=64):
+        self.dataset = rasterio.open(raster_path)
+        self.band = band
+        RasterSurface.__init__(self, self.dataset.transform.to_gdal(), self.dataset.width, self.dataset.height,
+                               self.dataset.nodatavals[band - 1], block_size, max_blocks)
+
+    def read_window(self, row, col, nrows, ncols):
+        return self.dataset.read(self.band, window=Window(col, row, ncols, nrows))
+
+    def close(self):
+        RasterSurface.close(self)
+        self.dataset.close()
+
+
+class GDALSurface(RasterSurface):
+    """Surface read through GDAL."""
+
+    def __init__(self, raster_path, band=1, block_size=512, max_blocks=64):
+        self.dataset = gdal.Open(raster_path)
+        if self.dataset is None:
+            raise IOError("Unable to open raster {0}".format(raster_path))
+        self.band = self.dataset.GetRasterBand(band)
+        RasterSurface.__init__(self, self.dataset.GetGeoTransform(), self.dataset.RasterXSize,
+                               self.dataset.RasterYSize, self.band.GetNoDataValue(), block_size, max_blocks)
+
+    def read_window(self, row, col, nrows, ncols):
+        return self.band.ReadAsArray(int(col), int(row), int(ncols), int(nrows))
+
+    def close(self):
+        RasterSurface.close(self)
+        self.band = None
+        self.dataset = None
+
+
+def open_surface(raster_path, backend=None, cache_dir=None, **kwargs):
+    """Opens a raster with the first available backend.
+    :param raster_path: path to the raster (e.g. GeoTIFF)
+    :param backend: 'rasterio' or 'gdal', None picks whichever is installed
+    :param cache_dir: optional ProfileCache folder, sampled profiles are then stored on disk and reused across runs
+    :return: RasterSurface (CachedSurface with a cache_dir)
+    """
+    if cache_dir is not None:
+        return CachedSurface(open_surface(raster_path, backend, **kwargs), raster_path, ProfileCache(cache_dir))
+    if backend in (None, 'rasterio') and rasterio is not None:
+        return RasterioSurface(raster_path, **kwargs)
+    if backend in (None, 'gdal') and gdal is not None:
+        return GDALSurface(raster_path, **kwargs)
+    raise ImportError("No raster backend available for {0}. Install rasterio or GDAL.".format(raster_path))
+
+
+def raster_identity(raster_path):
+    """Identity of a raster file as (absolute path, modification time, size). Any edit of the raster changes it."""
+    stat = os.stat(raster_path)
+    return os.path.normcase(os.path.abspath(raster_path)), int(stat.st_mtime), int(stat.st_size)
+
+
+class ProfileCache(NpzCache):
+    """On-disk LRU cache of sampled terrain profiles (see scratchio.NpzCache). Each sample call, i.e. all XS of a
+    tributary, is stored as one compressed NPZ file.
+    :param cache_dir: folder holding the cached profiles
+    :param max_bytes: size limit of the cache folder
+    :param quantum: coordinates are rounded to this resolution before hashing, so cutlines differing only by floating
+                    point noise share their profiles
+    """
+
+    def __init__(self, cache_dir, max_bytes=1024 * 1024 * 1024, quantum=0.01):
+        NpzCache.__init__(self, cache_dir, max_bytes)
+        self.quantum = quantum
+
+    def key(self, identity, xy, method):
+        """sha1 key of the raster identity, the sampling method and the quantized cutline coordinates."""
+        xy = np.ascontiguousarray(np.round(np.asarray(xy, dtype=np.float64) / self.quantum).astype(np.int64))
+        sha = hashlib.sha1()
+        sha.update('{0}|{1}|{2}|{3}|{4}'.format(identity[0], identity[1], identity[2], method,
+                                                xy.shape).encode('utf-8'))
+        sha.update(xy.tobytes())
+        return sha.hexdigest()
+
+    def get(self, key):
+        """Returns the cached elevations of a key or None. A hit marks the entry as most recently used."""
+        npz = self.load(key)
+        return None if npz is None else npz.get('z')
+
+    def put(self, key, z):
+        self.store(key, z=np.asarray(z))
+
+
+class CachedSurface(object):
+    """Wraps a RasterSurface so sample calls are served from a ProfileCache when the same cutlines were sampled from
+    the same raster before.
+    :param surface: RasterSurface
+    :param raster_path: file of the surface, used for the cache key
+    :param cache: ProfileCache
+    """
+
+    def __init__(self, surface, raster_path, cache):
+        self.surface = surface
+        self.cache = cache
+        self.identity = raster_identity(raster_path)
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.surface.close()
+
+    def sample(self, xy, method='bilinear'):
+        """Same as RasterSurface.sample, read from the cache when possible."""
+        key = self.cache.key(self.identity, xy, method)
+        z = self.cache.get(key)
+        if z is not None and z.shape == np.shape(xy)[:-1]:
+            self.hits += 1
+            return z
+        self.misses += 1
+        z = self.surface.sample(xy, method)
+        self.cache.put(key, z)
+        return z
@@ -18,12 +18,12 @@ import os, sys
 import subprocess
 import pandas as pd
 from json import loads
-from random import uniform
 from subprocess import CalledProcessError
 import traceback
 import time
 from UtiltyMgmt import on_error, get_active_process, kras, ksub, clean_active_process_files, write_txt_file
 from Config import WPTConfig
+from scratchio import wait_for_output_file, COMPUTE_TIMEOUT
 
 WPTConfig.init()
 sys.path.append(os.path.dirname(__file__))
@@ -74,7 +74,7 @@ def check_if_file_locked(filepath, scratch_fldr):
     return result
 
 
-def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
+def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data, timeout=30.0):
     """This function is used to work in unison with the "WPT_NET" Executable to operate as a go between with the HEC_RAS
      Controller. The current scope of the vb executable is used to generate the output data used within the WPT code.
     Args:
@@ -84,6 +84,8 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                             to the ras-scratch file.
         [3] out_data - (str) the requested output data for the tool (i.e 'los_df', 'nodes', 'ws_df',
                                                                 'vel_df', 'channel_info', 'inverts', or 'computes')
+        [4] timeout - (float) maximum number of seconds to wait for the executable's output file once it has exited.
+                            "compute" requests wait at most COMPUTE_TIMEOUT seconds for the "computed.txt" marker.
     Outputs:
         [0] - Depending on the out_data variable a csv file or nothing is generated. If a csv file is generated, the
          funciton will interprete and return the csv as a dataframe. Otherwise nothing is passed (i.e. 'computes').
@@ -104,12 +106,15 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                 # write_txt_file (os.path.join (scratch_fldr , 'VB_Inputs.txt') ,
                 #                 lines , True)
                 clean_active_process_files(scratch_fldr)
-                time.sleep(uniform(0.4,2.4))
                 get_active_process(scratch_fldr, False)
                 subprocess.check_output('"{0}" "{1}" "{2}" "{3}" "{4}"'.format(exe, prjfile, plantitle, sfldr, out_data), shell=False)
-                time.sleep(4.0)
+                # returns as soon as the executable's output file is written and closed.
+                if out_data == "compute":
+                    wait_for_output_file(os.path.join(scratch_fldr, 'computed.txt'),
+                                         timeout=min(timeout, COMPUTE_TIMEOUT))
+                else:
+                    wait_for_output_file(os.path.join(scratch_fldr, '{0}.csv'.format(out_data)), timeout=timeout)
                 get_active_process(scratch_fldr, False)
-                time.sleep (0.3)
                 if out_data == 'los_df':
                     # multi-dim array
                     fl = os.path.join(scratch_fldr, '{0}.csv'.format(out_data))
@@ -1,38 +1,40 @@
 import arcpy
 import os
 from bisect import  bisect_left
-
-def get_intersect_clusters(intersection_points,subcatchment_name_field ):
-    """Identifies intersection of dissolved tributaries and attributes upstream and downstream segments"""
-    pts = {'pts': [ ] , 'Xs': [ ] , 'Ys': [ ] , 'FID': [ ]}
-
+from math import floor, hypot
+
+def find_cluster(grid, x, y, tolerance):
+    """Returns the fid of the clustered point nearest to (x, y) within tolerance or None. grid maps (col, row) cells
+    of size tolerance to lists of (x, y, fid), so only the 3x3 cells around the point are searched."""
+    col, row = int(floor(x / tolerance)), int(floor(y / tolerance))
+    nearest, nearest_dist = None, None
+    for cell in ((col + i, row + j) for i in (-1, 0, 1) for j in (-1, 0, 1)):
+        for cx, cy, fid in grid.get(cell, ()):
+            dist = hypot(cx - x, cy - y)
+            if dist <= tolerance and (nearest_dist is None or dist < nearest_dist):
+                nearest, nearest_dist = fid, dist
+    return nearest
+
+def get_intersect_clusters(intersection_points,subcatchment_name_field, tolerance=0.01):
+    """Identifies intersection of dissolved tributaries and attributes upstream and downstream segments. Points within
+    tolerance of an already clustered point join its cluster, looked up through a grid hash of cell size tolerance."""
+    grid = {}
     with arcpy.da.SearchCursor (intersection_points, ("OBJECTID" , subcatchment_name_field , "SHAPE@")) as oC:
-        cnt = 0
         clusters = {}
         for row in oC:
             pnt = row[ 2 ].firstPoint
             unit = str (row[ 1 ])
-            fid = row[ 0 ]
-            if cnt == 0:
-                pts[ 'pts' ].append (pnt)
-                pts[ 'FID' ].append (fid)
-                pts[ 'Xs' ].append (round(pnt.X,2))
-                pts[ 'Ys' ].append (round(pnt.Y,2))
-                clusters[ fid ] = {'pnt': pnt , 'downstream': unit , 'upstream': [ ] , 'count': 0}
+            fid = find_cluster(grid, pnt.X, pnt.Y, tolerance)
+            if fid is not None:
+                id_unit = clusters[ fid ]['downstream']
+                if id_unit != unit:
+                    clusters[ fid ][ 'upstream' ].append (unit)
+                    clusters[ fid ][ 'count' ] += 1
             else:
-                if round(pnt.X,2) in pts[ 'Xs' ] and round(pnt.Y in pts[ 'Ys' ],2):
-                    fid = pts[ 'FID' ][ pts[ 'Ys' ].index (pnt.Y) ]
-                    id_unit = clusters[ fid ]['downstream']
-                    if id_unit != unit:
-                        clusters[ fid ][ 'upstream' ].append (unit)
-                        clusters[ fid ][ 'count' ] += 1
-                else:
-                    pts[ 'pts' ].append (pnt)
-                    pts[ 'Xs' ].append (round(pnt.X,2))
-                    pts[ 'Ys' ].append (round(pnt.Y,2))
-                    pts[ 'FID' ].append (fid)
-                    clusters[ fid ] = {'pnt': pnt , 'downstream': unit , 'upstream': [ ] , 'count': 0}
-            cnt += 1
+                fid = row[ 0 ]
+                cell = (int(floor(pnt.X / tolerance)), int(floor(pnt.Y / tolerance)))
+                grid.setdefault(cell, []).append((pnt.X, pnt.Y, fid))
+                clusters[ fid ] = {'pnt': pnt , 'downstream': unit , 'upstream': [ ] , 'count': 0}
     return clusters
 
 def create_reach_segment(upstream_point, downstream_point, polyline, identifier="HA",
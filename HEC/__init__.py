@@ -1,6 +1,11 @@
 from ArcGeom import  *
+from BankDetection import *
+from ClarkUH import *
 from Geom import *
 from HMS_Writer import *
 from LANGisReport import *
 from lanHydro import *
-from RAS_Writer import *
\ No newline at end of file
+from RAS_Writer import *
+from ReachGraph import *
+from RefData import *
+from Terrain import *
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+
+Fixture comparison of BankDetection against the original bank station loops.
+
+fixtures/bank_detection.npz holds the results of the per-XS while loops that RAS_Writer.first_past_3D_XS and
+RAS_Writer.optimized_3D_XS_spacing ran before the bank detection was vectorized, recorded on seeded synthetic 3D XS
+(channels, leveed channels, random, flat and stepped profiles, exact and jittered vertex spacing). The same XS are
+rebuilt here from their seeds, run through BankDetection and compared bit for bit:
+    - first pass: average depth and invert slope handed to define_XS_Spacing
+    - optimized pass: trimmed vertex slice, LOB, ROB (rounded to 5 decimals), AvgDepth_ft and Flag of every XS
+
+Usage: python check_bank_detection.py
+The script exits with 1 on the first mismatch.
+
+
+By: Alex Govea
+
+"""
+import os
+import sys
+import numpy as np
+from BankDetection import pad_profiles, first_pass_banks, trim_to_row, locate_banks, bank_flag
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'bank_detection.npz')
+KINDS = ('channel', 'levee', 'random', 'flat', 'steps', 'exact')
+FLAGS = (None, 'Flag L Bank', 'Flag R Bank', 'Flag LR Banks')
+
+
+def polyline_length(xy):
+    """2D length of a vertex array, summed segment by segment (stands in for SHAPE@.length)."""
+    length = 0.0
+    for (x1, y1), (x2, y2) in zip(xy[:-1].tolist(), xy[1:].tolist()):
+        length += float(np.hypot(x2 - x1, y2 - y1))
+    return length
+
+
+def fixture_profiles(case):
+    """Synthetic 3D XS of a fixture case.
+    :param case: case number, seeds the profiles
+    :return: list of (n, 2) vertex coordinates, list of (n,) elevations and the parameters
+             (search_top_width, channel_length, row_width) of the case
+    """
+    rng = np.random.RandomState(case)
+    kind = KINDS[case % len(KINDS)]
+    xy, z = [], []
+    for j in range(rng.randint(2, 9)):
+        n = rng.randint(60, 161)
+        spacing = 5.0 + (rng.uniform(0.0, 1e-3) if kind != 'exact' else 0.0)
+        angle = rng.uniform(0.0, 2.0 * np.pi)
+        x0, y0 = rng.uniform(0.0, 1000.0, 2)
+        s = np.arange(n) * spacing
+        if kind == 'random':
+            zi = rng.uniform(0.0, 100.0) + rng.uniform(0.0, 8.0, n)
+        elif kind == 'flat':
+            zi = np.full(n, 50.0)
+        elif kind == 'steps':
+            zi = np.round(rng.uniform(0.0, 6.0, n) * 4) / 4.0
+        else:
+            center = s[-1] / 2 + rng.uniform(-40.0, 40.0)
+            width = rng.uniform(10.0, 80.0)
+            depth = rng.uniform(0.5, 12.0)
+            zi = 100 - depth * np.exp(-((s - center) / width) ** 2) + 0.02 * s * rng.uniform(-1.0, 1.0)
+            zi += rng.normal(0.0, rng.choice([0.01, 0.3, 1.0]), n)
+            if kind == 'levee':
+                zi += 3 * np.exp(-((s - center + 1.5 * width) / 8) ** 2)
+                zi += 2.5 * np.exp(-((s - center - 1.4 * width) / 6) ** 2)
+        xy.append(np.column_stack((x0 + s * np.cos(angle), y0 + s * np.sin(angle))))
+        z.append(zi)
+    search_top_width = float(rng.choice([100.0, 200.0, 400.0]))
+    channel_length = float(rng.uniform(500.0, 5000.0))
+    row_width = int(rng.choice([10, 30, 50]))
+    return xy, z, (search_top_width, channel_length, row_width)
+
+
+def run_case(case, vertices_spacing=5.0):
+    """Runs the bank detection of both passes on a fixture case.
+    :return: dictionary of result arrays, keyed as in the fixture
+    """
+    profiles, elevations, (search_top_width, channel_length, row_width) = fixture_profiles(case)
+    xy, counts = pad_profiles(profiles)
+    z, _ = pad_profiles(elevations)
+    lengths = np.array([polyline_length(p) for p in profiles])
+    # first pass, reduced as RAS_Writer.optimal_xs_spacing does
+    banks = first_pass_banks(xy, z, counts, search_top_width, vertices_spacing, lengths)
+    avg_avg_depth = 0
+    for avg_depth in banks['AvgDepth_ft'].tolist():
+        avg_avg_depth += avg_depth
+    avg_avg_depth = avg_avg_depth / (len(profiles) + 1)
+    slope = abs(float(banks['Invert'][0]) - float(banks['Invert'][-1])) / channel_length
+    # optimized pass
+    start, stop = trim_to_row(xy, z, counts, search_top_width, vertices_spacing, row_width, lengths)
+    trim_lengths = [polyline_length(p[i0:i1]) for p, i0, i1 in zip(profiles, start.tolist(), stop.tolist())]
+    banks = locate_banks(xy, z, start, stop, search_top_width, vertices_spacing, trim_lengths)
+    return {'first': np.array([avg_avg_depth, slope]),
+            'start': start, 'stop': stop,
+            'lob': np.array([round(float(v), 5) for v in banks['LOB']]),
+            'rob': np.array([round(float(v), 5) for v in banks['ROB']]),
+            'avg': banks['AvgDepth_ft'].astype(np.float64),
+            'flag': np.array([FLAGS.index(bank_flag(l, r)) for l, r in zip(banks['FlagL'], banks['FlagR'])])}
+
+
+def main(fixture=FIXTURE):
+    expected = np.load(fixture)
+    cases = expected['cases'].tolist()
+    for case in cases:
+        result = run_case(case)
+        for key, value in result.items():
+            recorded = expected['{0}_{1}'.format(case, key)]
+            if recorded.shape != value.shape or not np.array_equal(recorded, value):
+                print('Case {0} ({1}) {2} differs:\n\texpected {3}\n\tfound    {4}'.format(
+                    case, KINDS[case % len(KINDS)], key, recorded.tolist(), value.tolist()))
+                return 1
+    print('BankDetection matches the original bank station loops on {0} fixture cases.'.format(len(cases)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
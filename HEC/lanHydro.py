@@ -7,25 +7,59 @@ Populates LAN GIS Schema with Hydrualic computations for geometric features
 """
 import numpy as np
 
+BDF_RANGE = (0.0, 12.0)
+
+
+def comp_Tc(BDF , area):
+    "Computes Time of Concentration based on BDF and Area (in sq.mi.)"
+    tr = 10.0 ** ((-0.05288 * BDF) + (0.4208 * np.log10 (area)) + 0.3926)
+    return tr + ((area ** 0.5) / 2)
+
+
+def comp_R(BDF , area):
+    "Computes Storage Coefficient based on BDF and Area"
+    return 8.271 * np.exp (-0.1167 * BDF) * area ** (0.3856)
 
 
 def compute_tc_r(BDF , area , suppress=True):
     """Performs computation of Time of Concentration and Storage Coefficeint based on BDF and Drainage area."""
-    def comp_Tc(BDF , area):
-        "Computes Time of Concentration based on BDF and Area (in sq.mi.)"
-        def comp_Tr(BDF , area):
-            tr = 10.0 ** ((-0.05288 * BDF) + (0.4208 * np.log10 (area)) + 0.3926)
-            return tr
-        tc = comp_Tr (BDF , area) + ((area ** 0.5) / 2)
-        return tc
-
-    def comp_R(BDF , area):
-        "Computes Storage Coefficient based on BDF and Area"
-        r = 8.271 * np.exp (-0.1167 * BDF) * area ** (0.3856)
-        return r
     tc = comp_Tc (BDF , area)
     r = comp_R (BDF , area)
     if not suppress:
         print('\n\twhen, BDF={0}, area={1} sq.mi.\n\t\tTc:{2} Hr. R:{3}Hr.'.format (BDF , round (area , 3) ,
                                                                                     round (tc , 2) , round (r , 2)))
-    return tc , r
\ No newline at end of file
+    return tc , r
+
+
+def compute_tc_r_array(BDF, area):
+    """
+    Computes Time of Concentration and Storage Coefficient of many subbasins at once.
+    :param BDF: array like of basin development factors (0 to 12)
+    :param area: array like of drainage areas in sq.mi.
+    :return: Tc and R masked arrays (Hr.), masked where the area is not positive or the BDF is missing / out of range
+    """
+    BDF = np.asarray(BDF, dtype=float)
+    area = np.asarray(area, dtype=float)
+    invalid = ~(np.isfinite(BDF) & np.isfinite(area) & (area > 0) &
+                (BDF >= BDF_RANGE[0]) & (BDF <= BDF_RANGE[1]))
+    safe_bdf = np.where(invalid, 0.0, BDF)
+    safe_area = np.where(invalid, 1.0, area)
+    tc = np.ma.masked_array(comp_Tc(safe_bdf, safe_area), mask=invalid)
+    r = np.ma.masked_array(comp_R(safe_bdf, safe_area), mask=invalid)
+    return tc, r
+
+
+def compute_tc_r_table(table, bdf_field='BDF', area_field='Area_SqMi', tc_field='Tc_Hr', r_field='R_Hr'):
+    """
+    Computes Time of Concentration and Storage Coefficient columns of a subbasin table (i.e. pandas DataFrame).
+    :param table: DataFrame with BDF and area columns, updated in place with NaN for invalid rows
+    :param bdf_field: BDF column
+    :param area_field: drainage area column (sq.mi.)
+    :param tc_field: output Time of Concentration column
+    :param r_field: output Storage Coefficient column
+    :return: the table
+    """
+    tc, r = compute_tc_r_array(table[bdf_field], table[area_field])
+    table[tc_field] = tc.filled(np.nan)
+    table[r_field] = r.filled(np.nan)
+    return table
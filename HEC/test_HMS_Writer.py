@@ -0,0 +1,54 @@
+"""
+
+Rendering checks of the HEC-HMS project files written by HMS_Writer.
+
+Usage: python -m unittest test_HMS_Writer (from the HEC folder, requires arcpy)
+
+
+By: Alex Govea
+
+"""
+import unittest
+from HMS_Writer import render_block, precip_method_fields
+
+DEPTHS = [0.92, 1.61, 2.31, 3.52, 5.43, 9.14, 13.2]
+
+# write_met of the original HMS_Writer for the 100 yr storm and a 15 min time step. The header is rendered as a
+# block and "Single Hypothetical Storm Size" ends its line, the original omitted the newline.
+BASELINE_MET = ("Precip Method Parameters: Frequency Based Hypothetical\n"
+                "\t Exceedence Frequency: 1\n"
+                "\t Single Hypothetical Storm Size: Yes\n"
+                "\t Convert From Annual Series: No\n"
+                "\t Convert to Annual Series: Yes\n"
+                "\t Storm Size: 0.01\n"
+                "\t Total Duration: 1440\n"
+                "\t Time Interval: 15\n"
+                "\t Depth: 0.0\n"
+                "\t Depth: 0.92\n"
+                "\t Depth: 1.61\n"
+                "\t Depth: 2.31\n"
+                "\t Depth: 3.52\n"
+                "\t Depth: 5.43\n"
+                "\t Depth: 9.14\n"
+                "\t Depth: 13.2\n"
+                "\t Depth: 0.0\n"
+                "\t Depth: 0.0\n"
+                "\t Depth: 0.0\n"
+                "\t Depth: 0.0\n"
+                "End:\n\n")
+
+
+class TestMetFile(unittest.TestCase):
+
+    def test_precip_block_matches_baseline(self):
+        lines = render_block("Precip Method Parameters", "Frequency Based Hypothetical",
+                             precip_method_fields(100, DEPTHS, 15))
+        self.assertEqual(''.join(lines), BASELINE_MET)
+
+    def test_twelve_depths(self):
+        fields = precip_method_fields(10, DEPTHS, 5)
+        self.assertEqual(len([key for key, value in fields if key == "Depth"]), 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+"""
+
+Content addressed cache for HEC-RAS controller queries.
+
+Results of fetch_controller_data are keyed on a sha1 hash of the project file, the plan file matching the requested
+plan title, the geometry and flow files that plan references and the requested out_data. Any edit to one of those
+files yields a new key, so stale results are never returned. Results are stored as compressed NPZ files and the
+least recently used entries are evicted once the cache folder exceeds its size limit (see scratchio.NpzCache).
+
+
+By: Lockwood, Andrews, and Newnam
+Alexander Govea
+
+for more information contact: AGovea@lan-inc.com
+
+
+"""
+
+# Package Imports
+import os
+import io
+import hashlib
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from scratchio import NpzCache
+
+# query results which are side effects rather than data and are never cached.
+UNCACHED_OUTPUTS = ('compute', 'computes')
+TEXT_TYPES = (str, type(u''))
+# codes of the null mask stored next to text columns
+NOT_NULL, NULL_NONE, NULL_NAN = 0, 1, 2
+
+
+#  Key Generation
+def read_property(filepath, prop):
+    """Returns the values of every "prop=value" line of a hec-ras text file."""
+    vals = []
+    with io.open(filepath, 'r', encoding='latin-1') as f:
+        for line in f:
+            if line.startswith('{0}='.format(prop)):
+                vals.append(line.split('=', 1)[1].strip())
+    return vals
+
+
+def resolve_plan_files(prjfile, plantitle):
+    """Finds the files a plan of a hec-ras project depends on.
+    Input Variables:
+        [0] prjfile - (str) path to the hec-ras project file.
+        [1] plantitle - (str) the plan title (i.e. 'Effective MP 2018').
+    Output Variables / Results:
+        [0] files - (list) project file, plan file and the plan's geometry and flow files (only existing files).
+    """
+    base = os.path.splitext(prjfile)[0]
+    files = [prjfile]
+    for ext in read_property(prjfile, 'Plan File'):
+        plan_file = '{0}.{1}'.format(base, ext)
+        if not os.path.exists(plan_file):
+            continue
+        if plantitle in read_property(plan_file, 'Plan Title'):
+            files.append(plan_file)
+            for prop in ('Geom File', 'Flow File'):
+                for ref in read_property(plan_file, prop):
+                    ref_file = '{0}.{1}'.format(base, ref)
+                    if os.path.exists(ref_file):
+                        files.append(ref_file)
+            break
+    return files
+
+
+def cache_key(prjfile, plantitle, out_data, blocksize=1 << 20):
+    """Creates the sha1 key of a controller query from the contents of all files the plan depends on."""
+    sha = hashlib.sha1()
+    for fl in resolve_plan_files(prjfile, plantitle):
+        sha.update(os.path.basename(fl).lower().encode('utf-8'))
+        with open(fl, 'rb') as f:
+            block = f.read(blocksize)
+            while block:
+                sha.update(block)
+                block = f.read(blocksize)
+    sha.update(u'{0}|{1}'.format(plantitle, out_data).encode('utf-8'))
+    return sha.hexdigest()
+
+
+#  Frame Encoding
+def label_kind(label):
+    """Type code of a column label ('s', 'i' or 'f'), None for labels that can not be restored from text."""
+    if isinstance(label, TEXT_TYPES):
+        return 's'
+    if isinstance(label, (bool, np.bool_)):
+        return None
+    if isinstance(label, (int, np.integer)):
+        return 'i'
+    if isinstance(label, (float, np.floating)):
+        return 'f'
+    return None
+
+
+def restore_label(text, kind):
+    if kind == 'i':
+        return int(text)
+    if kind == 'f':
+        return float(text)
+    return str(text)
+
+
+def encode_text_column(vals):
+    """Splits an object column into a text array and a null mask (NOT_NULL, NULL_NONE, NULL_NAN), None if it holds
+    values other than text and nulls."""
+    nulls = np.zeros(len(vals), dtype=np.int8)
+    text = []
+    for i, val in enumerate(vals):
+        if val is None:
+            nulls[i] = NULL_NONE
+            text.append(u'')
+        elif isinstance(val, float) and np.isnan(val):
+            nulls[i] = NULL_NAN
+            text.append(u'')
+        elif isinstance(val, TEXT_TYPES):
+            text.append(val)
+        else:
+            return None
+    return np.array(text, dtype='U') if text else np.zeros(0, dtype='U1'), nulls
+
+
+def decode_text_column(text, nulls):
+    vals = text.astype(object)
+    vals[nulls == NULL_NONE] = None
+    vals[nulls == NULL_NAN] = np.nan
+    return vals
+
+
+#  Cache
+class ResultCache(NpzCache):
+    """NPZ backed LRU cache of controller query results (DataFrames or lists), see scratchio.NpzCache.
+    Input Variables:
+        [0] cache_dir - (str) folder holding the cached results.
+        [1] max_bytes - (int) size limit of the cache folder, least recently used results are removed beyond it.
+    """
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        NpzCache.__init__(self, cache_dir, max_bytes)
+
+    def get(self, key):
+        """Returns the cached result of a key or None. A hit marks the entry as most recently used."""
+        npz = self.load(key)
+        if npz is None:
+            return None
+        try:
+            kind = str(npz['__kind__'])
+            if kind == 'list':
+                return npz['values'].tolist()
+            columns = [restore_label(col, kind) for col, kind in zip(npz['__columns__'], npz['__column_kinds__'])]
+            data = OrderedDict()
+            for i, col in enumerate(columns):
+                vals = npz['col_{0}'.format(i)]
+                if 'null_{0}'.format(i) in npz:
+                    vals = decode_text_column(vals, npz['null_{0}'.format(i)])
+                data[i] = vals
+            frame = pd.DataFrame(data)
+            frame.columns = columns
+            return frame
+        except Exception:
+            # an entry of an unexpected layout is treated as a miss.
+            self.discard(key)
+            return None
+
+    def put(self, key, result):
+        """Stores a DataFrame or list result under key. Other result types, and frames with column labels or object
+        values that would not come back unchanged, are not cached. Text columns keep a null mask so None and NaN are
+        restored as such."""
+        arrays = {}
+        if isinstance(result, pd.DataFrame):
+            kinds = [label_kind(col) for col in result.columns]
+            if None in kinds:
+                return False
+            arrays['__kind__'] = np.array('frame')
+            arrays['__columns__'] = np.array([repr(float(col)) if kind == 'f' else u'{0}'.format(col)
+                                              for col, kind in zip(result.columns, kinds)], dtype='U')
+            arrays['__column_kinds__'] = np.array(kinds, dtype='U1')
+            for i in range(result.shape[1]):
+                vals = np.asarray(result.iloc[:, i])
+                if vals.dtype.kind == 'O':
+                    encoded = encode_text_column(vals)
+                    if encoded is None:
+                        return False
+                    vals, arrays['null_{0}'.format(i)] = encoded
+                arrays['col_{0}'.format(i)] = vals
+        elif isinstance(result, list):
+            arrays['__kind__'] = np.array('list')
+            arrays['values'] = np.array(result)
+        else:
+            return False
+        self.store(key, **arrays)
+        return True
@@ -0,0 +1,255 @@
+"""
+
+Native reader for HEC-RAS geometry files (*.g01 - *.g99).
+
+The geometry file is streamed line by line and every cross section, bridge and culvert node is collected into a
+compact RASGeometry object. Station / elevation, Manning's n and GIS cut line tables of all nodes are stored in flat
+NumPy arrays with offset pointers so node lists, inverts and profiles can be fetched without launching HEC-RAS or the
+WPT_NET controller.
+
+
+By: Lockwood, Andrews, and Newnam
+Alexander Govea
+
+for more information contact: AGovea@lan-inc.com
+
+
+"""
+
+# Package Imports
+import io
+import numpy as np
+
+
+#  Fixed Width Tables
+def parse_fixed_width(line, width=8):
+    """Splits a fixed width hec-ras table line into floats. Blank fields are skipped.
+    Input Variables:
+        [0] line - (str) table line read from the geometry file.
+        [1] width - (int) field width, 8 for station/elevation and manning's tables, 16 for GIS cut lines.
+    Output Variables / Results:
+        [0] vals - (list) the float values of the line.
+    """
+    line = line.rstrip('\r\n')
+    vals = []
+    for i in range(0, len(line), width):
+        fld = line[i:i + width].strip()
+        if fld:
+            vals.append(float(fld))
+    return vals
+
+
+def read_table(lines, count, width=8):
+    """Reads the next lines of an open geometry file until count values have been collected.
+    Input Variables:
+        [0] lines - (iterator) iterator over the lines of the geometry file.
+        [1] count - (int) number of values in the table (i.e. 2 * number of station/elevation points).
+        [2] width - (int) field width of the table.
+    Output Variables / Results:
+        [0] vals - (list) the float values of the table.
+    """
+    vals = []
+    while len(vals) < count:
+        vals.extend(parse_fixed_width(next(lines), width))
+    return vals[:count]
+
+
+def header_count(line):
+    """Returns the first integer after the "=" of a table header (e.g. "#Sta/Elev= 16 " or "#Mann= 3 , 1 , 0 ")."""
+    val = line.split('=', 1)[1].split(',')[0].strip()
+    return int(val) if val else 0
+
+
+#  Geometry
+class RASGeometry(object):
+    """Columnar representation of a HEC-RAS geometry file.
+
+    Node attributes are stored in arrays of length n (one entry per node in file order). Variable length tables are
+    stored in flat arrays where the rows of node i are located at [offsets[i]:offsets[i+1]].
+        river, reach, rs_label - (list) river name, reach name and river station label (e.g. '228484.7*') per node.
+        rs - (ndarray float) river station per node.
+        node_type - (ndarray int) 1 cross section, 2 culvert, 3 bridge, 4 multiple opening, 5 inline structure,
+                    6 lateral structure.
+        lengths - (ndarray float, n x 3) left overbank, channel and right overbank downstream reach lengths.
+        bank_sta - (ndarray float, n x 2) left and right bank stations (NaN when not defined).
+        sta_offsets, station, elevation - cross section station/elevation table.
+        mann_offsets, mann - (mann is m x 3) station, n value and change in n of the cross section manning's table.
+        cut_offsets, cutline - (cutline is m x 2) x/y vertices of the GIS cut line.
+        br_node, br_side, br_offsets, br_station, br_elevation - bridge upstream (side 0) and downstream (side 1)
+                    station/elevation tables, br_node gives the node index of every table.
+    """
+
+    def __init__(self, title, river, reach, rs_label, node_type, lengths, bank_sta, sta_counts, station, elevation,
+                 mann_counts, mann, cut_counts, cutline, br_node, br_side, br_counts, br_station, br_elevation):
+        self.title = title
+        self.river = river
+        self.reach = reach
+        self.rs_label = rs_label
+        self.rs = np.array([float(rs.rstrip('*')) for rs in rs_label], dtype=np.float64)
+        self.node_type = np.array(node_type, dtype=np.int32)
+        self.lengths = np.array(lengths, dtype=np.float64).reshape(-1, 3)
+        self.bank_sta = np.array(bank_sta, dtype=np.float64).reshape(-1, 2)
+        self.sta_offsets = np.concatenate(([0], np.cumsum(sta_counts, dtype=np.int64)))
+        self.station = np.array(station, dtype=np.float64)
+        self.elevation = np.array(elevation, dtype=np.float64)
+        self.mann_offsets = np.concatenate(([0], np.cumsum(mann_counts, dtype=np.int64)))
+        self.mann = np.array(mann, dtype=np.float64).reshape(-1, 3)
+        self.cut_offsets = np.concatenate(([0], np.cumsum(cut_counts, dtype=np.int64)))
+        self.cutline = np.array(cutline, dtype=np.float64).reshape(-1, 2)
+        self.br_node = np.array(br_node, dtype=np.int32)
+        self.br_side = np.array(br_side, dtype=np.int32)
+        self.br_offsets = np.concatenate(([0], np.cumsum(br_counts, dtype=np.int64)))
+        self.br_station = np.array(br_station, dtype=np.float64)
+        self.br_elevation = np.array(br_elevation, dtype=np.float64)
+        self._index = {}
+        for i in range(len(rs_label)):
+            self._index.setdefault(round(self.rs[i], 4), []).append(i)
+
+    def __len__(self):
+        return len(self.rs_label)
+
+    def reaches(self):
+        """Returns the unique (river, reach) pairs in file order."""
+        out = []
+        for pair in zip(self.river, self.reach):
+            if pair not in out:
+                out.append(pair)
+        return out
+
+    def index(self, rs, river=None, reach=None, node_type=None):
+        """Returns the node index of a river station.
+        Input Variables:
+            [0] rs - (float or str) river station.
+            [1] river - (str) optional river name, needed when the station exists on more than one river/reach.
+            [2] reach - (str) optional reach name.
+            [3] node_type - (int) optional node type, cross sections and bridges can share a river station.
+        Output Variables / Results:
+            [0] idx - (int) node index, a KeyError is raised when the station does not exist.
+        """
+        for i in self._index.get(round(float(str(rs).rstrip('*')), 4), []):
+            if river is not None and self.river[i] != river:
+                continue
+            if reach is not None and self.reach[i] != reach:
+                continue
+            if node_type is not None and self.node_type[i] != node_type:
+                continue
+            return i
+        raise KeyError('River station {0} not found in {1}'.format(rs, self.title))
+
+    def mask(self, river=None, reach=None, node_type=1):
+        """Boolean mask over the nodes of a river/reach and node type (None selects all)."""
+        sel = np.ones(len(self), dtype=bool)
+        if river is not None:
+            sel &= np.array([r == river for r in self.river], dtype=bool)
+        if reach is not None:
+            sel &= np.array([r == reach for r in self.reach], dtype=bool)
+        if node_type is not None:
+            sel &= self.node_type == node_type
+        return sel
+
+    def sta_elev(self, i):
+        """Returns the (station, elevation) arrays of node i as views into the flat arrays."""
+        s, e = self.sta_offsets[i], self.sta_offsets[i + 1]
+        return self.station[s:e], self.elevation[s:e]
+
+    def mannings(self, i):
+        """Returns the m x 3 (station, n value, change) manning's table of node i."""
+        return self.mann[self.mann_offsets[i]:self.mann_offsets[i + 1]]
+
+    def cut_line(self, i):
+        """Returns the m x 2 GIS cut line vertices of node i."""
+        return self.cutline[self.cut_offsets[i]:self.cut_offsets[i + 1]]
+
+    def bridge_sta_elev(self, i, side=0):
+        """Returns the bridge upstream (side=0) or downstream (side=1) (station, elevation) arrays of node i."""
+        hits = np.nonzero((self.br_node == i) & (self.br_side == side))[0]
+        if len(hits) == 0:
+            raise KeyError('Node {0} has no bridge station/elevation table'.format(i))
+        s, e = self.br_offsets[hits[0]], self.br_offsets[hits[0] + 1]
+        return self.br_station[s:e], self.br_elevation[s:e]
+
+    def nodes(self, river=None, reach=None, node_type=1):
+        """Cross section river stations, rounded and sorted from upstream to downstream. Equivalent to
+        fetch_controller_data(..., out_data='nodes')."""
+        result = [round(rs, 4) for rs in self.rs[self.mask(river, reach, node_type)].tolist()]
+        result.sort(reverse=True)
+        return result
+
+    def inverts(self, river=None, reach=None, node_type=1):
+        """Returns the river stations and minimum channel elevations of the selected nodes.
+        Output Variables / Results:
+            [0] rs - (ndarray) river stations in file order.
+            [1] invert - (ndarray) minimum elevation of each station/elevation table (NaN when the node has none).
+        """
+        counts = np.diff(self.sta_offsets)
+        invert = np.full(len(self), np.nan)
+        filled = counts > 0
+        if filled.any():
+            invert[filled] = np.minimum.reduceat(self.elevation, self.sta_offsets[:-1][filled])
+        sel = self.mask(river, reach, node_type)
+        return self.rs[sel], invert[sel]
+
+
+def read_geometry(geom_file):
+    """Streams a HEC-RAS geometry file into a RASGeometry object.
+    Input Variables:
+        [0] geom_file - (str) path to the *.g## file.
+    Output Variables / Results:
+        [0] geom - (RASGeometry) columnar geometry.
+    """
+    title, river, reach = '', '', ''
+    rivers, reaches, rs_label, node_type, lengths, bank_sta = [], [], [], [], [], []
+    sta_counts, station, elevation = [], [], []
+    mann_counts, mann = [], []
+    cut_counts, cutline = [], []
+    br_node, br_side, br_counts, br_station, br_elevation = [], [], [], [], []
+    with io.open(geom_file, 'r', encoding='latin-1') as fh:
+        lines = iter(fh)
+        for line in lines:
+            if line.startswith('Type RM Length L Ch R'):
+                vals = [v.strip() for v in line.split('=', 1)[1].split(',')]
+                vals += [''] * (5 - len(vals))
+                rivers.append(river)
+                reaches.append(reach)
+                node_type.append(int(vals[0]))
+                rs_label.append(vals[1])
+                lengths.extend([float(v) if v else np.nan for v in vals[2:5]])
+                bank_sta.extend([np.nan, np.nan])
+                sta_counts.append(0)
+                mann_counts.append(0)
+                cut_counts.append(0)
+            elif line.startswith('River Reach='):
+                vals = line.split('=', 1)[1].split(',')
+                river = vals[0].strip()
+                reach = vals[1].strip() if len(vals) > 1 else ''
+            elif line.startswith('Geom Title='):
+                title = line.split('=', 1)[1].strip()
+            elif not rs_label:
+                continue
+            elif line.startswith('#Sta/Elev='):
+                n = header_count(line)
+                vals = read_table(lines, 2 * n)
+                station.extend(vals[0::2])
+                elevation.extend(vals[1::2])
+                sta_counts[-1] = n
+            elif line.startswith('#Mann='):
+                n = header_count(line)
+                mann.extend(read_table(lines, 3 * n))
+                mann_counts[-1] = n
+            elif line.startswith('XS GIS Cut Line='):
+                n = header_count(line)
+                cutline.extend(read_table(lines, 2 * n, 16))
+                cut_counts[-1] = n
+            elif line.startswith('Bank Sta='):
+                vals = [v.strip() for v in line.split('=', 1)[1].split(',')]
+                bank_sta[-2:] = [float(v) if v else np.nan for v in (vals + ['', ''])[:2]]
+            elif line.startswith('BR U #Sta/Elev=') or line.startswith('BR D #Sta/Elev='):
+                n = header_count(line)
+                vals = read_table(lines, 2 * n)
+                br_node.append(len(rs_label) - 1)
+                br_side.append(0 if line.startswith('BR U') else 1)
+                br_counts.append(n)
+                br_station.extend(vals[0::2])
+                br_elevation.extend(vals[1::2])
+    return RASGeometry(title, rivers, reaches, rs_label, node_type, lengths, bank_sta, sta_counts, station, elevation,
+                       mann_counts, mann, cut_counts, cutline, br_node, br_side, br_counts, br_station, br_elevation)
@@ -0,0 +1,120 @@
+"""
+
+Memory mapped reader for HEC-RAS steady flow binary output files (*.O01 - *.O99).
+
+The output file is organised in 64 byte records:
+    header - node count, profile count, records per profile, file version and the plan short id.
+    node table - one record per node; 1-based record pointer of the node's results, river station (8 chars), reach
+                 (16 chars), node type (int32) and river (32 chars).
+    profile names - 16 chars per profile directly after the node table.
+    results - one block of float32 records per node and profile. Profile p of a node starts at
+              (pointer - 1) + p * records per profile. Missing values are stored as 3.4E+38.
+Only the pages holding the requested variables are read from disk, so thousands of runs can be post-processed without
+a controller round-trip and a csv write/read per result.
+
+
+By: Lockwood, Andrews, and Newnam
+Alexander Govea
+
+for more information contact: AGovea@lan-inc.com
+
+
+"""
+
+# Package Imports
+import numbers
+import numpy as np
+
+RECORD_SIZE = 64
+MISSING_VALUE = 1.0E+38
+
+# float32 offset of each cross section variable within a node's result block (record * 16 + position).
+XS_FIELDS = {'wsel': 32, 'egl': 33, 'vel_head': 50, 'min_ch_el': 108,
+             'vel_total': 16, 'vel_lob': 17, 'vel_chnl': 18, 'vel_rob': 19,
+             'area_total': 20, 'area_lob': 21, 'area_chnl': 22, 'area_rob': 23,
+             'q_total': 36, 'q_lob': 37, 'q_chnl': 38, 'q_rob': 39}
+
+
+def decode(raw):
+    """Converts a uint8 array of a fixed width text field into a stripped string."""
+    return raw.tobytes().decode('latin-1').replace('\x00', ' ').strip()
+
+
+class RASOutput(object):
+    """Memory mapped HEC-RAS steady flow output file.
+
+    Input Variables:
+        [0] output_file - (str) path to the *.O## file.
+    Attributes:
+        version - (float) output file version (3.0 for HEC-RAS 3.x, 4.1 for HEC-RAS 4.x+).
+        plan_id - (str) plan short identifier (e.g. 'Eff+LOMR MP').
+        profiles - (list) profile names.
+        rs, reach, river - (list) river station label, reach and river name per node.
+        node_type - (ndarray int) node type per node (1 = cross section).
+        pointer - (ndarray int) 0-based record of the first profile's results per node.
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        raw = np.memmap(output_file, dtype=np.uint8, mode='r')
+        head = np.frombuffer(raw[:16].tobytes(), dtype='<i4')
+        self.n_nodes, self.n_profiles, self.recs_per_profile = int(head[0]), int(head[1]), int(head[3])
+        self.version = round(float(np.frombuffer(raw[28:32].tobytes(), dtype='<f4')[0]), 2)
+        if self.version >= 4.0:
+            node_start = 2 * RECORD_SIZE
+            self.plan_id = decode(raw[RECORD_SIZE:2 * RECORD_SIZE])
+        else:
+            node_start = RECORD_SIZE
+            self.plan_id = decode(raw[16:28])
+        node_end = node_start + self.n_nodes * RECORD_SIZE
+        table = np.array(raw[node_start:node_end]).reshape(self.n_nodes, RECORD_SIZE)
+        self.pointer = table[:, 0:4].copy().view('<i4').ravel() - 1
+        self.node_type = table[:, 28:32].copy().view('<i4').ravel()
+        self.rs = [decode(row[4:12]) for row in table]
+        self.reach = [decode(row[12:28]) for row in table]
+        self.river = [decode(row[32:64]) for row in table]
+        self.profiles = [decode(raw[node_end + i * 16:node_end + (i + 1) * 16]) for i in range(self.n_profiles)]
+        self.data = raw[:(len(raw) // RECORD_SIZE) * RECORD_SIZE].view('<f4')
+        self._index = dict((round(float(rs.rstrip('*')), 4), i) for i, rs in reversed(list(enumerate(self.rs))))
+
+    def __len__(self):
+        return self.n_nodes
+
+    def index(self, rs):
+        """Returns the node index of a river station (float or str)."""
+        return self._index[round(float(str(rs).rstrip('*')), 4)]
+
+    def profile_index(self, profile):
+        """Returns the position of a profile given by name or index."""
+        if isinstance(profile, numbers.Integral):
+            return profile
+        return self.profiles.index(profile)
+
+    def values(self, field, profiles=None, nodes=None):
+        """Gathers a cross section variable for the requested profiles and nodes.
+        Input Variables:
+            [0] field - (str) variable name (see XS_FIELDS, i.e. 'wsel', 'vel_chnl' or 'q_total').
+            [1] profiles - (list) optional profile names or indexes, all profiles when None.
+            [2] nodes - (list) optional node indexes, all nodes when None.
+        Output Variables / Results:
+            [0] result - (ndarray float64, profiles x nodes) values, NaN for missing values and non cross section nodes.
+        """
+        offset = XS_FIELDS[field]
+        prof = np.arange(self.n_profiles) if profiles is None else np.array([self.profile_index(p) for p in profiles])
+        node = np.arange(self.n_nodes) if nodes is None else np.asarray(nodes)
+        recs = self.pointer[node][None, :] + prof[:, None] * self.recs_per_profile
+        result = self.data[recs * 16 + offset].astype(np.float64)
+        result[(result >= MISSING_VALUE) | (self.node_type[node] != 1)[None, :]] = np.nan
+        return result
+
+    def wsel(self, profiles=None, nodes=None):
+        """Water surface elevations (profiles x nodes)."""
+        return self.values('wsel', profiles, nodes)
+
+    def velocity(self, profiles=None, nodes=None, part='chnl'):
+        """Average velocities (profiles x nodes) of the 'total', 'lob', 'chnl' or 'rob' flow area."""
+        return self.values('vel_{0}'.format(part), profiles, nodes)
+
+    def flow(self, profiles=None, nodes=None, part='total'):
+        """Flows (profiles x nodes) of the 'total', 'lob', 'chnl' or 'rob' flow area."""
+        return self.values('q_{0}'.format(part), profiles, nodes)
@@ -0,0 +1,381 @@
+"""
+
+In-process process table for the HEC-RAS controller tools.
+
+Queries and kills processes by PID through psutil. Without psutil the Linux /proc file system is read directly (used
+for testing) and on Windows the process table is read through the ToolHelp API of kernel32 (ctypes), so no TASKLIST /
+TASKKILL executable is ever spawned. Processes are identified by their pid and creation time, so a pid reused by an
+unrelated process after the original one exited is never killed. Snapshots of the process table are kept in an
+in-memory ring buffer and are only written to csv when a controller call crashes.
+
+
+By: Lockwood, Andrews, and Newnam
+Alexander Govea
+
+for more information contact: AGovea@lan-inc.com
+
+
+"""
+
+# Package Imports
+import os
+import time
+import signal
+from collections import deque
+from datetime import datetime
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROC_DIR = '/proc'
+
+if os.name == 'nt':
+    import ctypes
+    from ctypes import wintypes
+
+    TH32CS_SNAPPROCESS = 0x00000002
+    PROCESS_TERMINATE = 0x0001
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    SYNCHRONIZE = 0x00100000
+    STILL_ACTIVE = 259
+    INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+    class PROCESSENTRY32(ctypes.Structure):
+        _fields_ = [('dwSize', wintypes.DWORD), ('cntUsage', wintypes.DWORD), ('th32ProcessID', wintypes.DWORD),
+                    ('th32DefaultHeapID', ctypes.c_size_t), ('th32ModuleID', wintypes.DWORD),
+                    ('cntThreads', wintypes.DWORD), ('th32ParentProcessID', wintypes.DWORD),
+                    ('pcPriClassBase', wintypes.LONG), ('dwFlags', wintypes.DWORD),
+                    ('szExeFile', wintypes.WCHAR * 260)]
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.CreateToolhelp32Snapshot.argtypes = (wintypes.DWORD, wintypes.DWORD)
+    kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+    kernel32.Process32FirstW.argtypes = (wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32))
+    kernel32.Process32FirstW.restype = wintypes.BOOL
+    kernel32.Process32NextW.argtypes = (wintypes.HANDLE, ctypes.POINTER(PROCESSENTRY32))
+    kernel32.Process32NextW.restype = wintypes.BOOL
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+    kernel32.CloseHandle.restype = wintypes.BOOL
+    kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    kernel32.GetExitCodeProcess.restype = wintypes.BOOL
+    kernel32.GetProcessTimes.argtypes = (wintypes.HANDLE,) + (ctypes.POINTER(wintypes.FILETIME),) * 4
+    kernel32.GetProcessTimes.restype = wintypes.BOOL
+    kernel32.K32GetProcessMemoryInfo.argtypes = (wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS),
+                                                 wintypes.DWORD)
+    kernel32.K32GetProcessMemoryInfo.restype = wintypes.BOOL
+    kernel32.TerminateProcess.argtypes = (wintypes.HANDLE, wintypes.UINT)
+    kernel32.TerminateProcess.restype = wintypes.BOOL
+    kernel32.WaitForSingleObject.argtypes = (wintypes.HANDLE, wintypes.DWORD)
+    kernel32.WaitForSingleObject.restype = wintypes.DWORD
+else:
+    kernel32 = None
+
+
+def normalize_name(name):
+    """Lower case process name without the .exe extension (e.g. 'RAS.exe' -> 'ras')."""
+    name = str(name).lower()
+    return name[:-4] if name.endswith('.exe') else name
+
+
+#  Windows Process Table (ToolHelp API)
+def win_open(pid, access=None):
+    """Handle of a process, None if the process does not exist or cannot be opened."""
+    if access is None:
+        access = PROCESS_QUERY_LIMITED_INFORMATION
+    return kernel32.OpenProcess(access, False, int(pid)) or None
+
+
+def win_started(handle):
+    """Creation time (100 ns ticks) of the process of an open handle, None if the process has exited."""
+    code = wintypes.DWORD()
+    if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)) or code.value != STILL_ACTIVE:
+        return None
+    times = [wintypes.FILETIME() for i in range(4)]
+    if not kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times]):
+        return None
+    return (times[0].dwHighDateTime << 32) + times[0].dwLowDateTime
+
+
+def win_memory(pid):
+    """Working set of a process in kB, 0 if the process cannot be queried."""
+    handle = win_open(pid)
+    if handle is None:
+        return 0
+    try:
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+        if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize // 1024
+        return 0
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def win_list_processes():
+    rows = []
+    snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if not snapshot or snapshot == INVALID_HANDLE_VALUE:
+        return rows
+    try:
+        entry = PROCESSENTRY32()
+        entry.dwSize = ctypes.sizeof(PROCESSENTRY32)
+        found = kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+        while found:
+            rows.append((entry.th32ProcessID, entry.szExeFile, entry.th32ParentProcessID,
+                         win_memory(entry.th32ProcessID)))
+            found = kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+    finally:
+        kernel32.CloseHandle(snapshot)
+    return rows
+
+
+def win_kill(targets, timeout):
+    """Terminates (pid, creation time) targets through a single handle each, so the creation time is verified on the
+    very process that is terminated."""
+    handles = []
+    for pid, started in targets:
+        handle = win_open(pid, PROCESS_TERMINATE | SYNCHRONIZE | PROCESS_QUERY_LIMITED_INFORMATION)
+        if handle is None:
+            continue
+        if win_started(handle) == started and kernel32.TerminateProcess(handle, 1):
+            handles.append(handle)
+        else:
+            kernel32.CloseHandle(handle)
+    deadline = time.time() + timeout
+    for handle in handles:
+        kernel32.WaitForSingleObject(handle, int(max(deadline - time.time(), 0.0) * 1000))
+        kernel32.CloseHandle(handle)
+
+
+#  Process Table
+def proc_available():
+    return psutil is None and os.path.isdir(os.path.join(PROC_DIR, 'self'))
+
+
+def read_proc_stat(pid):
+    """Returns (name, parent pid, rss in kB, state, start time in clock ticks) of a pid from the /proc file system."""
+    with open(os.path.join(PROC_DIR, str(pid), 'stat'), 'r') as f:
+        stat = f.read()
+    name = stat[stat.find('(') + 1:stat.rfind(')')]
+    fields = stat[stat.rfind(')') + 2:].split()
+    ppid = int(fields[1])
+    rss = int(fields[21]) * (os.sysconf('SC_PAGE_SIZE') // 1024)
+    return name, ppid, rss, fields[0], int(fields[19])
+
+
+def list_processes():
+    """Lists the running processes.
+    Output Variables / Results:
+        [0] rows - (list) of (pid, name, parent pid, memory usage in kB) tuples.
+    """
+    rows = []
+    if psutil is not None:
+        for proc in psutil.process_iter():
+            try:
+                rows.append((proc.pid, proc.name(), proc.ppid(), proc.memory_info().rss // 1024))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+    elif proc_available():
+        for entry in os.listdir(PROC_DIR):
+            if entry.isdigit():
+                try:
+                    name, ppid, rss = read_proc_stat(entry)[:3]
+                    rows.append((int(entry), name, ppid, rss))
+                except (IOError, OSError, ValueError, IndexError):
+                    pass
+    elif kernel32 is not None:
+        rows = win_list_processes()
+    return rows
+
+
+def process_started(pid):
+    """Creation time of a running process, None if no process with the given pid is running. Together with the pid
+    the creation time identifies a process, a pid reused by a later process has a different creation time."""
+    if pid is None:
+        return None
+    if psutil is not None:
+        try:
+            proc = psutil.Process(pid)
+            if proc.status() == psutil.STATUS_ZOMBIE:
+                return None
+            return proc.create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+    if proc_available():
+        try:
+            stat = read_proc_stat(pid)
+        except (IOError, OSError, ValueError, IndexError):
+            return None
+        return None if stat[3] in ('Z', 'X') else stat[4]
+    if kernel32 is not None:
+        handle = win_open(pid)
+        if handle is None:
+            return None
+        try:
+            return win_started(handle)
+        finally:
+            kernel32.CloseHandle(handle)
+    return None
+
+
+def pid_exists(pid):
+    """True if a process with the given pid is running."""
+    return process_started(pid) is not None
+
+
+def find_pids(processname):
+    """Returns the pids of every running process with the given name (e.g. 'ras' or 'WPT_NET.exe')."""
+    name = normalize_name(processname)
+    return [row[0] for row in list_processes() if normalize_name(row[1]) == name]
+
+
+def process_exists(processname):
+    """True if a process with the given name is running."""
+    return len(find_pids(processname)) > 0
+
+
+def child_pids(pid):
+    """Returns the pids of all descendants of a running process. Processes whose parent pid matches but which are
+    older than their supposed parent belong to an earlier owner of a reused pid and are left out."""
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return []
+    parents = {}
+    for row in list_processes():
+        if row[2] is not None:
+            parents.setdefault(row[2], []).append(row[0])
+    result, stack = [], [(pid, process_started(pid))]
+    while stack:
+        parent, parent_started = stack.pop()
+        if parent_started is None:
+            continue
+        for child in parents.get(parent, []):
+            started = process_started(child)
+            if started is not None and started >= parent_started:
+                result.append(child)
+                stack.append((child, started))
+    return result
+
+
+def kill_pid(pid, tree=True, timeout=3.0, started=None):
+    """Kills a running process by pid, by default together with all of its child processes. A process which already
+    exited is not looked up again (its children are no longer linked to it and its pid may have been reused).
+    Input Variables:
+        [0] pid - (int) process id.
+        [1] tree - (Boolean) also kill the child processes.
+        [2] timeout - (float) maximum number of seconds to wait for the killed processes to exit.
+        [3] started - creation time of the process (see process_started), defaults to the time recorded when the
+                      pid was tracked. The process is only killed if its creation time still matches.
+    Output Variables / Results:
+        [0] No return.
+    """
+    if pid is None:
+        return
+    if started is None:
+        started = monitor.started(pid)
+    current = process_started(pid)
+    monitor.untrack(pid)
+    if current is None or (started is not None and current != started):
+        return
+    targets = [(child, process_started(child)) for child in child_pids(pid)] if tree else []
+    targets = [(target, target_started) for target, target_started in targets if target_started is not None]
+    targets.append((pid, current))
+    if psutil is not None:
+        procs = []
+        for target, target_started in targets:
+            try:
+                proc = psutil.Process(target)
+                if proc.create_time() == target_started:
+                    proc.kill()
+                    procs.append(proc)
+            except psutil.NoSuchProcess:
+                pass
+        # returns as soon as the processes are gone, so released file handles can be reused right away.
+        psutil.wait_procs(procs, timeout=timeout)
+    elif proc_available():
+        for target, target_started in targets:
+            if process_started(target) != target_started:
+                continue
+            try:
+                os.kill(target, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            except OSError:
+                # the process already exited.
+                pass
+    elif kernel32 is not None:
+        win_kill(targets, timeout)
+
+
+def kill_name(processname):
+    """Kills every process with the given name."""
+    for pid in find_pids(processname):
+        kill_pid(pid, tree=False)
+
+
+#  Snapshots
+class ProcessMonitor(object):
+    """Tracks the pids (and their creation times) spawned by this process and keeps the last maxlen process table
+    snapshots in memory.
+    Input Variables:
+        [0] maxlen - (int) number of snapshots kept in the ring buffer.
+    """
+
+    def __init__(self, maxlen=32):
+        self.snapshots = deque(maxlen=maxlen)
+        self.spawned = {}
+
+    def track(self, pid):
+        self.spawned[pid] = process_started(pid)
+
+    def untrack(self, pid):
+        self.spawned.pop(pid, None)
+
+    def started(self, pid):
+        """Creation time recorded when the pid was tracked, None if the pid is not tracked."""
+        return self.spawned.get(pid)
+
+    def running(self):
+        """Returns the tracked pids which are still running."""
+        return [pid for pid, started in self.spawned.items()
+                if started is not None and process_started(pid) == started]
+
+    def kill_all(self):
+        """Kills every tracked process tree."""
+        for pid, started in list(self.spawned.items()):
+            kill_pid(pid, tree=True, started=started)
+
+    def snapshot(self):
+        """Appends the current process table to the ring buffer."""
+        self.snapshots.append((datetime.now(), list_processes()))
+
+    def flush(self, ofi):
+        """Writes the buffered snapshots to a csv file and clears the buffer.
+        Input Variables:
+            [0] ofi - (str) output csv file.
+        Output Variables / Results:
+            [0] ofi - (str) the csv file.
+        """
+        with open(ofi, 'w') as f:
+            f.write('Time,PID,Process,ParentPID,MemoryUsage,Spawned\n')
+            for evt, rows in self.snapshots:
+                evt = evt.strftime('%H:%M:%S.%f')
+                for pid, name, ppid, mem in rows:
+                    f.write('{0},{1},"{2}",{3},{4},{5}\n'.format(evt, pid, name, '' if ppid is None else ppid,
+                                                                mem, pid in self.spawned))
+        self.snapshots.clear()
+        return ofi
+
+
+monitor = ProcessMonitor()
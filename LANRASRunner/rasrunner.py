@@ -14,14 +14,20 @@ for more information contact: AGovea@lan-inc.com
 # Package Imports
 import os
 import time
+import shutil
 import subprocess
-from random import uniform
 from subprocess import CalledProcessError
+from multiprocessing import Pool, Lock, current_process
 from datetime import datetime
 import traceback
 import pandas as pd
+from rascache import ResultCache, cache_key, UNCACHED_OUTPUTS
+from scratchio import wait_for_output_file, COMPUTE_TIMEOUT
+from rasprocess import monitor, process_exists, find_pids, kill_name, kill_pid
 
 errorlog =r'C:\wpt\scratch\Cursor.txt'
+# shared between pool workers by init_worker, None outside of a pool
+launch_lock = None
 
 
 
@@ -118,52 +124,28 @@ def write_txt_file(fi, lns, append):
 
 # SUBPROCESS MANAGEMENT
 def get_active_process(scratch_fldr, crash):
-    evt = datetime.now ().strftime ("%I_%M_%S_%f")
-    ofi = ''
-    if crash == False:
-        ofi = os.path.join (scratch_fldr , 'wpt_process_{0}.csv'.format (evt))
-    else:
-        ofi = os.path.join(scratch_fldr, 'wpt_ex_process_{0}.csv'.format(evt))
-    if os.path.exists (ofi): os.remove (ofi)
-    tlproc = subprocess.Popen ('tasklist.exe /FO CSV', shell=False , stdout=subprocess.PIPE)
-    x = str(tlproc.communicate ()[ 0 ])
-    x = x.split ('\r\n')
-    image_names , pids , session_names , session_nos , mem_usage = [ ] , [ ] , [ ] , [ ] , [ ]
-    for i , pro in enumerate (x):
-        rx = pro.replace ('"' , '').split (',')
-        if i > 0 and len (rx) > 1:
-            zen = pro.split('","')
-            mem = zen[4].replace('"','')
-            if len(rx) >= 5:
-                image_names.append (rx[ 0 ])
-                # print '{0} = {1}'.format(rx[0], len(rx))
-                pids.append (rx[ 1 ])
-                session_names.append (rx[ 2 ])
-                session_nos.append (rx[ 3 ])
-                mem_usage.append (mem)
-    pro_dict = {'Process': image_names , 'PID': pids , 'SessionName': session_names ,
-                'Session#': session_nos , 'MemoryUsage': mem_usage}
-    df = pd.DataFrame (data=pro_dict , columns=[ 'Process' , 'MemoryUsage' , 'SessionName' , 'Session#' ])
-    df.to_csv (ofi)
+    """Records a snapshot of the process table in the in-memory ring buffer. The buffered snapshots are only written
+    to a "wpt_ex_process_<time>.csv" file within the scratch folder when crash is True.
+    Input Variables:
+        [0] scratch_fldr - (str) wpt scratch folder
+        [1] crash - (Boolean) flush the buffered snapshots to csv
+    Output Variables / Results:
+        [0] ofi - (str) the csv file when crash is True, otherwise None.
+    """
+    try:
+        monitor.snapshot()
+        if crash:
+            evt = datetime.now ().strftime ("%I_%M_%S_%f")
+            ofi = os.path.join(scratch_fldr, 'wpt_ex_process_{0}.csv'.format(evt))
+            return monitor.flush(ofi)
+    except:
+        lines = [ "{0}\n".format (traceback.format_exc ()) ]
+        write_txt_file (errorlog , lines , True)
+    return None
 
 def processExists(processname):
     """Identifies a named process is active in the task manager e.g. "ras.exe" """
-    tlcall = 'TASKLIST', '/FI', 'imagename eq %s.exe' % processname
-    # shell=True hides the shell window, stdout to PIPE enables
-    # communicate() to get the tasklist command result
-    tlproc = subprocess.Popen(tlcall, shell=False, stdout=subprocess.PIPE)
-    # trimming it to the actual lines with information
-    tlout = tlproc.communicate()[0].strip().split('\r\n')
-    # if TASKLIST returns single line without processname: it's not running
-    if len(tlout) > 1 and processname in tlout[-1]:
-        # print('process "%s" is running!' % processname)
-        # print "ProcessFound"
-        return True
-    else:
-        # print(tlout[0])
-        # print('process "%s" is NOT running!' % processname)
-        # print "process not present"
-        return False
+    return process_exists(processname)
 
 def kill_process(process):
     """Kills a named process running within a PC's processor. (e.g. terminates ras.exe process)
@@ -173,8 +155,7 @@ def kill_process(process):
         [0] No return. Kills a named process runnning on a computer.
     """
     try:
-        subprocess.call ("TASKKILL /F /IM " + str (process) + ".exe")
-        time.sleep(0.3)
+        kill_name(process)
     except:
         lines = [ "{0}\n".format (traceback.format_exc ()) ]
         write_txt_file (errorlog , lines , True)
@@ -184,7 +165,6 @@ def kras():
     try:
         ras = 'ras'
         if processExists (ras):
-            time.sleep(0.3)
             kill_process (ras)
     except:
         lines = [ "{0}\n".format (traceback.format_exc ()) ]
@@ -195,11 +175,25 @@ def ksub():
     try:
         process = 'WPT_NET'
         if processExists (process):
-            time.sleep(0.7)
             kill_process (process)
     except:
         pass
 
+def kill_process_tree(pid):
+    """Kills a single running process and all of its child processes by PID (e.g. the ras.exe opened for a WPT_NET
+    call). Unlike kill_process, other instances of the same executable running on the machine are left alone. A pid
+    tracked by the process monitor is only killed while its creation time matches, so a reused pid is never hit.
+    Input Variables:
+        [0] pid - (int) process id of the parent process
+    Output Variables / Results:
+        [0] No return. Kills the process tree of the given pid.
+    """
+    try:
+        kill_pid(pid, tree=True)
+    except:
+        lines = [ "{0}\n".format (traceback.format_exc ()) ]
+        write_txt_file (errorlog , lines , True)
+
 def clean_active_process_files(scratch_fldr):
     if os.path.exists(scratch_fldr):
         try:
@@ -216,9 +210,13 @@ def clean_active_process_files(scratch_fldr):
 
 
 # .Net Execution Functions and End Functions
-def vb_function_exit(fi, scratch_fldr):
-    kras()
-    ksub()
+def vb_function_exit(fi, scratch_fldr, pids=None):
+    if pids is None:
+        kras()
+        ksub()
+    else:
+        for pid in pids:
+            kill_process_tree(pid)
     clean_active_process_files(scratch_fldr)
     try:
         if os.path.exists(fi):
@@ -261,7 +259,39 @@ def check_if_file_locked(filepath, scratch_fldr):
             result = False
     return result
 
-def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
+def launch_controller(cmd, timeout=30.0, interval=0.1):
+    """Starts a WPT_NET call and identifies the ras.exe it opened. ras.exe is an out-of-process COM server rather than
+    a child of WPT_NET, so the running ras.exe pids are compared before and after the launch. Pool workers hold the
+    shared launch lock until their ras.exe appeared, so a new ras.exe can only belong to this call.
+    Input Variables:
+        [0] cmd - (str) WPT_NET command line
+        [1] timeout - (float) maximum number of seconds to wait for the ras.exe to appear
+        [2] interval - (float) polling interval in seconds
+    Output Variables / Results:
+        [0] proc - (Popen) the WPT_NET process
+        [1] ras_pids - (list) pids of the ras.exe processes opened by the call, tracked by the process monitor.
+    """
+    if launch_lock is not None:
+        launch_lock.acquire()
+    try:
+        before = set(find_pids('ras'))
+        proc = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        monitor.track(proc.pid)
+        start = time.time()
+        while True:
+            ras_pids = [pid for pid in find_pids('ras') if pid not in before]
+            if ras_pids or proc.poll() is not None or time.time() - start >= timeout:
+                break
+            time.sleep(interval)
+        for pid in ras_pids:
+            monitor.track(pid)
+    finally:
+        if launch_lock is not None:
+            launch_lock.release()
+    return proc, ras_pids
+
+
+def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data, isolated=False, timeout=30.0):
     """This function is used to work in unison with the "WPT_NET" Executable to operate as a go between with the HEC_RAS
      Controller. The current scope of the vb executable is used to generate the output data used within the WPT code.
     Args:
@@ -271,6 +301,10 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                             to the ras-scratch file.
         [3] out_data - (str) the requested output data for the tool (i.e 'los_df', 'nodes', 'ws_df',
                                                                 'vel_df', 'channel_info', 'inverts', or 'computes')
+        [4] isolated - (bool) when True the scratch folder is owned by a single pool worker. Only the ras.exe opened
+                            by this call's WPT_NET executable is terminated, other ras.exe instances are left running.
+        [5] timeout - (float) maximum number of seconds to wait for the executable's output file once it has exited.
+                            "compute" requests wait at most COMPUTE_TIMEOUT seconds for the "computed.txt" marker.
     Outputs:
         [0] - Depending on the out_data variable a csv file or nothing is generated. If a csv file is generated, the
          funciton will interprete and return the csv as a dataframe. Otherwise nothing is passed (i.e. 'computes').
@@ -278,6 +312,8 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
     # the out_data varialble will be used to establish what type of output data is expected to be returned from the executable
     sfldr = "Scratch={0}".format(scratch_fldr)
     result = None
+    # isolated calls only ever kill the ras.exe they opened, None makes vb_function_exit fall back to kras / ksub.
+    ras_pids = [] if isolated else None
     count = 0
     while result is None and count <=5:
         flocked = check_if_file_locked(os.path.join(scratch_fldr,"{0}.csv".format(out_data)),scratch_fldr)
@@ -287,20 +323,39 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                 exe = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'WPT_NET.exe')
                 if os.path.exists(exe):
                     exe = exe.replace('\\','/')
-                kras()
-                clean_active_process_files(scratch_fldr)
-                time.sleep(uniform(0.4,2.4))
-                get_active_process(scratch_fldr, False)
-                subprocess.check_output('"{0}" "{1}" "{2}" "{3}" "{4}"'.format(exe, prjfile, plantitle, sfldr, out_data), shell=False)
-                time.sleep(5.0)
+                cmd = '"{0}" "{1}" "{2}" "{3}" "{4}"'.format(exe, prjfile, plantitle, sfldr, out_data)
+                if not isolated:
+                    kras()
+                    clean_active_process_files(scratch_fldr)
+                    get_active_process(scratch_fldr, False)
+                if isolated:
+                    # a retry closes the ras.exe of the previous attempt before opening a new one.
+                    for pid in ras_pids:
+                        kill_process_tree(pid)
+                    ras_pids = []
+                    proc, ras_pids = launch_controller(cmd, timeout=timeout)
+                else:
+                    # shared runs are cleaned up by name (kras / ksub) rather than by pid.
+                    proc = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+                    monitor.track(proc.pid)
+                output = proc.communicate()[0]
+                # WPT_NET has exited, its pid may be reused from here on and is never killed.
+                monitor.untrack(proc.pid)
+                if proc.returncode != 0:
+                    raise CalledProcessError(proc.returncode, cmd, output=output)
+                # returns as soon as the executable's output file is written and closed.
+                if out_data == "compute":
+                    wait_for_output_file(os.path.join(scratch_fldr, 'computed.txt'),
+                                         timeout=min(timeout, COMPUTE_TIMEOUT))
+                else:
+                    wait_for_output_file(os.path.join(scratch_fldr, '{0}.csv'.format(out_data)), timeout=timeout)
                 get_active_process(scratch_fldr, False)
-                time.sleep (0.3)
                 if out_data == 'los_df':
                     # multi-dim array
                     fl = os.path.join(scratch_fldr, '{0}.csv'.format(out_data))
                     if os.path.exists(fl):
                         result = pd.DataFrame.from_csv(fl, index_col=False)
-                        vb_function_exit (fl , scratch_fldr)
+                        vb_function_exit (fl , scratch_fldr, ras_pids)
                         return result
                     else:
                         pass
@@ -313,7 +368,7 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                         # prep and convert to list
                         result = [round(sta,4) for sta in result['Riv_Sta'].tolist()]
                         result.sort(reverse=True)
-                        vb_function_exit (fl , scratch_fldr)
+                        vb_function_exit (fl , scratch_fldr, ras_pids)
                         return result
                     else:
                         pass
@@ -323,7 +378,7 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                     fl = os.path.join(scratch_fldr,  '{0}.csv'.format(out_data))
                     if os.path.exists(fl):
                         result = pd.DataFrame.from_csv(fl, index_col=False)
-                        vb_function_exit (fl , scratch_fldr)
+                        vb_function_exit (fl , scratch_fldr, ras_pids)
                         return result
                     else:
                         pass
@@ -333,7 +388,7 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                     fl = os.path.join(scratch_fldr, '{0}.csv'.format(out_data))
                     if os.path.exists(fl):
                         result = pd.DataFrame.from_csv(fl, index_col=False)
-                        vb_function_exit (fl , scratch_fldr)
+                        vb_function_exit (fl , scratch_fldr, ras_pids)
                         return result
                     else:
                         pass
@@ -342,7 +397,7 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                     fl = os.path.join(scratch_fldr, '{0}.csv'.format(out_data))
                     if os.path.exists(fl):
                         result = pd.DataFrame.from_csv(fl, index_col=False)
-                        vb_function_exit (fl , scratch_fldr)
+                        vb_function_exit (fl , scratch_fldr, ras_pids)
                         return result
                     else:
                         pass
@@ -352,7 +407,7 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                     fl = os.path.join(scratch_fldr, '{0}.csv'.format(out_data))
                     if os.path.exists(fl):
                         result = pd.DataFrame.from_csv(fl, index_col=None)
-                        vb_function_exit (fl , scratch_fldr)
+                        vb_function_exit (fl , scratch_fldr, ras_pids)
                         return result
                     else:
                         pass
@@ -361,33 +416,141 @@ def fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data):
                     fl = os.path.join(scratch_fldr, '{0}.csv'.format(out_data))
                     if os.path.exists(fl):
                         result = pd.DataFrame.from_csv(fl, index_col=False)
-                        vb_function_exit (fl , scratch_fldr)
+                        vb_function_exit (fl , scratch_fldr, ras_pids)
                         return result
                     else:
                         pass
                         # print('File {0} DNE\n'.format(fl))
                 elif out_data == "compute":
                     result='computed'
-                    vb_function_exit(os.path.join(scratch_fldr,result+'.txt'), scratch_fldr)
+                    vb_function_exit(os.path.join(scratch_fldr,result+'.txt'), scratch_fldr, ras_pids)
                     return True
             except CalledProcessError as e:
                 lines = [ '{0}\n'.format (traceback.format_exc ()) ]
                 lines.append("Called Process Error!")
                 for line in lines:
                     print (line)
-                vb_function_exit(os.path.join(scratch_fldr,result+'.txt'), scratch_fldr)
+                get_active_process(scratch_fldr, True)
+                vb_function_exit(os.path.join(scratch_fldr,'{0}.txt'.format(result)), scratch_fldr, ras_pids)
                 return False
             except:
                 lines = ['{0}\n'.format (traceback.format_exc ())]
                 for line in lines:
                     print (line)
-                vb_function_exit (os.path.join(scratch_fldr,'{0}.txt'.format(result)) , scratch_fldr)
+                get_active_process(scratch_fldr, True)
+                vb_function_exit (os.path.join(scratch_fldr,'{0}.txt'.format(result)) , scratch_fldr, ras_pids)
                 return False
             count+=1
 
 
+def fetch_cached_controller_data(prjfile, plantitle, scratch_fldr, out_data, cache_dir=None, max_bytes=512 * 1024 * 1024):
+    """Cached front end of fetch_controller_data. Results are keyed on the contents of the project, plan, geometry and
+    flow files plus out_data, so repeated queries of an unchanged model are read from disk instead of the controller.
+    Input Variables:
+        [0] - [3] - see fetch_controller_data
+        [4] cache_dir - (str) folder of the result cache, defaults to a "ResultCache" folder within scratch_fldr
+        [5] max_bytes - (int) size limit of the result cache
+    Output Variables / Results:
+        [0] - the result of fetch_controller_data. "compute" requests are always passed through to the controller.
+    """
+    if out_data in UNCACHED_OUTPUTS:
+        return fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data)
+    if cache_dir is None:
+        cache_dir = os.path.join(scratch_fldr, 'ResultCache')
+    try:
+        cache = ResultCache(cache_dir, max_bytes)
+        key = cache_key(prjfile, plantitle, out_data)
+        result = cache.get(key)
+        if result is not None:
+            return result
+    except:
+        lines = ['{0}\n'.format(traceback.format_exc())]
+        write_txt_file(errorlog, lines, True)
+        return fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data)
+    result = fetch_controller_data(prjfile, plantitle, scratch_fldr, out_data)
+    if result is not None and result is not False:
+        try:
+            cache.put(key, result)
+        except:
+            lines = ['{0}\n'.format(traceback.format_exc())]
+            write_txt_file(errorlog, lines, True)
+    return result
 
 
+# Worker Pool Execution
+def prepare_worker_project(prjfile, prj_index, scratch_root):
+    """Copies the folder of a HEC-RAS project into a scratch folder owned by the calling pool worker so that plans
+    computed at the same time never share output, scratch or controller files. The copy is made once per worker and
+    reused by every job that worker picks up afterwards.
+    Input Variables:
+        [0] prjfile - (str) path to the source hec-ras project file
+        [1] prj_index - (int) index of the project within the job list, keeps projects sharing a folder name apart
+        [2] scratch_root - (str) parent folder of all worker scratch folders
+    Output Variables / Results:
+        [0] worker_prj - (str) path to the worker's copy of the project file
+        [1] worker_dir - (str) the worker's project/scratch folder
+    """
+    worker = current_process().name.replace(':', '_').replace('-', '_')
+    prj_dir = os.path.dirname(os.path.abspath(prjfile))
+    worker_dir = os.path.join(scratch_root, worker, '{0}_{1}'.format(prj_index, os.path.basename(prj_dir)))
+    if not os.path.exists(worker_dir):
+        MakeDir(os.path.dirname(worker_dir))
+        shutil.copytree(prj_dir, worker_dir)
+    worker_prj = os.path.join(worker_dir, os.path.basename(prjfile)).replace('\\', '/')
+    return worker_prj, worker_dir.replace('\\', '/')
+
+def init_worker(lock):
+    """Pool worker initializer, shares the controller launch lock (see launch_controller) between the workers."""
+    global launch_lock
+    launch_lock = lock
+
+def run_controller_job(job):
+    """Pool worker entry point. Runs a single plan of a project within the worker's isolated scratch folder.
+    Input Variables:
+        [0] job - (tuple) (job_id, prj_index, prjfile, plantitle, scratch_root, out_data)
+    Output Variables / Results:
+        [0] (tuple) (job_id, prjfile, plantitle, result, worker name, completion time)
+    """
+    job_id, prj_index, prjfile, plantitle, scratch_root, out_data = job
+    try:
+        worker_prj, worker_dir = prepare_worker_project(prjfile, prj_index, scratch_root)
+        result = fetch_controller_data(worker_prj, plantitle, worker_dir, out_data, isolated=True)
+    except:
+        lines = ['{0}\n'.format(traceback.format_exc())]
+        write_txt_file(errorlog, lines, True)
+        result = False
+    return job_id, prjfile, plantitle, result, current_process().name, datetime.now()
+
+def run_controller_pool(runs, scratch_root, out_data="compute", workers=None):
+    """Runs N plans or N projects at once through a pool of worker processes. Each worker copies the projects it
+    runs into its own scratch folder and only terminates the ras.exe processes its controller calls opened.
+    Input Variables:
+        [0] runs - (list) of (prjfile, plantitle) pairs, one item per requested computation
+        [1] scratch_root - (str) parent folder for the per-worker scratch folders
+        [2] out_data - (str) requested output data (see fetch_controller_data)
+        [3] workers - (int) number of worker processes, defaults to the number of cpu's
+    Output Variables / Results:
+        [0] yields the result tuple of run_controller_job for each run in the order the runs finish.
+    """
+    prj_indices = {}
+    jobs = []
+    for job_id, run in enumerate(runs):
+        prjfile, plantitle = run
+        if prjfile not in prj_indices:
+            prj_indices[prjfile] = len(prj_indices)
+        jobs.append((job_id, prj_indices[prjfile], prjfile, plantitle, scratch_root, out_data))
+    MakeDir(scratch_root)
+    pool = Pool(processes=workers, initializer=init_worker, initargs=(Lock(),))
+    try:
+        for result in pool.imap_unordered(run_controller_job, jobs):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
 
 def runRASModelIndeffinetley():
     """runs a given ras prj file a users specifiied number of iterations! """
@@ -398,21 +561,62 @@ def runRASModelIndeffinetley():
     outFolder = None
     computeCount = None
     waitTime = None
+    prjPaths = []
+    planTitles = []
+    # plan titles keyed by the project whose "HEC-RAS Prj Path" line precedes them
+    prjPlans = {}
+    workerCount = 1
+    scratchFolder = None
     # Control File input Parameter Processing
     for i, line in enumerate(lines):
         prop, strVal = splitProperty(line)
         if prop.find("HEC-RAS Prj Path") != -1:
             prjPath= strVal.replace("\n","").replace ('\\' , '/')
+            if prjPath not in prjPlans:
+                prjPaths.append(prjPath)
+                prjPlans[prjPath] = []
         elif prop.find("HEC-RAS Plan Title") != -1:
             planTitle= strVal.replace("\n","")
+            planTitles.append(planTitle)
+            if prjPath is not None:
+                prjPlans[prjPath].append(planTitle)
         elif prop.find("Output Folder") != -1:
             outFolder= strVal.replace("\n","").replace ('\\' , '/')
         elif prop.find("Number of Computations") != -1:
             computeCount= float(strVal.replace("\n",""))
         elif prop.find("Computation Wait Interval") != -1:
             waitTime= float(strVal.replace("\n",""))
+        elif prop.find("Number of Workers") != -1:
+            workerCount = int(float(strVal.replace("\n","")))
+        elif prop.find("Scratch Folder") != -1:
+            scratchFolder = strVal.replace("\n","").replace ('\\' , '/')
+    if len(prjPaths) > 0:
+        prjPath = prjPaths[0]
+    if len(planTitles) > 0:
+        planTitle = planTitles[0]
     compCounts = 0
-    if os.path.exists(prjPath):
+    if workerCount > 1 and all(os.path.exists(prj) for prj in prjPaths):
+        if scratchFolder is None:
+            scratchFolder = os.path.join(os.path.dirname(os.path.dirname(prjPath)), 'WorkerScratch').replace('\\', '/')
+        runs = [ (prj, plan) for i in range(int(computeCount)) for prj in prjPaths for plan in prjPlans[prj] ]
+        print("Running HEC-RAS plans in parallel via HEC-RAS Controller!")
+        for prj in prjPaths:
+            print("\t|-Project: {0}\tPlans: {1}".format(prj, ', '.join(prjPlans[prj])))
+        print("\t|-Total Computations: {0:,}".format(len(runs)))
+        print("\t|-Workers: {0}".format(workerCount))
+        print("\t|-Worker Scratch Folder: {0}".format(scratchFolder))
+        for result in run_controller_pool(runs, scratchFolder, out_data="compute", workers=workerCount):
+            job_id, prj, plan, success, worker, end_time = result
+            evt_time = end_time.strftime ("%H:%M:%S")
+            if success:
+                compCounts += 1
+                print("\t\t|-RAS Analysis: Succeeded \tCount: {0:,.1f}\tPlan: {1}\tWorker: {2}\tCompleted @ {3}".format(
+                    compCounts, plan, worker, evt_time))
+            else:
+                print("\t\t|-RAS Analysis: !Failed!\tJob: {0}\tPlan: {1}\tWorker: {2}\t@{3}".format(
+                    job_id, plan, worker, evt_time))
+        print("\t|-Completed!")
+    elif os.path.exists(prjPath):
             outFolder = os.path.dirname(prjPath)
             print("Beelining iterative running of HEC-RAS via HEC-RAS Controller!")
             print("\t|-Testing RAS PRJ: {0}".format(prjPath))
@@ -0,0 +1,152 @@
+"""
+
+File helpers of the HEC-RAS controller scratch folders, shared by the LANRASRunner and HEC folders.
+
+    - wait_for_output_file: waits for an output file of the WPT_NET executable to be completely written.
+    - NpzCache: least recently used cache of NumPy arrays stored as compressed NPZ files. Base of the controller result
+      cache (rascache.ResultCache) and of the terrain profile cache (HEC/Terrain.py ProfileCache). The cache folder is
+      scanned once when the cache is opened, afterwards the size and recency of every entry are tracked in memory so
+      storing an entry never lists the folder. Only when the tracked size exceeds the limit is the folder scanned again
+      (other processes may share it) and the least recently used entries are removed down to low_water times the
+      limit, so a full cache is not re-scanned on every store.
+
+The two folders are deployed on their own, each carries an identical copy of this module (LANRASRunner/scratchio.py
+and HEC/scratchio.py) so both import it without touching sys.path. Edit both copies together.
+
+
+By: Lockwood, Andrews, and Newnam
+Alexander Govea
+
+for more information contact: AGovea@lan-inc.com
+
+
+"""
+
+# Package Imports
+import os
+import time
+import numpy as np
+from collections import OrderedDict
+
+# seconds to wait for the "computed.txt" marker, WPT_NET writes it right before exiting
+COMPUTE_TIMEOUT = 5.0
+
+
+def wait_for_output_file(filepath, timeout=30.0, interval=0.05, max_interval=1.0):
+    """Waits for an output file of the WPT_NET executable (e.g. "ws_df.csv" or "computed.txt") to be completely
+    written. The file is polled with an exponential backoff and is considered complete once it exists, its size is
+    unchanged between two polls and it can be opened for writing (i.e. the executable has closed its handle).
+    Input Variables:
+        [0] filepath - (str) path to the expected output file
+        [1] timeout - (float) maximum number of seconds to wait
+        [2] interval - (float) first polling interval in seconds, doubled after every poll
+        [3] max_interval - (float) upper limit of the polling interval in seconds
+    Output Variables / Results:
+        [0] result - (Boolean) True when the file is complete, False if the timeout was reached.
+    """
+    start = time.time()
+    last_size = None
+    while True:
+        if os.path.exists(filepath):
+            try:
+                size = os.path.getsize(filepath)
+                if size == last_size:
+                    with open(filepath, 'ab'):
+                        pass
+                    return True
+                last_size = size
+            except (IOError, OSError):
+                last_size = None
+        elapsed = time.time() - start
+        if elapsed >= timeout:
+            return False
+        time.sleep(min(interval, max_interval, timeout - elapsed))
+        interval *= 2.0
+
+
+class NpzCache(object):
+    """NPZ backed LRU cache of named arrays.
+    Input Variables:
+        [0] cache_dir - (str) folder holding the cached entries.
+        [1] max_bytes - (int) size limit of the cache folder, least recently used entries are removed beyond it.
+        [2] low_water - (float) fraction of max_bytes the cache is trimmed to once it exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes, low_water=0.9):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.scan()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, '{0}.npz'.format(key))
+
+    def scan(self):
+        """Reads the size and modification time of every entry of the cache folder, least recently used first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        entries.sort()
+        self.entries = OrderedDict((key, size) for mtime, key, size in entries)
+        self.total = sum(self.entries.values())
+
+    def touch(self, key, size):
+        """Marks an entry as most recently used in memory."""
+        self.total += size - self.entries.pop(key, 0)
+        self.entries[key] = size
+
+    def load(self, key):
+        """Returns the arrays of a key as a dictionary or None. A hit marks the entry as most recently used."""
+        fl = self.path(key)
+        if not os.path.exists(fl):
+            self.total -= self.entries.pop(key, 0)
+            return None
+        try:
+            with np.load(fl) as npz:
+                arrays = dict((name, npz[name]) for name in npz.files)
+            os.utime(fl, None)
+            self.touch(key, os.path.getsize(fl))
+            return arrays
+        except Exception:
+            # a corrupt or partially written entry is treated as a miss.
+            self.discard(key)
+            return None
+
+    def store(self, key, **arrays):
+        """Writes the arrays of a key through a temporary file, so readers never see a partial entry."""
+        fl = self.path(key)
+        tmp = '{0}.{1}.tmp'.format(fl, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        if os.path.exists(fl):
+            os.remove(fl)
+        os.rename(tmp, fl)
+        self.touch(key, os.path.getsize(fl))
+        if self.total > self.max_bytes:
+            self.evict()
+
+    def discard(self, key):
+        fl = self.path(key)
+        self.total -= self.entries.pop(key, 0)
+        if os.path.exists(fl):
+            os.remove(fl)
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits within low_water * max_bytes."""
+        self.scan()
+        limit = self.low_water * self.max_bytes
+        for key in list(self.entries.keys()):
+            if self.total <= limit:
+                break
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            self.total -= self.entries.pop(key)
@@ -15,8 +15,11 @@ import numpy as np
 import pandas as pd
 import traceback
 import time
+from collections import Counter
 from datetime import datetime, timedelta
 
+NULL_WSEL = -9999  # WSEL of the XS attribute_XS found no WSEL for
+
 #Utility Funcitons
 def getRequiredExtensions():
     # Checks if extenion is available and Checks out the 3D Analyst extension
@@ -34,6 +37,32 @@ def getRequiredExtensions():
         print('\t|-Meet Extension Requirement: {0}'.format ('Spatial'))
 
 
+def build_wsel_index(df, profiles, ordered_storms=(10, 50, 100, 500)):
+    """ Pivots a WSEL table (UnitNumber, Station, Profile, WSEL) once into WSEL arrays ordered as ordered_storms.
+        Only stations holding exactly one row per storm profile of their UnitNumber are indexed. A table without
+        UnitNumber column, or rows with a null UnitNumber, are indexed under the UnitNumber "".
+        :param df: WSEL data frame
+        :param profiles: dictionary of storm (i.e. 100) and it's profile name
+        :param ordered_storms: storms of the output arrays
+        :return: dictionaries keyed by (UnitNumber, Station) and by Station (stations found on a single UnitNumber)
+    """
+    df = df.loc[df["Profile"].isin([profiles[storm] for storm in ordered_storms])].copy()
+    df["Station"] = df["Station"].astype(float).round(2)
+    if "UnitNumber" not in df.columns:
+        df["UnitNumber"] = ""
+    # null unit numbers would otherwise be dropped by the groupby / pivot below
+    df["UnitNumber"] = df["UnitNumber"].fillna("").astype(str)
+    counts = df.groupby(["UnitNumber", "Station"])["WSEL"].transform("size")
+    df = df.loc[counts == len(ordered_storms)]
+    wide = df.pivot_table(index=["UnitNumber", "Station"], columns="Profile", values="WSEL", aggfunc="first")
+    wide = wide.reindex(columns=[profiles[storm] for storm in ordered_storms]).dropna()
+    values = wide.values.astype(float)
+    by_unit = dict(zip(wide.index.tolist(), values))
+    stations = Counter(station for unit, station in by_unit.keys())
+    by_station = dict((station, wsels) for (unit, station), wsels in by_unit.items() if stations[station] == 1)
+    return by_unit, by_station
+
+
 def attribute_XS(xsFeatureClass, xsWSELExceltabel, txtStationField="STREAM_STN", unitNumber = "E101-00-00", hasTailWater=False, tailwaterWSELs = None):
     """ Add's Fields to Xs Feature-class Converts Text Station field to float and attributes each Xs with WSEL """
     if os.path.exists (xsWSELExceltabel) and arcpy.Exists (xsFeatureClass):
@@ -48,30 +77,32 @@ def attribute_XS(xsFeatureClass, xsWSELExceltabel, txtStationField="STREAM_STN",
         arcpy.AddField_management (xsFeatureClass , field_name='WSEL100yrA' , field_type='DOUBLE')
         arcpy.AddField_management (xsFeatureClass , field_name='WSEL500yrA' , field_type='DOUBLE')
     # Imports XsWSELEXCEL Table as datafarme
-    df = pd.DataFrame.from_csv(xsWSELExceltabel)
+    df = pd.read_csv(xsWSELExceltabel, index_col=0)
     # DF headers "UnitNumber", "Station", "Profile", "WSEL"
     # Storms
     # DEFINING CURSOR VARIABLES< FIELDS AND EXPRESSIONS
     profiles = {10:"10PCT_10yr", 50:"2PCT_50yr", 100:"1PCT_100yr", 500:"0.2PCT_500yr"}
     fields = (txtStationField, "Station", "WSEL10yr", "WSEL50yr", "WSEL100yr", "WSEL500yr", "UnitNumber")
+    # Pivots the WSEL table once, each cross section is then a dictionary lookup
+    by_unit, by_station = build_wsel_index(df, profiles)
+    tailwater = None
+    if hasTailWater and tailwaterWSELs is not None:
+        tailwater = np.array([tailwaterWSELs["WSEL10yr"], tailwaterWSELs["WSEL50yr"],
+                              tailwaterWSELs["WSEL100yr"], tailwaterWSELs["WSEL500yr"]], dtype=float)
     # Updates eac cross section
     with arcpy.da.UpdateCursor(xsFeatureClass, fields) as uC:
         for row in uC:
             stationfloat = round(float(row[0]),2)
-            df_Check = True if df.loc[df["Station"]==stationfloat].shape[0] == 4 else False
-            if df_Check:
-                wsel10 = df.loc[(df["Station"]==stationfloat) & (df["Profile"]==profiles[10])]["WSEL"].values[0]
-                wsel50 = df.loc[(df["Station"]==stationfloat) & (df["Profile"]==profiles[50])]["WSEL"].values[0]
-                wsel100 = df.loc[(df["Station"]==stationfloat) & (df["Profile"]==profiles[100])]["WSEL"].values[0]
-                wsel500 = df.loc[(df["Station"]==stationfloat) & (df["Profile"]==profiles[500])]["WSEL"].values[0]
-                if hasTailWater and tailwaterWSELs is not None:
-                    wsel10 = wsel10 if wsel10 > tailwaterWSELs["WSEL10yr"] else tailwaterWSELs["WSEL10yr"]
-                    wsel50 = wsel50 if wsel50 > tailwaterWSELs[ "WSEL10yr" ] else tailwaterWSELs[ "WSEL50yr" ]
-                    wsel100 = wsel100 if wsel100 > tailwaterWSELs[ "WSEL100yr" ] else tailwaterWSELs[ "WSEL100yr" ]
-                    wsel500 = wsel500 if wsel500 > tailwaterWSELs[ "WSEL500yr" ] else tailwaterWSELs[ "WSEL500yr" ]
+            wsels = by_unit.get((str(unitNumber), stationfloat))
+            if wsels is None:
+                wsels = by_station.get(stationfloat)
+            if wsels is not None:
+                if tailwater is not None:
+                    wsels = np.maximum(wsels, tailwater)
+                wsel10, wsel50, wsel100, wsel500 = [float(wsel) for wsel in wsels]
                 uC.updateRow((row[0], stationfloat, wsel10, wsel50, wsel100, wsel500, unitNumber))
             else:
-                uC.updateRow ((row[ 0 ], stationfloat , -9999 , -9999, -9999, -9999, unitNumber))
+                uC.updateRow ((row[ 0 ], stationfloat , NULL_WSEL , NULL_WSEL, NULL_WSEL, NULL_WSEL, unitNumber))
 
 # Method for Identifying WSEL at Each Confluence of a Modeled tributary to it's Receiving Stream's WSEL.
 # def getConfluentPoints(watershed_WMP_Subreaches):
@@ -108,37 +139,54 @@ def get_vertices(arcpyPolyline, reverse = False):
     except:
         print('{0}'.format(traceback.format_exc()))
 
-def orderStations(xsFeatureClass, stationField = "", unitNumberField=""):
-    unitNumberStations = {}
-    unitNumbers = []
-    # Acquires all stations on a per Unit Number Basis.
-    with arcpy.da.SearchCursor (xsFeatureClass , [ unitNumberField ]) as cursor:
+def load_xs(xsFeatureClass, stationField="Station", unitNumberField="UnitNumber", fields=()):
+    """Reads all cross sections in a single pass, grouped on unit number and sorted on station.
+        :param xsFeatureClass: cross section feature class
+        :param stationField: station field
+        :param unitNumberField: unit number field
+        :param fields: additional numeric fields (i.e. WSEL10yr) to read
+        :return: dictionary of unit number : {'Stations': cursor ordered stations, 'Sorted_Stations': array of
+                 sorted stations, 'Shapes': polylines in sorted station order, 'Values': (n, len(fields)) array of
+                 the additional fields in sorted station order, null and NULL_WSEL values are read as NaN}
+    """
+    grouped = {}
+    with arcpy.da.SearchCursor (xsFeatureClass , (unitNumberField, stationField, "SHAPE@") + tuple(fields)) as cursor:
         for row in cursor:
-            unitNumbers.append(str(row[0]))
-    # Generates a set of unique unit numbers only. Performs an ordered search on a Per Unit numner basis
-    unitNumbers = list(sorted(list(set(unitNumbers)),reverse=False))
-    fields = (unitNumberField, stationField)
-    for unitNumber in unitNumbers:
-        # Query expression to reduce search cursor time.
-        unitQuery = "\"{0}\" LIKE '{1}'".format(unitNumberField, unitNumber)
-        unitNumberStations[unitNumber] = {"Stations":[],'Sorted_Stations':None, 'SortedStationPairs':None}
-        with arcpy.da.SearchCursor (xsFeatureClass , fields, unitQuery) as cursor:
-            for row in cursor:
-                station = float(row[1])
-                unitNumberStations[ unitNumber ]['Stations'].append(round(float(station),2))
-        # Then sorts all stations in the observed unit number list of stations.
-        sorted_stations = list(sorted(unitNumberStations[ unitNumber ]['Stations'], reverse=False))
-        unitNumberStations[ unitNumber ][ 'Sorted_Stations' ] = sorted_stations
-        len_stations = len(sorted_stations)
+            stations, shapes, values = grouped.setdefault(str(row[0]), ([], [], []))
+            stations.append(round(float(row[1]),2))
+            shapes.append(row[2])
+            values.append([np.nan if val is None or val == NULL_WSEL else float(val) for val in row[3:]])
+    unitNumberXS = {}
+    for unitNumber, (stations, shapes, values) in grouped.items():
+        order = np.argsort(stations, kind='mergesort')
+        unitNumberXS[unitNumber] = {'Stations': stations,
+                                    'Sorted_Stations': np.asarray(stations, dtype=float)[order],
+                                    'Shapes': [shapes[i] for i in order],
+                                    'Values': np.asarray(values, dtype=float).reshape(len(stations), -1)[order]}
+    return unitNumberXS
+
+def xs_pairs(sorted_stations):
+    """Indexes i of the adjacent XS pairs (i, i + 1) with a binary match, stations repeated on a unit number have none."""
+    stations = np.asarray(sorted_stations, dtype=float)
+    unique = np.ones(len(stations), dtype=bool)
+    if len(stations) > 1:
+        repeated = stations[1:] == stations[:-1]
+        unique[1:] &= ~repeated
+        unique[:-1] &= ~repeated
+    return [i for i in range(len(stations) - 1) if unique[i] and unique[i+1]]
+
+def orderStations(xsFeatureClass, stationField = "", unitNumberField="", unitNumberXS=None):
+    """Orders the stations of each unit number and pairs adjacent stations (downstream, upstream)."""
+    if unitNumberXS is None:
+        unitNumberXS = load_xs(xsFeatureClass, stationField=stationField, unitNumberField=unitNumberField)
+    unitNumberStations = {}
+    for unitNumber in list(sorted(unitNumberXS.keys())):
+        sorted_stations = [float(sta) for sta in unitNumberXS[unitNumber]['Sorted_Stations']]
         # Generates Station Pairs on a per Unit Number basis.
-        pairs = []
-        for i, sta in enumerate(sorted_stations):
-            if i < len_stations - 1:
-                dnStation = sta # Down stream Station
-                upStation = sorted_stations[i+1] # Upstream Station
-                pair = [dnStation, upStation]
-                pairs.append(pair)
-        unitNumberStations[ unitNumber ][ 'SortedStationPairs' ] = pairs
+        pairs = [[sorted_stations[i], sorted_stations[i+1]] for i in range(len(sorted_stations) - 1)]
+        unitNumberStations[unitNumber] = {"Stations": list(unitNumberXS[unitNumber]['Stations']),
+                                          'Sorted_Stations': sorted_stations,
+                                          'SortedStationPairs': pairs}
     return unitNumberStations
 
 def createExportPolyFc(xsFeatureClass, outFolder, outName,has_z=False):
@@ -171,45 +219,24 @@ def createExportPolyFc(xsFeatureClass, outFolder, outName,has_z=False):
 
 def createPolygonFeatures(xsFeatureclass, emptyPGFC, stationField="Station", unitNumberField="UnitNumber",
                           downStationField="DS_Station", upStationField="US_Station"):
-    # 1 Identifies all stations and sorts them in order & sorts the stations into ordered pairs.
-    oStations = orderStations(xsFeatureclass,stationField="Station", unitNumberField=unitNumberField)
-    # 3 iterates through orders pairs and querys XS by Station Field to get two XS Pairs
-    # 4 Uses XS Pair vertices to generate a polygon
-    xsfields = (stationField , "SHAPE@")
+    # 1 Reads all XS once, grouped on unit number and sorted on station.
+    unitNumberXS = load_xs(xsFeatureclass, stationField=stationField, unitNumberField=unitNumberField)
+    # 2 Uses each adjacent XS pair (downstream, upstream) of a unit number to generate a polygon
     pgfields = (downStationField , upStationField , unitNumberField , "SHAPE@")
-    for unitNumber in list(oStations.keys()):
-        print("\t\t|-Creating {0} Bounding XS Polygons".format(unitNumber))
-        orderedStatoins = oStations[unitNumber]["SortedStationPairs"]
-        for i, pair in enumerate(orderedStatoins):
-            print("\t\t Bounding XS: lower:{0},  upper:{1}".format(pair[0], pair[1]))
-            query_exp = "\"{0}\" LIKE '{1}' AND \"{2}\" = {3} OR \"{2}\"  = {4}".format(unitNumberField, unitNumber,
-                                                                                      stationField, pair[0], pair[1])
-            vertices = []
-            if i % 100 == 0:
-                print("\t\t\t\t|- EXP: {0}".format(query_exp))
-            matchCnt = 0
-            with arcpy.da.SearchCursor(xsFeatureclass, xsfields, query_exp) as sC:
-                for row in sC:
-                    matchCnt += 1
-            # Verifies that there is a binary match
-            if matchCnt ==2:
-                print("\t\t|-Station Match Identified!!")
-                matchCnt = 0
-                with arcpy.da.SearchCursor (xsFeatureclass , xsfields , query_exp) as sC:
-                    for row in sC:
-                        polyline = row[1]
-                        if round(float(row[0]),2) == round(float(pair[0]),2):
-                            vertices += get_vertices(polyline)
-                        else:
-                            vertices += get_vertices(polyline, reverse=True)
+    with arcpy.da.InsertCursor(emptyPGFC,pgfields) as iC:
+        for unitNumber in list(sorted(unitNumberXS.keys())):
+            print("\t\t|-Creating {0} Bounding XS Polygons".format(unitNumber))
+            stations = unitNumberXS[unitNumber]['Sorted_Stations']
+            shapes = unitNumberXS[unitNumber]['Shapes']
+            for i in xs_pairs(stations):
+                vertices = get_vertices(shapes[i]) + get_vertices(shapes[i+1], reverse=True)
                 if len(vertices) > 0:
-                    print("\t\t\t|-Polygon Vertices Created!")
                     # Creates Polygon Feature And appends feature to XS FC`
                     boundingPolygon = arcpy.Polygon(arcpy.Array(vertices))
-                    with arcpy.da.InsertCursor(emptyPGFC,pgfields) as iC:
-                        iC.insertRow((pair[0], pair[1], unitNumber, boundingPolygon,))
+                    iC.insertRow((float(stations[i]), float(stations[i+1]), unitNumber, boundingPolygon,))
 
 def createWSELtins(xsFeatureclass, emptyPGFC, unitNumber="E1010000"):
+    """Creates an ArcGIS TIN per storm profile, see createWSELSurface for a single mesh carrying all profiles."""
     # Checks out necessary GIS Extensions to execute the Interpolation of WSEL Elevations
     getRequiredExtensions()
     sr = getSpatialReferencefactoryCode(xsFeatureclass)
@@ -244,6 +271,307 @@ def createStationTIN(xsFeatureclass, emptyPGFC, statoinField="Station",unitNumbe
     exp = [xsFCexp, pgFCexp]
     arcpy.CreateTin_3d(outTin, in_features=exp, spatial_reference=sr)
 
+def strip_triangles(upper_t, lower_t):
+    """Triangulates the strip between two cross sections drawn in the same direction by zipping their vertices on
+    normalized distance, so both cross sections remain triangle edges (hardlines).
+        :param upper_t: (n,) normalized distances (0 to 1) of the downstream XS vertices, indexed 0 to n - 1
+        :param lower_t: (m,) normalized distances of the upstream XS vertices, indexed n to n + m - 1
+        :return: (n + m - 2, 3) vertex indexes
+    """
+    n, m = len(upper_t), len(lower_t)
+    # Each step advances one vertex on either XS, ties advance the downstream XS first
+    events = np.concatenate((upper_t[1:], lower_t[1:]))
+    onUpper = np.concatenate((np.ones(n - 1, dtype=bool), np.zeros(m - 1, dtype=bool)))
+    order = np.lexsort((~onUpper, events))
+    onUpper = onUpper[order]
+    i = np.cumsum(onUpper) - onUpper
+    j = np.cumsum(~onUpper) - ~onUpper
+    return np.where(onUpper[:, None],
+                    np.column_stack((i, i + 1, n + j)),
+                    np.column_stack((i, n + j + 1, n + j)))
+
+
+def normalized_distances(points):
+    lengths = np.hypot(*np.diff(points, axis=0).T)
+    distances = np.concatenate(([0.0], np.cumsum(lengths)))
+    return distances / distances[-1] if distances[-1] > 0 else distances
+
+
+class WSELSurface(object):
+    """Triangulated surface of the XS of one or more reaches, carrying several attribute channels (i.e. Station and
+    the storm WSELs) on a single mesh.
+        :param points: (n, 2) vertex coordinates
+        :param triangles: (m, 3) vertex indexes
+        :param values: (n, k) channel values of each vertex
+        :param channels: names of the k channels
+        :param strips: optional (s, 3) first, first upstream XS and last + 1 vertex indexes of each XS pair strip
+        :param strip_units: unit number of each strip
+        :param triangle_strips: (m,) strip of each triangle
+    """
+
+    def __init__(self, points, triangles, values, channels, strips=None, strip_units=None, triangle_strips=None):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.points), -1)
+        self.channels = list(channels)
+        self.strips = None if strips is None else np.asarray(strips, dtype=np.int64).reshape(-1, 3)
+        self.strip_units = None if strip_units is None else [str(unit) for unit in strip_units]
+        self.triangle_strips = None if triangle_strips is None else np.asarray(triangle_strips, dtype=np.int64)
+        self._build_grid()
+
+    @classmethod
+    def from_xs(cls, xsFeatureclass, channels=("Station", "WSEL10yr", "WSEL50yr", "WSEL100yr", "WSEL500yr"),
+                stationField="Station", unitNumberField="UnitNumber"):
+        """Triangulates the strips between adjacent XS of each unit number, the XS polygons of createPolygonFeatures."""
+        unitNumberXS = load_xs(xsFeatureclass, stationField=stationField, unitNumberField=unitNumberField,
+                               fields=channels)
+        points, triangles, values = [], [], []
+        strips, strip_units, triangle_strips = [], [], []
+        offset = 0
+        for unitNumber in list(sorted(unitNumberXS.keys())):
+            xs = unitNumberXS[unitNumber]
+            for i in xs_pairs(xs['Sorted_Stations']):
+                if xs['Shapes'][i] is None or xs['Shapes'][i+1] is None:
+                    continue
+                upper = np.array([(pnt.X, pnt.Y) for pnt in get_vertices(xs['Shapes'][i])], dtype=float)
+                lower = np.array([(pnt.X, pnt.Y) for pnt in get_vertices(xs['Shapes'][i+1])], dtype=float)
+                if len(upper) < 2 or len(lower) < 2:
+                    continue
+                points += [upper, lower]
+                values += [np.repeat(xs['Values'][i][None, :], len(upper), axis=0),
+                           np.repeat(xs['Values'][i+1][None, :], len(lower), axis=0)]
+                triangles.append(strip_triangles(normalized_distances(upper), normalized_distances(lower)) + offset)
+                triangle_strips.append(np.full(len(triangles[-1]), len(strips), dtype=np.int64))
+                strips.append((offset, offset + len(upper), offset + len(upper) + len(lower)))
+                strip_units.append(unitNumber)
+                offset += len(upper) + len(lower)
+        if offset == 0:
+            return cls(np.zeros((0, 2)), np.zeros((0, 3)), np.zeros((0, len(channels))), channels,
+                       np.zeros((0, 3)), [], np.zeros(0))
+        return cls(np.concatenate(points), np.concatenate(triangles), np.concatenate(values), channels,
+                   strips, strip_units, np.concatenate(triangle_strips))
+
+    def save(self, file_path):
+        extra = {}
+        if self.strips is not None:
+            extra = {'strips': self.strips, 'strip_units': np.array(self.strip_units),
+                     'triangle_strips': self.triangle_strips}
+        np.savez_compressed(file_path, points=self.points, triangles=self.triangles, values=self.values,
+                            channels=np.array(self.channels), **extra)
+        return file_path
+
+    @classmethod
+    def load(cls, file_path):
+        data = np.load(file_path)
+        if 'strips' in data.files:
+            return cls(data['points'], data['triangles'], data['values'], [str(ch) for ch in data['channels']],
+                       data['strips'], [str(unit) for unit in data['strip_units']], data['triangle_strips'])
+        return cls(data['points'], data['triangles'], data['values'], [str(ch) for ch in data['channels']])
+
+    def _build_grid(self):
+        """Uniform grid (CSR) of the cells overlapped by each triangle extent."""
+        corners = self.points[self.triangles] if len(self.triangles) else np.zeros((0, 3, 2))
+        lo = corners.min(axis=1) if len(corners) else np.zeros((0, 2))
+        hi = corners.max(axis=1) if len(corners) else np.zeros((0, 2))
+        size = np.median(np.max(hi - lo, axis=1)) if len(corners) else 1.0
+        self.cell_size = float(size) if size > 0 else 1.0
+        self.origin = lo.min(axis=0) if len(corners) else np.zeros(2)
+        c0 = np.floor((lo - self.origin) / self.cell_size).astype(np.int64)
+        c1 = np.floor((hi - self.origin) / self.cell_size).astype(np.int64)
+        self.n_cols = int(c1[:, 0].max()) + 1 if len(corners) else 1
+        widths = c1[:, 0] - c0[:, 0] + 1
+        counts = widths * (c1[:, 1] - c0[:, 1] + 1)
+        tris = np.repeat(np.arange(len(self.triangles)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cols = np.repeat(c0[:, 0], counts) + local % np.repeat(widths, counts)
+        rows = np.repeat(c0[:, 1], counts) + local // np.repeat(widths, counts)
+        keys = rows * self.n_cols + cols
+        order = np.argsort(keys, kind='mergesort')
+        self._cell_keys = keys[order]
+        self._cell_tris = tris[order]
+
+    def locate(self, x, y):
+        """
+        Locates query points on the mesh.
+        :param x: (q,) X coordinates
+        :param y: (q,) Y coordinates
+        :return: triangle index of each point (-1 outside the mesh) and (q, 3) barycentric weights
+        """
+        pnts = np.column_stack((np.ravel(x), np.ravel(y))).astype(float)
+        found = np.full(len(pnts), -1, dtype=np.int64)
+        weights = np.zeros((len(pnts), 3))
+        if len(self.triangles) == 0 or len(pnts) == 0:
+            return found, weights
+        # NaN coordinates (null shapes) are kept outside the grid
+        finite = np.isfinite(pnts).all(axis=1)
+        located = np.where(finite[:, None], pnts, self.origin)
+        cells = np.floor((located - self.origin) / self.cell_size).astype(np.int64)
+        inGrid = finite & (cells[:, 0] >= 0) & (cells[:, 0] < self.n_cols) & (cells[:, 1] >= 0)
+        keys = np.where(inGrid, cells[:, 1] * self.n_cols + cells[:, 0], -1)
+        start = np.searchsorted(self._cell_keys, keys, side='left')
+        stop = np.searchsorted(self._cell_keys, keys, side='right')
+        counts = np.where(inGrid, stop - start, 0)
+        # Candidate (query, triangle) pairs
+        query = np.repeat(np.arange(len(pnts)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        tri = self._cell_tris[np.repeat(start, counts) + local]
+        p0, p1, p2 = [self.points[self.triangles[tri, k]] for k in range(3)]
+        v0, v1, v2 = p1 - p0, p2 - p0, pnts[query] - p0
+        det = v0[:, 0] * v1[:, 1] - v1[:, 0] * v0[:, 1]
+        safe = np.where(det == 0, 1.0, det)
+        l1 = (v2[:, 0] * v1[:, 1] - v1[:, 0] * v2[:, 1]) / safe
+        l2 = (v0[:, 0] * v2[:, 1] - v2[:, 0] * v0[:, 1]) / safe
+        l0 = 1.0 - l1 - l2
+        eps = -1e-9
+        inside = (det != 0) & (l0 >= eps) & (l1 >= eps) & (l2 >= eps)
+        hits = np.nonzero(inside)[0]
+        first = np.unique(query[hits], return_index=True)[1]
+        hits = hits[first]
+        found[query[hits]] = tri[hits]
+        weights[query[hits]] = np.column_stack((l0[hits], l1[hits], l2[hits]))
+        return found, weights
+
+    def evaluate(self, x, y, channels=None):
+        """
+        Interpolates channels at query points.
+        :param x: (q,) X coordinates
+        :param y: (q,) Y coordinates
+        :param channels: channel names, defaults to all channels
+        :return: (q, k) channel values, NaN outside the mesh
+        """
+        columns = [self.channels.index(ch) for ch in (channels or self.channels)]
+        found, weights = self.locate(x, y)
+        result = np.full((len(found), len(columns)), np.nan)
+        hit = found >= 0
+        corners = self.values[self.triangles[found[hit]]][:, :, columns]
+        result[hit] = np.einsum('qv,qvk->qk', weights[hit], corners)
+        return result
+
+
+def polyline_distances(points, starts, stops, x, y):
+    """
+    Distance of each query point to its own polyline, polylines are vertex ranges of a shared vertex array.
+    :param points: (n, 2) vertices
+    :param starts: (q,) first vertex of the polyline of each query point
+    :param stops: (q,) last + 1 vertex of the polyline of each query point
+    :param x: (q,) X coordinates
+    :param y: (q,) Y coordinates
+    :return: (q,) distances
+    """
+    counts = np.maximum(stops - starts - 1, 0)
+    query = np.repeat(np.arange(len(starts)), counts)
+    seg = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    a, b = points[seg], points[seg + 1]
+    p = np.column_stack((x[query], y[query]))
+    ab = b - a
+    length2 = (ab ** 2).sum(axis=1)
+    t = np.clip(((p - a) * ab).sum(axis=1) / np.where(length2 == 0, 1.0, length2), 0.0, 1.0)
+    distances = np.hypot(*(a + t[:, None] * ab - p).T)
+    result = np.full(len(starts), np.nan)
+    if len(distances):
+        first = np.cumsum(counts) - counts
+        has = counts > 0
+        result[has] = np.minimum.reduceat(distances, first[has])
+    return result
+
+
+def evaluate_structures(surface, x, y, ffe=None, wsel_channels=("WSEL10yr", "WSEL50yr", "WSEL100yr", "WSEL500yr"),
+                        stationField="Station"):
+    """
+    Evaluates the flood depths of a batch of structures. The bracketing XS pair of each structure is located on the
+    surface strips, the Station and WSELs are then interpolated linearly between the downstream and upstream XS
+    on the structure's relative distance to each XS.
+    :param surface: WSELSurface built with WSELSurface.from_xs
+    :param x: (q,) structure X coordinates
+    :param y: (q,) structure Y coordinates
+    :param ffe: optional (q,) finished floor elevations
+    :param wsel_channels: surface channels of the storm WSELs
+    :param stationField: surface channel of the station
+    :return: dictionary of 'UnitNumber', 'DS_Station', 'US_Station', 'Station' (q,), 'WSEL' (q, storms) and
+             'Depth' (q, storms, WSEL above the finished floor), NaN / None for structures outside all XS pairs
+    """
+    if surface.strips is None:
+        raise ValueError("The surface holds no XS strips, build it with WSELSurface.from_xs")
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    columns = [surface.channels.index(stationField)] + [surface.channels.index(ch) for ch in wsel_channels]
+    tri, weights = surface.locate(x, y)
+    hit = tri >= 0
+    strip = surface.triangle_strips[tri[hit]]
+    start, split, stop = surface.strips[strip].T
+    d_ds = polyline_distances(surface.points, start, split, x[hit], y[hit])
+    d_us = polyline_distances(surface.points, split, stop, x[hit], y[hit])
+    total = d_ds + d_us
+    w = np.where(total > 0, d_ds / np.where(total > 0, total, 1.0), 0.0)
+    ds_values = surface.values[start][:, columns]
+    us_values = surface.values[split][:, columns]
+    values = np.full((len(x), len(columns)), np.nan)
+    values[hit] = ds_values + w[:, None] * (us_values - ds_values)
+    bounds = np.full((len(x), 2), np.nan)
+    bounds[hit] = np.column_stack((ds_values[:, 0], us_values[:, 0]))
+    units = np.array([None] * len(x), dtype=object)
+    units[hit] = [surface.strip_units[s] for s in strip]
+    wsel = values[:, 1:]
+    depth = np.full(wsel.shape, np.nan)
+    if ffe is not None:
+        depth = wsel - np.asarray(ffe, dtype=float).ravel()[:, None]
+    return {'UnitNumber': units, 'DS_Station': bounds[:, 0], 'US_Station': bounds[:, 1], 'Station': values[:, 0],
+            'WSEL': wsel, 'Depth': depth}
+
+
+def evaluate_SI_WSEL(surface, si_path, ffeField=None,
+                     wsel_channels=("WSEL10yr", "WSEL50yr", "WSEL100yr", "WSEL500yr")):
+    """Attributes a structural inventory with its bounding stations, station, WSELs and depths in one read and one
+    update pass.
+        :param surface: WSELSurface built with WSELSurface.from_xs (or createWSELSurface)
+        :param si_path: path to structural inventory (points)
+        :param ffeField: optional finished floor elevation field, depth fields are only written with it
+        :param wsel_channels: surface channels of the storm WSELs
+        Structures with a null shape are evaluated as NaN and left unchanged.
+    """
+    depth_fields = ["Depth{0}".format(ch[4:]) for ch in wsel_channels] if ffeField else []
+    fields = [str(fd.name) for fd in arcpy.ListFields(si_path)]
+    for fn in ['DS_Station', 'US_Station', 'Station'] + list(wsel_channels) + depth_fields:
+        if fn not in fields:
+            arcpy.AddField_management (si_path , field_name=fn , field_type="DOUBLE")
+    if 'UnitNumber' not in fields:
+        arcpy.AddField_management (si_path , field_name='UnitNumber' , field_type="TEXT" , field_length=20)
+    readFields = ["SHAPE@XY"] + ([ffeField] if ffeField else [])
+    with arcpy.da.SearchCursor (si_path , readFields) as sCursor:
+        rows = [row for row in sCursor]
+    xy = np.array([(np.nan, np.nan) if row[0] is None else row[0] for row in rows], dtype=float).reshape(-1, 2)
+    ffe = np.array([np.nan if row[1] is None else row[1] for row in rows], dtype=float) if ffeField else None
+    result = evaluate_structures(surface, xy[:, 0], xy[:, 1], ffe=ffe, wsel_channels=wsel_channels)
+
+    def clean(value):
+        return None if value is None or np.isnan(value) else float(value)
+
+    updateFields = ['UnitNumber', 'DS_Station', 'US_Station', 'Station'] + list(wsel_channels) + depth_fields
+    with arcpy.da.UpdateCursor (si_path , updateFields) as uCursor:
+        for i, uow in enumerate(uCursor):
+            if result['UnitNumber'][i] is None:
+                continue
+            row = [result['UnitNumber'][i], clean(result['DS_Station'][i]), clean(result['US_Station'][i]),
+                   clean(result['Station'][i])] + [clean(val) for val in result['WSEL'][i]]
+            if ffeField:
+                row += [clean(val) for val in result['Depth'][i]]
+            uCursor.updateRow(row)
+    return result
+
+
+def createWSELSurface(xsFeatureclass, outFile=None, stationField="Station", unitNumberField="UnitNumber"):
+    """Triangulates the XS once and carries the Station and all storm WSELs on the same mesh (replaces a TIN per
+    storm profile).
+        :param xsFeatureclass: attributed cross section feature class (see attribute_XS)
+        :param outFile: optional .npz file the triangulation is stored to
+        :return: WSELSurface
+    """
+    surface = WSELSurface.from_xs(xsFeatureclass, stationField=stationField, unitNumberField=unitNumberField)
+    print("\t\t|-WSEL Surface: {0} vertices, {1} triangles".format(len(surface.points), len(surface.triangles)))
+    if outFile is not None:
+        surface.save(outFile)
+    return surface
+
 def manageWMPChannels():
     # Dissolves al subreaches on single channel lines.
     # Seperates Main stem for tributaries
@@ -253,6 +581,61 @@ def manageWMPChannels():
 def autogenerateXS(streamCenterLine, buffer=4.0):
     pass
 
+class STRTree(object):
+    """Sort-Tile-Recursive packed R-tree of bounding boxes, bulk loaded once and queried for boxes containing a box.
+        :param boxes: (n, 4) array like of XMin, YMin, XMax, YMax
+        :param node_capacity: number of entries per node
+    """
+
+    def __init__(self, boxes, node_capacity=16):
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        self.node_capacity = node_capacity
+        # Orders the leaves: vertical slices on box center X, then center Y within each slice
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2.0
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2.0
+        n_leaves = int(np.ceil(len(boxes) / float(node_capacity)))
+        slice_size = node_capacity * int(np.ceil(np.sqrt(n_leaves))) if n_leaves > 0 else 1
+        by_x = np.argsort(cx, kind='mergesort')
+        slices = np.empty(len(boxes), dtype=np.int64)
+        slices[by_x] = np.arange(len(boxes)) // slice_size
+        self.ids = np.lexsort((cy, slices))
+        # Packs each level into nodes of node_capacity consecutive entries of the level below
+        self.levels = []
+        level_boxes = boxes[self.ids]
+        while True:
+            starts = np.arange(0, len(level_boxes), node_capacity)
+            if len(starts) == 0:
+                break
+            node_boxes = np.column_stack((np.minimum.reduceat(level_boxes[:, 0], starts),
+                                          np.minimum.reduceat(level_boxes[:, 1], starts),
+                                          np.maximum.reduceat(level_boxes[:, 2], starts),
+                                          np.maximum.reduceat(level_boxes[:, 3], starts)))
+            self.levels.append((level_boxes, starts))
+            level_boxes = node_boxes
+            if len(level_boxes) == 1:
+                break
+        self.root = level_boxes
+
+    @staticmethod
+    def _contains(boxes, box):
+        return ((boxes[:, 0] <= box[0]) & (boxes[:, 1] <= box[1]) &
+                (boxes[:, 2] >= box[2]) & (boxes[:, 3] >= box[3]))
+
+    def query(self, xmin, ymin, xmax=None, ymax=None):
+        """Returns the sorted indexes of the boxes containing a box (or a point when xmax and ymax are omitted)."""
+        box = (xmin, ymin, xmin if xmax is None else xmax, ymin if ymax is None else ymax)
+        if len(self.levels) == 0:
+            return []
+        nodes = np.nonzero(self._contains(self.root, box))[0]
+        for level_boxes, starts in reversed(self.levels):
+            if len(nodes) == 0:
+                return []
+            ends = np.append(starts[1:], len(level_boxes))
+            entries = np.concatenate([np.arange(starts[node], ends[node]) for node in nodes])
+            nodes = entries[self._contains(level_boxes[entries], box)]
+        return sorted(self.ids[nodes].tolist())
+
+
 def assign_SI_BoundingStation(pg_path, si_path, tin_Path):
     """
     :param pg_path: path to bounding polygon feature class
@@ -284,24 +667,30 @@ def assign_SI_BoundingStation(pg_path, si_path, tin_Path):
     getRequiredExtensions()
     cnt = 0
     xnt = 0
+    # Loads all bounding polygons once and bulk loads their extents in an STR-tree
+    polygons = []
     with arcpy.da.SearchCursor (pg_path , searchFields) as sCursor:
         for sow in sCursor:
-            ds = sow[searchFields.index("DS_Station")]
-            us = sow[searchFields.index("US_Station")]
-            unit = sow[searchFields.index("UnitNumber")]
-            pg = sow[searchFields.index("SHAPE@")]
-            with arcpy.da.UpdateCursor(si_path, updateFields) as uCursor:
-                for uow in uCursor:
-                    pnt = uow[updateFields.index("SHAPE@")]
-                    unitN = uow[updateFields.index("UnitNumber")]
-                    if (pnt.within(pg)) and ((unitN is None) or (unitN == "")):
-                        uow[ updateFields.index ("DS_Station") ] = ds
-                        uow[updateFields.index("US_Station")] = us
-                        uow[ updateFields.index ("UnitNumber") ] = unit
-                        uCursor.updateRow(uow)
-                        cnt += 1
-                    else:
-                        pass
+            polygons.append((sow[searchFields.index("DS_Station")], sow[searchFields.index("US_Station")],
+                             sow[searchFields.index("UnitNumber")], sow[searchFields.index("SHAPE@")]))
+    tree = STRTree([(pg.extent.XMin, pg.extent.YMin, pg.extent.XMax, pg.extent.YMax) for ds, us, unit, pg in polygons])
+    # Single update pass, exact within test on candidate polygons only (first polygon in pg_path order wins)
+    with arcpy.da.UpdateCursor(si_path, updateFields) as uCursor:
+        for uow in uCursor:
+            pnt = uow[updateFields.index("SHAPE@")]
+            unitN = uow[updateFields.index("UnitNumber")]
+            if pnt is None or not ((unitN is None) or (unitN == "")):
+                continue
+            ext = pnt.extent
+            for i in tree.query(ext.XMin, ext.YMin, ext.XMax, ext.YMax):
+                ds, us, unit, pg = polygons[i]
+                if pnt.within(pg):
+                    uow[ updateFields.index ("DS_Station") ] = ds
+                    uow[updateFields.index("US_Station")] = us
+                    uow[ updateFields.index ("UnitNumber") ] = unit
+                    uCursor.updateRow(uow)
+                    cnt += 1
+                    break
     out_feature = "SI_Station"
     oldwrkspace = arcpy.env.workspace
     arcpy.env.workspace = r'N:\GIS-Proposals\HCFCD_SI\ArcMap Project\SIConceptTest\SIConceptTest.gdb'
@@ -337,6 +726,8 @@ if __name__ == "__main__":
     pgFC = createExportPolyFc(xsFC,outFolder, "{0}.shp".format(unitNumber.replace("-","")),)
     createPolygonFeatures(xsFC,pgFC)
     createStationTIN(xsFC, pgFC, unitNumber=unitNumber)
+    # Step 3 Triangulates the XS once for the Station and all storm WSELs
+    createWSELSurface(xsFC, os.path.join(outFolder, "{0}_WSEL.npz".format(unitNumber.replace("-",""))))
     end = datetime.now()
     elapsedTime = end - start
     elapsedTime = list(divmod(elapsedTime.total_seconds(), 60))